@@ -13,6 +13,7 @@ from models.admin import Admin
 # The key is they are all imported before db.create_all()
 # Importing the main classes is usually sufficient, as relationships often use strings.
 from models.user import User
+import models.archive  # Archive tables (tasks/retention.py); no route imports them
 from routes.admin import admin_bp
 from routes.api import api_bp
 # Import routes
@@ -23,7 +24,9 @@ from routes.host import host_bp  # <-- CRUCIAL: Import the host blueprint
 from routes.payment import payment_bp
 # --- NEW IMPORTS ---
 from routes.user import user_bp  # If you have a separate user blueprint
+from tasks.cli import register_commands
 from tasks.notifications import start_background_scheduler
+from utils.image_variants import image_url
 
 
 # Import db first
@@ -96,6 +99,9 @@ def create_app():
     # Create uploads directory
     if not os.path.exists(app.config['UPLOAD_FOLDER']):
         os.makedirs(app.config['UPLOAD_FOLDER'])
+    os.makedirs(app.config['UPLOAD_STORE_FOLDER'], exist_ok=True)
+    # {{ image_url(filename, 'thumb') }}: resized variant once rendered, else the original
+    app.add_template_global(image_url)
 
     # Register blueprints
     app.register_blueprint(auth_bp, url_prefix='/auth')
@@ -110,9 +116,11 @@ def create_app():
     app.register_blueprint(admin_bp, url_prefix='/admin')
     # --- END NEW REGISTRATIONS ---
 
-    # scheduler = BackgroundScheduler()
-    # scheduler.add_job(func=Booking.auto_cancel_unapproved, trigger="interval", hours=1)  # Run every hour
-    # scheduler.start()
+    # Batch jobs (flask reconcile-payments, ...)
+    register_commands(app)
+
+    # Stale pending bookings are expired by tasks/bookings.expire_stale_pending_bookings,
+    # scheduled in start_background_scheduler(app) below.
     # app.register_blueprint(host_bp, url_prefix='/host')  # <-- CRUCIAL: Register the host blueprint
 
     return app
@@ -125,8 +133,10 @@ with app.app_context():
     # db.session.execute(db.text('SET FOREIGN_KEY_CHECKS=0;'))
     # db.drop_all()
     # db.session.execute(db.text('SET FOREIGN_KEY_CHECKS=1;'))
-    start_background_scheduler()
     db.create_all()
+    if app.config['SCHEDULER_EMBEDDED']:
+        # Every worker runs a runner; only the elected leader executes the shared jobs
+        start_background_scheduler(app)
     # --- CRITICAL FIX 8: Create Default Admin ---
     from models.admin import create_default_admin
 
@@ -18,7 +18,145 @@ class Config:
 
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
+    # Content-addressed upload store (utils/upload_store.py); served as /static/uploads/<key>
+    UPLOAD_STORE_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'uploads')
+    UPLOAD_BLOB_GC_INTERVAL_HOURS = int(os.getenv('UPLOAD_BLOB_GC_INTERVAL_HOURS', 6))
+    UPLOAD_BLOB_GC_GRACE_HOURS = int(os.getenv('UPLOAD_BLOB_GC_GRACE_HOURS', 24))  # Unreferenced this long before deletion
+    UPLOAD_BLOB_GC_BATCH_SIZE = int(os.getenv('UPLOAD_BLOB_GC_BATCH_SIZE', 500))
+    # Image derivatives (utils/image_variants.py, tasks/images.py); requires Pillow on the scheduler process
+    IMAGE_DERIVATIVE_POLL_SECONDS = int(os.getenv('IMAGE_DERIVATIVE_POLL_SECONDS', 10))
+    IMAGE_DERIVATIVE_BATCH_SIZE = int(os.getenv('IMAGE_DERIVATIVE_BATCH_SIZE', 32))  # Blobs claimed per run
+    IMAGE_DERIVATIVE_CLAIM_TIMEOUT_SECONDS = int(os.getenv('IMAGE_DERIVATIVE_CLAIM_TIMEOUT_SECONDS', 600))
+    IMAGE_WORKER_THREADS = int(os.getenv('IMAGE_WORKER_THREADS', 4))
+    IMAGE_JPEG_QUALITY = int(os.getenv('IMAGE_JPEG_QUALITY', 82))
+    IMAGE_WEBP_QUALITY = int(os.getenv('IMAGE_WEBP_QUALITY', 80))
 
     # Razorpay configuration
     RAZORPAY_KEY_ID = os.getenv('RAZORPAY_KEY_ID')
-    RAZORPAY_KEY_SECRET = os.getenv('RAZORPAY_KEY_SECRET')
\ No newline at end of file
+    RAZORPAY_KEY_SECRET = os.getenv('RAZORPAY_KEY_SECRET')
+
+    # Payment gateway service (utils/payment_gateway.py)
+    PAYMENT_GATEWAY = os.getenv('PAYMENT_GATEWAY', 'razorpay')  # 'razorpay' or 'fake' (offline load testing)
+    PAYMENT_GATEWAY_CONNECT_TIMEOUT = float(os.getenv('PAYMENT_GATEWAY_CONNECT_TIMEOUT', 3.05))  # Seconds
+    PAYMENT_GATEWAY_READ_TIMEOUT = float(os.getenv('PAYMENT_GATEWAY_READ_TIMEOUT', 10))  # Seconds
+    PAYMENT_GATEWAY_POOL_SIZE = int(os.getenv('PAYMENT_GATEWAY_POOL_SIZE', 10))  # Keep-alive connections per worker
+    PAYMENT_GATEWAY_MAX_RETRIES = int(os.getenv('PAYMENT_GATEWAY_MAX_RETRIES', 2))  # Retries on transient errors
+    PAYMENT_GATEWAY_BACKOFF_BASE = float(os.getenv('PAYMENT_GATEWAY_BACKOFF_BASE', 0.2))  # Seconds, doubled per retry
+    PAYMENT_GATEWAY_BREAKER_THRESHOLD = int(os.getenv('PAYMENT_GATEWAY_BREAKER_THRESHOLD', 5))  # Failures before opening
+    PAYMENT_GATEWAY_BREAKER_RESET_SECONDS = int(os.getenv('PAYMENT_GATEWAY_BREAKER_RESET_SECONDS', 30))
+    FAKE_GATEWAY_LATENCY_MS = int(os.getenv('FAKE_GATEWAY_LATENCY_MS', 0))
+    FAKE_GATEWAY_FAILURE_RATE = float(os.getenv('FAKE_GATEWAY_FAILURE_RATE', 0))
+
+    # Pending booking sweeper (tasks/bookings.py)
+    PENDING_BOOKING_TTL_MINUTES = int(os.getenv('PENDING_BOOKING_TTL_MINUTES', 60))  # Unpaid bookings older than this are cancelled
+    PENDING_BOOKING_SWEEP_BATCH_SIZE = int(os.getenv('PENDING_BOOKING_SWEEP_BATCH_SIZE', 500))  # Rows per UPDATE
+    PENDING_BOOKING_SWEEP_INTERVAL_MINUTES = int(os.getenv('PENDING_BOOKING_SWEEP_INTERVAL_MINUTES', 5))
+
+    # Payment reconciliation (tasks/reconciliation.py)
+    RECONCILIATION_CHUNK_SIZE = int(os.getenv('RECONCILIATION_CHUNK_SIZE', 1000))  # Rows per server-side fetch / sort run
+    RECONCILIATION_AMOUNT_TOLERANCE = float(os.getenv('RECONCILIATION_AMOUNT_TOLERANCE', 0.01))  # Rupees
+    RECONCILIATION_REPORT_DIR = os.getenv('RECONCILIATION_REPORT_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'reports'))
+
+    # Double-entry ledger (models/ledger.py, tasks/ledger.py)
+    LEDGER_SNAPSHOT_INTERVAL_HOURS = int(os.getenv('LEDGER_SNAPSHOT_INTERVAL_HOURS', 24))
+    LEDGER_SNAPSHOT_SETTLE_SECONDS = int(os.getenv('LEDGER_SNAPSHOT_SETTLE_SECONDS', 60))  # Skip postings younger than this
+
+    # Offline wallet verifier (tasks/ledger_verify.py)
+    LEDGER_VERIFY_WORKERS = int(os.getenv('LEDGER_VERIFY_WORKERS', 0))  # 0 = one process per CPU
+    LEDGER_VERIFY_PARTITION_SIZE = int(os.getenv('LEDGER_VERIFY_PARTITION_SIZE', 5000))  # Owner ids per worker task
+
+    # Host earnings rollups (utils/host_rollups.py, tasks/rollups.py)
+    HOST_ROLLUP_REBUILD_INTERVAL_HOURS = int(os.getenv('HOST_ROLLUP_REBUILD_INTERVAL_HOURS', 24))
+    HOST_ROLLUP_REBUILD_DAYS = int(os.getenv('HOST_ROLLUP_REBUILD_DAYS', 2))  # Closed days re-derived per run
+
+    # Admin dashboard metrics (utils/admin_metrics.py)
+    ADMIN_METRICS_REFRESH_SECONDS = int(os.getenv('ADMIN_METRICS_REFRESH_SECONDS', 30))
+    # Closed time-series buckets (utils/admin_timeseries.py); edits to past bookings show up after this
+    ADMIN_TIMESERIES_CLOSED_CACHE_SECONDS = int(os.getenv('ADMIN_TIMESERIES_CLOSED_CACHE_SECONDS', 3600))
+
+    # Host dashboard counters (utils/host_stats.py); invalidated on booking changes in this worker
+    HOST_STATS_CACHE_SECONDS = int(os.getenv('HOST_STATS_CACHE_SECONDS', 30))  # Other workers may lag by this much
+
+    # Search demand log (utils/search_log.py, tasks/search_demand.py)
+    SEARCH_LOG_ENABLED = os.getenv('SEARCH_LOG_ENABLED', 'true').lower() == 'true'
+    SEARCH_LOG_QUEUE_SIZE = int(os.getenv('SEARCH_LOG_QUEUE_SIZE', 10000))  # Entries beyond this are dropped
+    SEARCH_LOG_BATCH_SIZE = int(os.getenv('SEARCH_LOG_BATCH_SIZE', 500))
+    SEARCH_LOG_FLUSH_SECONDS = float(os.getenv('SEARCH_LOG_FLUSH_SECONDS', 2))
+    SEARCH_LOG_SETTLE_SECONDS = int(os.getenv('SEARCH_LOG_SETTLE_SECONDS', 300))  # Compaction skips younger rows
+    SEARCH_LOG_COMPACTION_INTERVAL_MINUTES = int(os.getenv('SEARCH_LOG_COMPACTION_INTERVAL_MINUTES', 15))
+    SEARCH_GEO_CELL_DEGREES = float(os.getenv('SEARCH_GEO_CELL_DEGREES', 0.05))  # ~5.5 km cells
+    SEARCH_DEMAND_RADIUS_KM = float(os.getenv('SEARCH_DEMAND_RADIUS_KM', 25))  # Results counted as 'nearby'
+
+    # Notification delivery (utils/notification_outbox.py, tasks/notification_dispatch.py)
+    NOTIFICATION_WHATSAPP_ENABLED = os.getenv('NOTIFICATION_WHATSAPP_ENABLED', 'false').lower() == 'true'
+    NOTIFICATION_DISPATCH_INTERVAL_SECONDS = int(os.getenv('NOTIFICATION_DISPATCH_INTERVAL_SECONDS', 15))
+    NOTIFICATION_DISPATCH_BATCH_SIZE = int(os.getenv('NOTIFICATION_DISPATCH_BATCH_SIZE', 200))  # Rows handed off per run
+
+    # Outbound WhatsApp/SMS queue (utils/messaging.py, tasks/messaging.py)
+    MESSAGING_PROVIDER = os.getenv('MESSAGING_PROVIDER', 'twilio')  # 'twilio' or 'fake' (offline benchmarking)
+    MESSAGING_DISPATCH_INTERVAL_SECONDS = int(os.getenv('MESSAGING_DISPATCH_INTERVAL_SECONDS', 5))
+    MESSAGING_BATCH_SIZE = int(os.getenv('MESSAGING_BATCH_SIZE', 200))  # Messages claimed per run
+    MESSAGING_SENDER_THREADS = int(os.getenv('MESSAGING_SENDER_THREADS', 8))  # Share one provider client
+    MESSAGING_RATE_PER_SECOND = float(os.getenv('MESSAGING_RATE_PER_SECOND', 10))  # Per provider, per process
+    MESSAGING_RATE_BURST = int(os.getenv('MESSAGING_RATE_BURST', 20))
+    MESSAGING_MAX_ATTEMPTS = int(os.getenv('MESSAGING_MAX_ATTEMPTS', 5))  # Then dead-lettered
+    MESSAGING_RETRY_BASE_SECONDS = int(os.getenv('MESSAGING_RETRY_BASE_SECONDS', 30))  # Doubled per attempt
+    MESSAGING_RETRY_MAX_SECONDS = int(os.getenv('MESSAGING_RETRY_MAX_SECONDS', 3600))
+    MESSAGING_CLAIM_TIMEOUT_SECONDS = int(os.getenv('MESSAGING_CLAIM_TIMEOUT_SECONDS', 600))  # Then reclaimed
+    MESSAGING_HTTP_TIMEOUT_SECONDS = float(os.getenv('MESSAGING_HTTP_TIMEOUT_SECONDS', 10))  # Per Twilio request
+    FAKE_MESSAGING_LATENCY_MS = int(os.getenv('FAKE_MESSAGING_LATENCY_MS', 0))
+    FAKE_MESSAGING_FAILURE_RATE = float(os.getenv('FAKE_MESSAGING_FAILURE_RATE', 0))
+    FAKE_MESSAGING_PERMANENT_FAILURE_RATE = float(os.getenv('FAKE_MESSAGING_PERMANENT_FAILURE_RATE', 0))
+
+    # Booking reminders (utils/reminders.py, tasks/reminders.py)
+    REMINDER_POLL_SECONDS = int(os.getenv('REMINDER_POLL_SECONDS', 30))
+    REMINDER_BATCH_SIZE = int(os.getenv('REMINDER_BATCH_SIZE', 500))  # Due rows per transaction
+    REMINDER_MAX_LATENESS_MINUTES = int(os.getenv('REMINDER_MAX_LATENESS_MINUTES', 30))  # Older due rows expire unsent
+
+    # Background scheduler (tasks/scheduler.py)
+    SCHEDULER_EMBEDDED = os.getenv('SCHEDULER_EMBEDDED', 'true').lower() == 'true'  # false: run `flask scheduler` instead
+    SCHEDULER_LOCK_BACKEND = os.getenv('SCHEDULER_LOCK_BACKEND', 'auto')  # 'auto', 'database' or 'file'
+    SCHEDULER_LOCK_NAME = os.getenv('SCHEDULER_LOCK_NAME', 'cars_scheduler_leader')
+    SCHEDULER_LOCK_FILE = os.getenv('SCHEDULER_LOCK_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scheduler.lock'))
+    SCHEDULER_LEADER_RETRY_SECONDS = int(os.getenv('SCHEDULER_LEADER_RETRY_SECONDS', 15))  # Election / lock check interval
+
+    # Unread notification counters (utils/notification_counters.py, tasks/notification_counters.py)
+    UNREAD_COUNT_CACHE_SECONDS = int(os.getenv('UNREAD_COUNT_CACHE_SECONDS', 30))  # Other workers may lag by this much
+    UNREAD_RECONCILE_INTERVAL_HOURS = int(os.getenv('UNREAD_RECONCILE_INTERVAL_HOURS', 24))
+    UNREAD_RECONCILE_WINDOW_SIZE = int(os.getenv('UNREAD_RECONCILE_WINDOW_SIZE', 2000))  # User ids per transaction
+
+    # Live updates over Server-Sent Events (utils/realtime.py); needs threaded or async workers
+    REALTIME_ENABLED = os.getenv('REALTIME_ENABLED', 'false').lower() == 'true'  # Only with threaded or async workers
+    REALTIME_BACKEND = os.getenv('REALTIME_BACKEND', 'memory')  # 'memory' (one worker) or 'redis' (fan out across workers)
+    REALTIME_REDIS_URL = os.getenv('REALTIME_REDIS_URL', 'redis://localhost:6379/0')
+    REALTIME_MAX_CONNECTIONS_PER_WORKER = int(os.getenv('REALTIME_MAX_CONNECTIONS_PER_WORKER', 200))
+    REALTIME_QUEUE_SIZE = int(os.getenv('REALTIME_QUEUE_SIZE', 100))  # Pending events per connection before dropping
+    REALTIME_HEARTBEAT_SECONDS = int(os.getenv('REALTIME_HEARTBEAT_SECONDS', 20))
+    REALTIME_MAX_CONNECTION_SECONDS = int(os.getenv('REALTIME_MAX_CONNECTION_SECONDS', 600))  # Then the client reconnects
+    REALTIME_RETRY_MS = int(os.getenv('REALTIME_RETRY_MS', 5000))  # EventSource reconnect delay
+
+    # Retention and archival (tasks/retention.py)
+    RETENTION_INTERVAL_HOURS = int(os.getenv('RETENTION_INTERVAL_HOURS', 24))
+    RETENTION_NOTIFICATION_DAYS = int(os.getenv('RETENTION_NOTIFICATION_DAYS', 90))  # Read notifications older than this
+    RETENTION_PHOTO_DAYS = int(os.getenv('RETENTION_PHOTO_DAYS', 365))  # Photos of bookings that ended before this
+    RETENTION_CHUNK_SIZE = int(os.getenv('RETENTION_CHUNK_SIZE', 500))  # Rows per transaction
+    RETENTION_CHUNK_PAUSE_MS = int(os.getenv('RETENTION_CHUNK_PAUSE_MS', 50))  # Breathing room between chunks
+    RETENTION_MAX_CHUNKS_PER_RUN = int(os.getenv('RETENTION_MAX_CHUNKS_PER_RUN', 200))  # Per policy; the next run continues
+    RETENTION_EXPORT_DIR = os.getenv('RETENTION_EXPORT_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'archive_exports'))
+
+    # Broadcast fan-out (utils/broadcasts.py, tasks/broadcasts.py)
+    BROADCAST_WINDOW_SIZE = int(os.getenv('BROADCAST_WINDOW_SIZE', 5000))  # User ids per INSERT ... SELECT
+    BROADCAST_POLL_SECONDS = int(os.getenv('BROADCAST_POLL_SECONDS', 10))
+    BROADCAST_HEARTBEAT_TIMEOUT_SECONDS = int(os.getenv('BROADCAST_HEARTBEAT_TIMEOUT_SECONDS', 300))  # Then another run resumes it
+
+    # Fleet occupancy (utils/occupancy.py)
+    OCCUPANCY_CACHE_SECONDS = int(os.getenv('OCCUPANCY_CACHE_SECONDS', 300))  # Current and future weeks
+    OCCUPANCY_CLOSED_WEEK_CACHE_SECONDS = int(os.getenv('OCCUPANCY_CLOSED_WEEK_CACHE_SECONDS', 86400))
+
+    # Wallet statement export (utils/statement_export.py)
+    STATEMENT_EXPORT_CHUNK_SIZE = int(os.getenv('STATEMENT_EXPORT_CHUNK_SIZE', 1000))  # Rows per fetch / response chunk
+
+    # Host payout batching (tasks/payouts.py)
+    PAYOUT_BATCH_INTERVAL_HOURS = int(os.getenv('PAYOUT_BATCH_INTERVAL_HOURS', 24))
+    PAYOUT_BATCH_MAX_REQUESTS = int(os.getenv('PAYOUT_BATCH_MAX_REQUESTS', 5000))  # Requests per run
+    PAYOUT_FILE_DIR = os.getenv('PAYOUT_FILE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'payouts'))
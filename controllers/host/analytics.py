@@ -0,0 +1,107 @@
+# controllers/host/analytics.py
+"""
+Host earnings analytics served from the daily rollups (models/host_earnings.py).
+
+A request reads at most one row per (car, day) in the range and buckets them
+by day, week or month here, instead of scanning the host's bookings.
+"""
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from models import db
+from models.car import Car
+from models.host_earnings import HostDailyEarnings
+from utils.host_rollups import ROLLUP_COUNTERS
+from utils.time_buckets import BUCKETS, bucket_keys, bucket_start
+
+MAX_RANGE_DAYS = 731
+DEFAULT_RANGE_DAYS = 30
+
+
+class AnalyticsRangeError(ValueError):
+    """Invalid analytics range or bucket."""
+
+
+def parse_analytics_args(args, today):
+    """
+    Parse start/end ('YYYY-MM-DD', inclusive), bucket and car_id from request args.
+    Defaults to the last 30 days in daily buckets.
+    Raises:
+        AnalyticsRangeError: Malformed or oversized range, unknown bucket or car id.
+    """
+    try:
+        end_day = datetime.strptime(args['end'], '%Y-%m-%d').date() if args.get('end') else today
+        start_day = (datetime.strptime(args['start'], '%Y-%m-%d').date() if args.get('start')
+                     else end_day - timedelta(days=DEFAULT_RANGE_DAYS - 1))
+    except ValueError:
+        raise AnalyticsRangeError("Dates must be in YYYY-MM-DD format.")
+    if start_day > end_day:
+        raise AnalyticsRangeError("Start date must be on or before end date.")
+    if (end_day - start_day).days >= MAX_RANGE_DAYS:
+        raise AnalyticsRangeError(f"Range cannot exceed {MAX_RANGE_DAYS} days.")
+
+    bucket = args.get('bucket', 'day').lower()
+    if bucket not in BUCKETS:
+        raise AnalyticsRangeError(f"Bucket must be one of: {', '.join(BUCKETS)}.")
+
+    car_id = args.get('car_id')
+    if car_id:
+        try:
+            car_id = int(car_id)
+        except ValueError:
+            raise AnalyticsRangeError("car_id must be an integer.")
+    return start_day, end_day, bucket, car_id or None
+
+
+def _with_rates(totals):
+    """Round the counters and add the derived cancellation rate and average booking value."""
+    result = {name: round(value, 2) for name, value in totals.items()}
+    decided = totals['bookings'] + totals['cancellations']
+    result['cancellation_rate'] = round(totals['cancellations'] / decided, 4) if decided else 0.0
+    result['average_booking_value'] = round(totals['gross'] / totals['bookings'], 2) if totals['bookings'] else 0.0
+    return result
+
+
+def get_host_earnings_analytics(host_id, start_day, end_day, bucket='day', car_id=None):
+    """
+    Earnings, bookings and cancellations for a host between two IST days (inclusive).
+    Returns:
+        dict: 'series' (one entry per bucket), 'cars' (per-car totals) and 'totals'.
+    """
+    query = (
+        select(HostDailyEarnings, Car.make, Car.model)
+        .join(Car, HostDailyEarnings.car_id == Car.id)
+        .where(
+            HostDailyEarnings.host_id == host_id,
+            HostDailyEarnings.day >= start_day,
+            HostDailyEarnings.day <= end_day,
+        )
+    )
+    if car_id is not None:
+        query = query.where(HostDailyEarnings.car_id == car_id)
+
+    series = OrderedDict((key, dict.fromkeys(ROLLUP_COUNTERS, 0)) for key in bucket_keys(start_day, end_day, bucket))
+    cars = {}
+    totals = dict.fromkeys(ROLLUP_COUNTERS, 0)
+    for rollup, make, model in db.session.execute(query):
+        car = cars.setdefault(rollup.car_id, {'name': f"{make} {model}", **dict.fromkeys(ROLLUP_COUNTERS, 0)})
+        period = series[bucket_start(rollup.day, bucket)]
+        for name in ROLLUP_COUNTERS:
+            value = getattr(rollup, name)
+            period[name] += value
+            car[name] += value
+            totals[name] += value
+
+    return {
+        'start': start_day.isoformat(),
+        'end': end_day.isoformat(),
+        'bucket': bucket,
+        'series': [{'period': key.isoformat(), **_with_rates(values)} for key, values in series.items()],
+        'cars': sorted(
+            ({'car_id': key, 'name': values.pop('name'), **_with_rates(values)} for key, values in cars.items()),
+            key=lambda car: car['gross'], reverse=True
+        ),
+        'totals': _with_rates(totals),
+    }
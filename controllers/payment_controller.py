@@ -0,0 +1,118 @@
+# controllers/payment_controller.py
+"""
+Single entry point for Razorpay payment success callbacks.
+
+Every callback path (payment.handle_payment, booking.handle_payment, ...) hands
+the verified gateway identifiers to process_payment_success(). The first delivery
+of a razorpay_payment_id applies it to the booking and writes a PaymentEvent;
+every later delivery of the same id is answered from the unique index on
+payment_events.razorpay_payment_id and changes nothing.
+"""
+from flask import current_app
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+
+from models import db
+from models.booking import Booking
+from models.payment_event import PaymentEvent
+from utils.ledger_service import record_booking_payment
+from utils.payment_gateway import get_payment_gateway
+
+# --- Processing Outcomes ---
+PAYMENT_APPLIED = 'applied'  # First delivery, booking updated
+PAYMENT_DUPLICATE = 'duplicate'  # Payment id already processed, nothing changed
+PAYMENT_IGNORED = 'ignored'  # Recorded, but the booking was not in a payable state
+PAYMENT_NOT_FOUND = 'not_found'  # No booking for this order id
+PAYMENT_FORBIDDEN = 'forbidden'  # Booking belongs to another user
+# --- End Processing Outcomes ---
+
+
+def verify_payment_signature(order_id, payment_id, signature):
+    """
+    Verify a Razorpay checkout signature (HMAC-SHA256 of "order_id|payment_id")
+    with the active gateway's key secret.
+    Returns:
+        bool: True if the signature matches.
+    """
+    return get_payment_gateway().verify_payment_signature(order_id, payment_id, signature)
+
+
+def process_payment_success(order_id, payment_id, user_id=None, source=None):
+    """
+    Apply a verified Razorpay payment exactly once.
+
+    Args:
+        order_id (str): razorpay_order_id from the callback.
+        payment_id (str): razorpay_payment_id from the callback (dedup key).
+        user_id (int, optional): If given, the booking must belong to this user.
+        source (str, optional): Name of the callback path, stored on the ledger row.
+    Returns:
+        tuple: (outcome, booking) - outcome is one of the PAYMENT_* constants,
+               booking is None for PAYMENT_NOT_FOUND.
+    """
+    # --- Fast path: one unique-index probe for redeliveries ---
+    existing_event = PaymentEvent.query.filter_by(razorpay_payment_id=payment_id).first()
+    if existing_event:
+        return PAYMENT_DUPLICATE, existing_event.booking
+    # --- End Fast Path ---
+
+    # --- Lock the booking so concurrent payments for it are serialized ---
+    booking = Booking.query.filter(
+        or_(Booking.razorpay_order_id == order_id,
+            Booking.extension_razorpay_order_id == order_id)
+    ).with_for_update().first()
+    if not booking:
+        db.session.rollback()
+        return PAYMENT_NOT_FOUND, None
+    if user_id is not None and booking.user_id != user_id:
+        db.session.rollback()
+        return PAYMENT_FORBIDDEN, booking
+    # --- End Lock ---
+
+    is_extension = booking.extension_razorpay_order_id == order_id
+    event = PaymentEvent(
+        razorpay_payment_id=payment_id,
+        razorpay_order_id=order_id,
+        booking_id=booking.id,
+        event_type='extension_payment' if is_extension else 'booking_payment',
+        outcome=PAYMENT_IGNORED,
+        source=source
+    )
+
+    try:
+        # Insert the ledger row first: a concurrent delivery of the same payment id
+        # fails here on the unique key before it can touch the booking.
+        db.session.add(event)
+        db.session.flush()
+
+        # --- Apply the payment through the model methods ---
+        if is_extension:
+            applied = booking.mark_extension_paid(razorpay_payment_id=payment_id)
+            amount = booking.extension_additional_price
+        else:
+            applied = booking.mark_as_paid(razorpay_payment_id=payment_id)
+            amount = booking.total_price
+        # --- End Apply ---
+
+        if applied:
+            event.outcome = PAYMENT_APPLIED
+            event.amount = amount
+            # Money now sits in escrow until the trip completes or is cancelled
+            record_booking_payment(booking, amount, extension=is_extension)
+        db.session.commit()
+    except IntegrityError:
+        # Another worker recorded this payment id first
+        db.session.rollback()
+        return PAYMENT_DUPLICATE, Booking.query.get(booking.id)
+    except Exception:
+        db.session.rollback()
+        raise
+
+    if applied:
+        current_app.logger.info(f"Payment {payment_id} applied to booking {booking.id} via {source}.")
+        return PAYMENT_APPLIED, booking
+    current_app.logger.warning(
+        f"Payment {payment_id} for booking {booking.id} recorded but not applied "
+        f"(status={booking.status}, payment_status={booking.payment_status})."
+    )
+    return PAYMENT_IGNORED, booking
@@ -0,0 +1,60 @@
+# models/archive.py
+"""
+Archive tables for the retention job (tasks/retention.py).
+
+Each archive table mirrors the columns of its live table and keeps the
+original primary key, plus:
+- archived_at: when the row left the live table,
+- exported_at: when it was written to a compressed export file
+  (`flask retention-export`); exported rows may then be purged.
+
+Archive tables carry no foreign keys, so users and bookings can change
+without touching them.
+"""
+from . import db
+
+
+class NotificationArchive(db.Model):
+    __tablename__ = 'notifications_archive'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # notifications.id
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    message = db.Column(db.String(255), nullable=False)
+    is_read = db.Column(db.Boolean, nullable=False)
+    timestamp = db.Column(db.DateTime, nullable=False)
+    dispatch_status = db.Column(db.String(20), nullable=False)
+    archived_at = db.Column(db.DateTime, nullable=False)
+    exported_at = db.Column(db.DateTime, index=True)
+
+    def __repr__(self):
+        return f'<NotificationArchive {self.id} for User {self.user_id}>'
+
+
+class PhotoArchive(db.Model):
+    __tablename__ = 'photos_archive'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # photos.id
+    filename = db.Column(db.String(255), nullable=False)
+    booking_id = db.Column(db.Integer, nullable=False, index=True)
+    photo_type = db.Column(db.String(20), nullable=False)
+    uploaded_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, nullable=False)
+    exported_at = db.Column(db.DateTime, index=True)
+
+    def __repr__(self):
+        return f'<PhotoArchive {self.filename} ({self.photo_type}) for Booking {self.booking_id}>'
+
+
+class TripPhotoArchive(db.Model):
+    __tablename__ = 'trip_photos_archive'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # trip_photos.id
+    booking_id = db.Column(db.Integer, nullable=False, index=True)
+    photo_path = db.Column(db.String(255), nullable=False)
+    upload_type = db.Column(db.String(20), nullable=False)
+    uploaded_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, nullable=False)
+    exported_at = db.Column(db.DateTime, index=True)
+
+    def __repr__(self):
+        return f'<TripPhotoArchive {self.id} for Booking {self.booking_id} ({self.upload_type})>'
@@ -0,0 +1,40 @@
+# models/blob.py
+"""
+Content-addressed upload blobs (utils/upload_store.py).
+
+One row per distinct file content, keyed by its SHA-256. The file lives at
+<UPLOAD_STORE_FOLDER>/<key>, where key is '<hash[0:2]>/<hash[2:4]>/<hash><ext>',
+and the key is what CarImage / Photo / TripPhoto / Document rows store in
+their filename column. ref_count is the number of those rows pointing at the
+blob; a blob left with none is deleted (row and file) by the garbage
+collector once UPLOAD_BLOB_GC_GRACE_HOURS have passed since its last release.
+"""
+from . import db
+from datetime import datetime
+
+
+class Blob(db.Model):
+    __tablename__ = 'blobs'
+    __table_args__ = (
+        # The collector's scan: ref_count = 0 AND released_at < grace cutoff
+        db.Index('ix_blobs_ref_count_released', 'ref_count', 'released_at'),
+        # The derivative worker's scan: derivatives_status = 'pending'
+        db.Index('ix_blobs_derivatives_status', 'derivatives_status'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), nullable=False, unique=True)
+    key = db.Column(db.String(255), nullable=False, unique=True)  # Path under UPLOAD_STORE_FOLDER
+    size = db.Column(db.Integer, nullable=False)  # Bytes
+    content_type = db.Column(db.String(100))
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    released_at = db.Column(db.DateTime)  # Last time a reference was released
+    # --- Image Derivatives (tasks/images.py) ---
+    derivatives_status = db.Column(db.String(20), nullable=False, default='pending')  # pending, processing, ready, failed, none
+    derivatives_claimed_at = db.Column(db.DateTime)  # Set while 'processing'; a stale claim is taken again
+    derivatives_error = db.Column(db.String(255))
+    # --- End Image Derivatives ---
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<Blob {self.key} ({self.size} bytes, {self.ref_count} refs)>'
@@ -2,7 +2,10 @@
 from sqlalchemy.orm import relationship
 import pytz
 
+from utils.host_rollups import record_booking_rollup
+from utils.ledger_service import record_booking_cancellation, record_trip_completion
 from utils.notification_sender import send_notification_to_host, send_notification_to_user
+from utils.reminders import cancel_booking_reminders, schedule_booking_reminders
 from utils.timezone import get_current_ist_time, UTC_TZ, utc_to_ist
 from . import db
 from datetime import datetime, timedelta
@@ -80,6 +83,14 @@ except ImportError as e:
 
 class Booking(db.Model):
     __tablename__ = 'bookings'
+    __table_args__ = (
+        # Backs the stale pending booking sweeper (tasks/bookings.py)
+        db.Index('ix_bookings_status_payment_created', 'status', 'payment_status', 'created_at'),
+        # Per-car interval scans (overlap checks, fleet occupancy)
+        db.Index('ix_bookings_car_start', 'car_id', 'start_date'),
+        # Host dashboard GROUP BY status over the host's cars (utils/host_stats.py)
+        db.Index('ix_bookings_car_status', 'car_id', 'status'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
 
@@ -99,7 +110,7 @@ class Booking(db.Model):
     status = db.Column(db.String(20), default='pending') # pending, paid, active, completed, cancelled, extended
     # host_approval = db.Column(db.Boolean, default=False) # REMOVED: Not needed for initial booking
     payment_status = db.Column(db.String(20), default='pending') # pending, completed, failed
-    payment_date = db.Column(db.DateTime)
+    payment_date = db.Column(db.DateTime, index=True)  # Admin GMV time series
     # --- End Status Fields ---
 
     # --- Cancellation Details ---
@@ -107,13 +118,13 @@ class Booking(db.Model):
     cancellation_reason = db.Column(db.String(255))
     cancellation_fee_deducted = db.Column(db.Float, default=0.0)
     refund_amount = db.Column(db.Float, default=0.0)
-    cancelled_at = db.Column(db.DateTime)
+    cancelled_at = db.Column(db.DateTime, index=True)  # Admin cancellation time series
     # --- End Cancellation Details ---
     ##trip_photos = relationship('TripPhoto', back_populates='booking', lazy=True)
     # --- Razorpay Integration Fields ---
     # Store Razorpay identifiers for verification and reference
-    razorpay_order_id = db.Column(db.String(50)) # Store Razorpay Order ID
-    razorpay_payment_id = db.Column(db.String(50)) # Store Razorpay Payment ID (after success)
+    razorpay_order_id = db.Column(db.String(50), index=True) # Store Razorpay Order ID
+    razorpay_payment_id = db.Column(db.String(50), index=True) # Store Razorpay Payment ID (after success)
     # --- End Razorpay Fields ---
 
     # --- CRITICAL: Trip Extension Fields ---
@@ -129,14 +140,14 @@ class Booking(db.Model):
     # Status for the extension part of the booking
     extension_status = db.Column(db.String(20), default='none') # none, requested, approved, paid, completed, cancelled
     # Razorpay order/payment IDs for extension payment (if separate)
-    extension_razorpay_order_id = db.Column(db.String(50))
-    extension_razorpay_payment_id = db.Column(db.String(50))
+    extension_razorpay_order_id = db.Column(db.String(50), index=True)
+    extension_razorpay_payment_id = db.Column(db.String(50), index=True)
     extension_payment_status = db.Column(db.String(20), default='none') # none, pending, completed, failed
     extension_payment_date = db.Column(db.DateTime)
     # --- END CRITICAL ---
 
     # --- Timestamps ---
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     # --- End Timestamps ---
 
@@ -210,6 +221,7 @@ class Booking(db.Model):
             if razorpay_payment_id:
                 self.razorpay_payment_id = razorpay_payment_id
             db.session.add(self)
+            schedule_booking_reminders(self)  # Pre-trip and trip-end reminders
             return True
         return False
 
@@ -367,12 +379,14 @@ class Booking(db.Model):
             # Transfer earnings to host's wallet (assuming logic exists in Host model)
             host = self.car.host
             if host:
-                # Example: Add 90% of total price to host's wallet
-                host_earning = self.total_price * 0.9
-                # Add extension earnings if applicable
-                if self.extension_additional_price:
-                    host_earning += self.extension_additional_price * 0.9
-                host.add_to_wallet(host_earning)
+                # Split what was paid into escrow (booking + extension): 90% to the host,
+                # 10% platform commission. total_price already includes a paid extension
+                # (the price hook recalculates it from the extended end date), so the
+                # extension is no longer added on top.
+                host_earning = record_trip_completion(self, host.id)
+                host.add_to_wallet(float(host_earning))
+            record_booking_rollup(self, self.car.host_id)
+            cancel_booking_reminders(self.id)
             db.session.add(self)
 
             # --- CRITICAL FIX: Send notification to user ---
@@ -431,17 +445,20 @@ class Booking(db.Model):
                 self.cancellation_fee_deducted = round(fee, 2)
                 self.refund_amount = round(self.total_price - fee, 2)
 
-                # Update host wallet (deduct earnings, add back 50%)
+                # Update host wallet: host keeps 50% as cancellation fee.
+                # Earnings are only credited on trip completion, so nothing is taken back here;
+                # one atomic credit replaces the old deduct-then-add pair.
                 host = self.car.host
                 if host:
-                    # Deduct full amount first (as it was added on payment)
-                    host.deduct_from_wallet(self.total_price)
-                    # Add back 50% (host keeps 50% as cancellation fee)
-                    host.add_to_wallet(self.total_price * 0.5)
+                    host.add_to_wallet(fee)
+                record_booking_cancellation(self, host.id if host else None, self.cancellation_fee_deducted,
+                                            self.refund_amount, 'user')
             else:
                 # If not paid, no fee/refund
                 self.cancellation_fee_deducted = 0.0
                 self.refund_amount = 0.0
+            record_booking_rollup(self, self.car.host_id)
+            cancel_booking_reminders(self.id)
 
             db.session.add(self)
 
@@ -485,10 +502,12 @@ class Booking(db.Model):
             self.cancellation_fee_deducted = 0.0
             self.refund_amount = self.total_price  # Full refund
 
-            # Update host wallet (remove earnings if paid)
-            host = self.car.host
-            if host and self.payment_status == 'completed':
-                host.deduct_from_wallet(self.total_price)
+            # Host wallet is untouched: earnings are only credited on trip completion,
+            # and a booking can only be host-cancelled before the trip starts.
+            if self.payment_status == 'completed':
+                record_booking_cancellation(self, self.car.host_id, 0, self.refund_amount, 'host')
+            record_booking_rollup(self, self.car.host_id)
+            cancel_booking_reminders(self.id)
 
             # Notify Admin (placeholder - implement notification logic)
             self._notify_admin_of_host_cancellation(reason)
@@ -690,6 +709,7 @@ class Booking(db.Model):
                 self.status = 'extended'  # Indicate it's been extended
 
             db.session.add(self)
+            schedule_booking_reminders(self)  # Moves the trip-end reminders to the new end date
             return True
         return False
 
@@ -754,4 +774,4 @@ class Booking(db.Model):
 @db.event.listens_for(Booking, 'before_update')
 def update_booking_price(mapper, connection, target):
     target.update_price_before_save()
-# --- End Hook ---
\ No newline at end of file
+# --- End Hook ---
@@ -0,0 +1,63 @@
+# models/broadcast.py
+"""
+Broadcast notifications (offers and announcements) to a user segment.
+
+Creating a broadcast is one INSERT on the request path. The fan-out job
+(tasks/broadcasts.py) writes the notifications in user-id windows with
+INSERT ... SELECT and records its cursor (last_user_id) and counters in the
+same transaction as each window, so progress is exact and an interrupted
+broadcast resumes where it stopped.
+"""
+from . import db
+from datetime import datetime
+
+BROADCAST_SEGMENTS = ('all', 'city', 'recent_bookers')
+
+
+class Broadcast(db.Model):
+    __tablename__ = 'broadcasts'
+
+    id = db.Column(db.Integer, primary_key=True)
+    message = db.Column(db.String(255), nullable=False)
+    # --- Targeting ---
+    segment = db.Column(db.String(20), nullable=False, default='all')  # all, city, recent_bookers
+    segment_value = db.Column(db.String(100))  # City name, or days for recent_bookers
+    # --- End Targeting ---
+    # --- Progress Fields ---
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)  # queued, running, completed, failed
+    total_recipients = db.Column(db.Integer)  # Counted when the job starts
+    sent_count = db.Column(db.Integer, nullable=False, default=0)
+    last_user_id = db.Column(db.Integer, nullable=False, default=0)  # Fan-out cursor
+    max_user_id = db.Column(db.Integer)  # Highest user id at start; later sign-ups are not targeted
+    heartbeat_at = db.Column(db.DateTime)  # Refreshed per window; a stale one lets another run take over
+    error = db.Column(db.String(255))
+    # --- End Progress Fields ---
+    created_by_admin_id = db.Column(db.Integer, db.ForeignKey('admins.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    completed_at = db.Column(db.DateTime)
+
+    def progress(self):
+        """Fraction of the target id range processed (0.0 - 1.0)."""
+        if self.status == 'completed':
+            return 1.0
+        if not self.max_user_id:
+            return 0.0
+        return round(min(self.last_user_id / self.max_user_id, 1.0), 4)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'segment': self.segment,
+            'segment_value': self.segment_value,
+            'status': self.status,
+            'total_recipients': self.total_recipients,
+            'sent_count': self.sent_count,
+            'progress': self.progress(),
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None,
+        }
+
+    def __repr__(self):
+        return f'<Broadcast {self.id} {self.segment} ({self.status}) {self.sent_count}/{self.total_recipients}>'
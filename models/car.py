@@ -31,7 +31,7 @@ class Car(db.Model):
 
     # --- Relationships and Foreign Keys ---
     # Link to the Host who owns this car
-    host_id = db.Column(db.Integer, db.ForeignKey('hosts.id'), nullable=False)
+    host_id = db.Column(db.Integer, db.ForeignKey('hosts.id'), nullable=False, index=True)
 
     # --- CRITICAL: Ensure this foreign key and relationship are correct ---
     # If you are using a separate 'locations' table (OLD APPROACH):
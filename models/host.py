@@ -6,6 +6,7 @@ from datetime import datetime
 from . import db
 from datetime import datetime
 
+from utils.wallet_service import credit_wallet, debit_wallet, InsufficientFundsError
 from .host_bank_account import HostBankAccount
 
 
@@ -57,34 +58,32 @@ class Host(db.Model):
     def add_to_wallet(self, amount):
         """
         Add funds to the host's wallet.
+        Applied as one SQL UPDATE (utils/wallet_service.py) so concurrent credits are not lost;
+        the calling function commits.
         Args:
             amount (float): The amount to add (positive value).
         Returns:
             bool: True if successful, False otherwise.
         """
         if amount > 0:
-            self.wallet_balance += amount
-            db.session.add(self)  # Add the modified object to the session
-            # --- CRITICAL FIX: DO NOT COMMIT HERE ---
-            # db.session.commit() # <-- REMOVE THIS LINE
-            # --- END CRITICAL FIX ---
+            credit_wallet(self, amount)
             return True
         return False
 
     def deduct_from_wallet(self, amount):
         """
         Deduct funds from the host's wallet.
+        The balance check and the debit are one conditional SQL UPDATE; the calling function commits.
         Args:
             amount (float): The amount to deduct (positive value).
         Returns:
             bool: True if successful (sufficient balance), False otherwise.
         """
-        if amount > 0 and self.wallet_balance >= amount:
-            self.wallet_balance -= amount
-            db.session.add(self)  # Add the modified object to the session
-            # --- CRITICAL FIX: DO NOT COMMIT HERE ---
-            # db.session.commit() # <-- REMOVE THIS LINE
-            # --- END CRITICAL FIX ---
+        if amount > 0:
+            try:
+                debit_wallet(self, amount)
+            except InsufficientFundsError:
+                return False
             return True
         return False
     # --- END CRITICAL FIX ---
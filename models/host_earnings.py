@@ -0,0 +1,37 @@
+# models/host_earnings.py
+"""
+Daily host earnings rollups.
+
+One row per (host, car, day) with the counters host analytics need, so the
+analytics pages read a few hundred small rows instead of scanning every
+booking. Rows are maintained incrementally when a booking completes or is
+cancelled (utils/host_rollups.py) and rebuilt for a date range by
+tasks/rollups.py. Days are IST calendar days.
+"""
+from . import db
+from datetime import datetime
+
+
+class HostDailyEarnings(db.Model):
+    __tablename__ = 'host_daily_earnings'
+    __table_args__ = (
+        # Upsert key; also serves the per-host date-range scans of the analytics API
+        db.UniqueConstraint('host_id', 'day', 'car_id', name='uq_host_daily_earnings_host_day_car'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    host_id = db.Column(db.Integer, db.ForeignKey('hosts.id'), nullable=False)
+    car_id = db.Column(db.Integer, db.ForeignKey('cars.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    # --- Counters ---
+    bookings = db.Column(db.Integer, nullable=False, default=0)  # Completed trips (by trip end day)
+    hours_booked = db.Column(db.Float, nullable=False, default=0.0)
+    gross = db.Column(db.Float, nullable=False, default=0.0)  # Trip revenue incl. paid extensions
+    host_share = db.Column(db.Float, nullable=False, default=0.0)  # Trip share plus cancellation fees kept
+    cancellations = db.Column(db.Integer, nullable=False, default=0)  # By user or host (not expired holds)
+    refunds = db.Column(db.Float, nullable=False, default=0.0)  # Refunded to users on cancellation
+    # --- End Counters ---
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<HostDailyEarnings Host {self.host_id} Car {self.car_id} {self.day}>'
@@ -0,0 +1,100 @@
+# models/ledger.py
+"""
+Double-entry ledger.
+
+Every money movement is one LedgerEntry with two or more LedgerPostings whose
+amounts sum to zero. An account's balance is the sum of its postings
+(positive = money held by that account). LedgerBalanceSnapshot rows store
+periodic per-account balances so "balance as of X" only has to add the
+postings after the nearest snapshot (see utils/ledger_service.py).
+"""
+from . import db
+from datetime import datetime
+
+
+class LedgerAccount(db.Model):
+    """
+    One account per (account_type, owner_id).
+    account_type: 'user' / 'host' (owner_id = users.id / hosts.id) or a platform
+    account with owner_id 0: 'platform' (commission and fees kept),
+    'escrow' (booking payments held until the trip completes) and
+    'gateway' (money entering/leaving through the payment gateway or bank).
+    """
+    __tablename__ = 'ledger_accounts'
+    __table_args__ = (
+        db.UniqueConstraint('account_type', 'owner_id', name='uq_ledger_accounts_type_owner'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    account_type = db.Column(db.String(20), nullable=False)
+    owner_id = db.Column(db.Integer, nullable=False, default=0)  # users.id / hosts.id, 0 for platform accounts
+    name = db.Column(db.String(100), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<LedgerAccount {self.id}: {self.name}>'
+
+
+class LedgerEntry(db.Model):
+    """A balanced journal entry: the postings of one business event."""
+    __tablename__ = 'ledger_entries'
+    __table_args__ = (
+        db.Index('ix_ledger_entries_reference', 'reference_type', 'reference_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    entry_type = db.Column(db.String(30), nullable=False)  # booking_payment, trip_completion, user_cancellation, ...
+    description = db.Column(db.String(255), nullable=False)
+    reference_id = db.Column(db.Integer)
+    reference_type = db.Column(db.String(50))  # 'booking', 'wallet_transaction', ...
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    # --- Relationship Definitions ---
+    postings = db.relationship('LedgerPosting', backref='entry', lazy=True)
+    # --- End Relationships ---
+
+    def __repr__(self):
+        return f'<LedgerEntry {self.id}: {self.entry_type}>'
+
+
+class LedgerPosting(db.Model):
+    """One leg of a LedgerEntry. Amounts of an entry sum to zero."""
+    __tablename__ = 'ledger_postings'
+    __table_args__ = (
+        # Serves both "tail after snapshot" (id range) and "as of date" scans per account
+        db.Index('ix_ledger_postings_account_created', 'account_id', 'created_at'),
+        db.Index('ix_ledger_postings_account_id_id', 'account_id', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    entry_id = db.Column(db.Integer, db.ForeignKey('ledger_entries.id'), nullable=False, index=True)
+    account_id = db.Column(db.Integer, db.ForeignKey('ledger_accounts.id'), nullable=False)
+    amount = db.Column(db.Numeric(14, 2), nullable=False)  # Signed: + into the account, - out of it
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    # --- Relationship Definitions ---
+    account = db.relationship('LedgerAccount', lazy=True)
+    # --- End Relationships ---
+
+    def __repr__(self):
+        return f'<LedgerPosting {self.id}: {self.amount} to Account {self.account_id}>'
+
+
+class LedgerBalanceSnapshot(db.Model):
+    """
+    Balance of one account including every posting with id <= last_posting_id.
+    Written for all accounts in one run (tasks/ledger.py).
+    """
+    __tablename__ = 'ledger_balance_snapshots'
+    __table_args__ = (
+        db.UniqueConstraint('account_id', 'as_of', name='uq_ledger_snapshots_account_as_of'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    account_id = db.Column(db.Integer, db.ForeignKey('ledger_accounts.id'), nullable=False)
+    as_of = db.Column(db.DateTime, nullable=False, index=True)
+    last_posting_id = db.Column(db.Integer, nullable=False)
+    balance = db.Column(db.Numeric(14, 2), nullable=False)
+
+    def __repr__(self):
+        return f'<LedgerBalanceSnapshot Account {self.account_id} @ {self.as_of}: {self.balance}>'
@@ -15,6 +15,10 @@ class Notification(db.Model):
     """
     # --- Table Definition ---
     __tablename__ = 'notifications'  # Name of the database table
+    __table_args__ = (
+        # List view and unread scans: WHERE user_id = ? [AND is_read = 0] ORDER BY timestamp DESC
+        db.Index('ix_notifications_user_read_time', 'user_id', 'is_read', 'timestamp'),
+    )
     # --- End Table Definition ---
 
     # --- Column Definitions ---
@@ -39,6 +43,12 @@ class Notification(db.Model):
     # Timestamp of when the notification was created
     # Default is the current UTC time when the record is created
     timestamp = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    # External delivery state (tasks/notification_dispatch.py)
+    # 'pending' until handed to the outbound message queue: 'queued' (a WhatsApp message was
+    # enqueued, see models/outbound_message.py) or 'skipped' (no external channel for this recipient).
+    dispatch_status = db.Column(db.String(20), default='pending', nullable=False, index=True)
+    dispatched_at = db.Column(db.DateTime)
     # --- End Column Definitions ---
 
     # --- Relationship Definitions ---
@@ -62,6 +72,8 @@ class Notification(db.Model):
     def mark_as_read(self):
         """
         Mark the notification as read.
+        Routes use utils/notification_counters.mark_notification_read() instead, which
+        also keeps the user's unread counter in step.
         """
         self.is_read = True
         # Optionally, add to session and commit here if desired,
@@ -79,4 +91,19 @@ class Notification(db.Model):
         # db.session.add(self)
         # db.session.commit()
     # --- End Helper Methods ---
-# --- End Notification Model ---
\ No newline at end of file
+# --- End Notification Model ---
+
+
+class NotificationCounter(db.Model):
+    """
+    Unread notification count per user, maintained incrementally
+    (utils/notification_counters.py) so badges never COUNT(*) the notifications table.
+    """
+    __tablename__ = 'notification_counters'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    unread_count = db.Column(db.Integer, nullable=False, default=0)
+    reconciled_at = db.Column(db.DateTime)  # Last time the reconciliation job checked this row
+
+    def __repr__(self):
+        return f'<NotificationCounter user={self.user_id} unread={self.unread_count}>'
@@ -0,0 +1,59 @@
+# models/outbound_message.py
+"""
+Persistent queue of outbound WhatsApp/SMS messages.
+
+Rows are enqueued in the same transaction as the change they announce
+(utils/messaging.enqueue_message, or the notification hand-off in
+tasks/notification_dispatch.py). The dispatcher (tasks/messaging.py) claims
+due rows through the (status, next_attempt_at) index, sends them from a
+thread pool and records the outcome: 'sent', back to 'queued' with a later
+next_attempt_at (exponential backoff), or 'dead' once retries are exhausted
+or the provider rejects the message outright. Dead rows stay in the table
+for inspection and can be requeued with `flask messages-requeue-dead`.
+"""
+from . import db
+from datetime import datetime
+
+MESSAGE_CHANNELS = ('whatsapp', 'sms')
+
+
+class OutboundMessage(db.Model):
+    __tablename__ = 'outbound_messages'
+    __table_args__ = (
+        # The dispatcher's range scan: status = 'queued' AND next_attempt_at <= now, oldest first
+        db.Index('ix_outbound_messages_status_due', 'status', 'next_attempt_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    channel = db.Column(db.String(20), nullable=False, default='whatsapp')  # 'whatsapp' or 'sms'
+    provider = db.Column(db.String(20), nullable=False)  # Provider name at enqueue time ('twilio', 'fake')
+    to_number = db.Column(db.String(20), nullable=False)  # E.164
+    body = db.Column(db.String(1600), nullable=False)
+    notification_id = db.Column(db.Integer, db.ForeignKey('notifications.id'), index=True)  # Source notification, if any
+    # --- Delivery State ---
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, sending, sent, dead
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    claimed_at = db.Column(db.DateTime)  # Set while 'sending'; a stale claim is taken again
+    last_error = db.Column(db.String(255))
+    provider_message_id = db.Column(db.String(64))
+    sent_at = db.Column(db.DateTime)
+    # --- End Delivery State ---
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'channel': self.channel,
+            'provider': self.provider,
+            'to_number': self.to_number,
+            'status': self.status,
+            'attempts': self.attempts,
+            'next_attempt_at': self.next_attempt_at.isoformat() if self.next_attempt_at else None,
+            'last_error': self.last_error,
+            'sent_at': self.sent_at.isoformat() if self.sent_at else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+        }
+
+    def __repr__(self):
+        return f'<OutboundMessage {self.id} {self.channel} to {self.to_number} ({self.status}, {self.attempts} attempts)>'
@@ -0,0 +1,32 @@
+# models/payment_event.py
+from . import db
+from datetime import datetime
+
+
+class PaymentEvent(db.Model):
+    """
+    Dedup ledger for Razorpay payment callbacks.
+    One row per razorpay_payment_id ever seen; the unique key is what makes
+    callback processing idempotent (see controllers/payment_controller.py).
+    """
+    __tablename__ = 'payment_events'
+
+    id = db.Column(db.Integer, primary_key=True)
+    # --- Gateway Identifiers ---
+    razorpay_payment_id = db.Column(db.String(50), unique=True, nullable=False)  # Dedup key
+    razorpay_order_id = db.Column(db.String(50), nullable=False, index=True)
+    # --- End Gateway Identifiers ---
+
+    booking_id = db.Column(db.Integer, db.ForeignKey('bookings.id'), index=True)
+    event_type = db.Column(db.String(20), nullable=False)  # booking_payment, extension_payment
+    outcome = db.Column(db.String(20), nullable=False)  # applied, ignored
+    amount = db.Column(db.Float)  # Amount applied to the booking (rupees)
+    source = db.Column(db.String(50))  # Callback path that delivered it (e.g. 'booking.handle_payment')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # --- Relationship Definitions ---
+    booking = db.relationship('Booking', backref=db.backref('payment_events', lazy='dynamic'))
+    # --- End Relationships ---
+
+    def __repr__(self):
+        return f'<PaymentEvent {self.razorpay_payment_id} ({self.event_type}, {self.outcome}) for Booking {self.booking_id}>'
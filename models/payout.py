@@ -0,0 +1,63 @@
+# models/payout.py
+"""
+Host payouts.
+
+A host withdrawal is queued as a PayoutRequest (one INSERT on the request path).
+The payout job (tasks/payouts.py) groups queued requests per bank into
+PayoutBatch rows, debits the host wallets in bulk, writes one bank upload file
+per batch and later records the settlement outcome.
+"""
+from . import db
+from datetime import datetime
+
+
+class PayoutBatch(db.Model):
+    __tablename__ = 'payout_batches'
+
+    id = db.Column(db.Integer, primary_key=True)
+    bank_code = db.Column(db.String(4), nullable=False, index=True)  # IFSC prefix, e.g. 'HDFC'
+    # --- Status Fields ---
+    status = db.Column(db.String(20), nullable=False, default='created')  # created, settled, partially_settled
+    request_count = db.Column(db.Integer, nullable=False, default=0)
+    total_amount = db.Column(db.Float, nullable=False, default=0.0)
+    settled_amount = db.Column(db.Float, nullable=False, default=0.0)
+    # --- End Status Fields ---
+    file_path = db.Column(db.String(255))  # Bank upload file
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    settled_at = db.Column(db.DateTime)
+
+    # --- Relationship Definitions ---
+    requests = db.relationship('PayoutRequest', backref='batch', lazy='dynamic')
+    # --- End Relationships ---
+
+    def __repr__(self):
+        return f'<PayoutBatch {self.id} {self.bank_code} ({self.status}) ₹{self.total_amount}>'
+
+
+class PayoutRequest(db.Model):
+    __tablename__ = 'payout_requests'
+    __table_args__ = (
+        # The batching job scans queued requests oldest first
+        db.Index('ix_payout_requests_status_requested', 'status', 'requested_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    host_id = db.Column(db.Integer, db.ForeignKey('hosts.id'), nullable=False, index=True)
+    bank_account_id = db.Column(db.Integer, db.ForeignKey('host_bank_accounts.id'), nullable=False)
+    amount = db.Column(db.Float, nullable=False)
+    # --- Status Fields ---
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, batched, paid, failed
+    batch_id = db.Column(db.Integer, db.ForeignKey('payout_batches.id'), index=True)
+    failure_reason = db.Column(db.String(255))
+    # --- End Status Fields ---
+    requested_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    processed_at = db.Column(db.DateTime)  # Batched (wallet debited) or failed
+    settled_at = db.Column(db.DateTime)
+
+    # --- Relationship Definitions ---
+    host = db.relationship('Host', backref=db.backref('payout_requests', lazy='dynamic'))
+    bank_account = db.relationship('HostBankAccount')
+    # --- End Relationships ---
+
+    def __repr__(self):
+        return f'<PayoutRequest {self.id} Host {self.host_id} ₹{self.amount} ({self.status})>'
@@ -0,0 +1,37 @@
+# models/reminder.py
+"""
+Persistent booking reminders.
+
+One row per (booking, kind) with the UTC time it is due. Rows are scheduled
+when a booking is paid, moved when an extension is paid and cancelled when
+the booking is cancelled or completed (utils/reminders.py). The worker
+(tasks/reminders.py) reads only rows that are due through the
+(status, due_at) index and marks each one sent in the same transaction that
+writes its notification.
+"""
+from . import db
+from datetime import datetime
+
+
+class BookingReminder(db.Model):
+    __tablename__ = 'booking_reminders'
+    __table_args__ = (
+        db.UniqueConstraint('booking_id', 'kind', name='uq_booking_reminders_booking_kind'),
+        # The worker's range scan: status = 'scheduled' AND due_at <= now, oldest first
+        db.Index('ix_booking_reminders_status_due', 'status', 'due_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    booking_id = db.Column(db.Integer, db.ForeignKey('bookings.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    kind = db.Column(db.String(20), nullable=False)  # 'start_2h', 'start_1h', 'end_2h', 'end_1h'
+    message = db.Column(db.String(255), nullable=False)
+    due_at = db.Column(db.DateTime, nullable=False)
+    # --- Status Fields ---
+    status = db.Column(db.String(20), nullable=False, default='scheduled')  # scheduled, sent, cancelled, expired
+    sent_at = db.Column(db.DateTime)
+    # --- End Status Fields ---
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<BookingReminder {self.id} booking={self.booking_id} {self.kind} due {self.due_at} ({self.status})>'
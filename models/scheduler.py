@@ -0,0 +1,47 @@
+# models/scheduler.py
+"""
+Per-job run statistics written by the scheduler leader (tasks/scheduler.py).
+
+Only the elected leader runs jobs, possibly in a separate `flask scheduler`
+process, so the numbers live in the database where every web worker (and
+the admin metrics endpoint) can read them.
+"""
+from . import db
+from datetime import datetime
+
+
+class SchedulerJobStat(db.Model):
+    __tablename__ = 'scheduler_job_stats'
+
+    job_id = db.Column(db.String(64), primary_key=True)
+    # --- Counters ---
+    runs = db.Column(db.Integer, nullable=False, default=0)
+    failures = db.Column(db.Integer, nullable=False, default=0)
+    missed = db.Column(db.Integer, nullable=False, default=0)  # Runs APScheduler skipped (past misfire grace time)
+    total_duration_seconds = db.Column(db.Float, nullable=False, default=0.0)
+    # --- End Counters ---
+    # --- Last Run ---
+    last_started_at = db.Column(db.DateTime)
+    last_duration_seconds = db.Column(db.Float)
+    last_lag_seconds = db.Column(db.Float)  # Actual start minus scheduled start
+    last_error = db.Column(db.String(255))
+    last_runner = db.Column(db.String(100))  # host:pid of the leader that ran it
+    # --- End Last Run ---
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'job_id': self.job_id,
+            'runs': self.runs,
+            'failures': self.failures,
+            'missed': self.missed,
+            'avg_duration_seconds': round(self.total_duration_seconds / self.runs, 3) if self.runs else None,
+            'last_started_at': self.last_started_at.isoformat() if self.last_started_at else None,
+            'last_duration_seconds': self.last_duration_seconds,
+            'last_lag_seconds': self.last_lag_seconds,
+            'last_error': self.last_error,
+            'last_runner': self.last_runner,
+        }
+
+    def __repr__(self):
+        return f'<SchedulerJobStat {self.job_id}: {self.runs} runs, {self.failures} failures>'
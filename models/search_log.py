@@ -0,0 +1,54 @@
+# models/search_log.py
+"""
+Search demand log.
+
+SearchLog is an append-only staging table written in batches by the
+background writer in utils/search_log.py (one row per car search). The
+compaction job (tasks/search_demand.py) folds settled rows into
+SearchDemandDaily, one row per (geo cell, IST day), and deletes them, so the
+raw table only ever holds the last few minutes of searches.
+
+A geo cell is a SEARCH_GEO_CELL_DEGREES square identified as
+'<lat index>:<lng index>' (floor of coordinate / cell size).
+"""
+from . import db
+from datetime import datetime
+
+
+class SearchLog(db.Model):
+    __tablename__ = 'search_logs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    source = db.Column(db.String(20), nullable=False)  # 'car_list', 'api_search'
+    cell = db.Column(db.String(24))  # None when the search had no coordinates
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    filters = db.Column(db.Text)  # JSON of the active filters
+    result_count = db.Column(db.Integer, nullable=False, default=0)
+    latency_ms = db.Column(db.Float, nullable=False, default=0.0)
+    user_id = db.Column(db.Integer)  # Not a foreign key: anonymous searches and deleted users stay logged
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<SearchLog {self.id} {self.source} cell={self.cell} results={self.result_count}>'
+
+
+class SearchDemandDaily(db.Model):
+    __tablename__ = 'search_demand_daily'
+    __table_args__ = (
+        db.UniqueConstraint('day', 'cell', name='uq_search_demand_daily_day_cell'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    cell = db.Column(db.String(24), nullable=False)  # 'unknown' for searches without coordinates
+    # --- Counters ---
+    searches = db.Column(db.Integer, nullable=False, default=0)
+    zero_result_searches = db.Column(db.Integer, nullable=False, default=0)
+    results_total = db.Column(db.Integer, nullable=False, default=0)
+    latency_ms_total = db.Column(db.Float, nullable=False, default=0.0)
+    # --- End Counters ---
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<SearchDemandDaily {self.day} {self.cell}: {self.searches} searches>'
@@ -2,8 +2,15 @@
 from . import db
 from datetime import datetime
 
+from utils import ledger_service as ledger
+from utils.wallet_service import apply_balance_delta
+
 class WalletTransaction(db.Model):
     __tablename__ = 'wallet_transactions'
+    __table_args__ = (
+        # Statement exports and wallet history scan one user's rows by time
+        db.Index('ix_wallet_transactions_user_timestamp', 'user_id', 'timestamp'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     # --- CRITICAL FIX: Use String for Foreign Key ---
@@ -38,7 +45,8 @@ class WalletTransaction(db.Model):
 
     # --- CRITICAL FIX: Import User inside classmethod to avoid circular import ---
     @classmethod
-    def record_transaction(cls, user, amount, transaction_type, description, reference_id=None, reference_type=None):
+    def record_transaction(cls, user, amount, transaction_type, description, reference_id=None, reference_type=None,
+                           allow_overdraft=False):
         """
         Record a wallet transaction for a user.
         Args:
@@ -48,8 +56,11 @@ class WalletTransaction(db.Model):
             description (str): Description of the transaction.
             reference_id (int, optional): ID of related entity.
             reference_type (str, optional): Type of related entity.
+            allow_overdraft (bool, optional): Let a debit take the balance below zero.
         Returns:
             WalletTransaction: The created transaction object.
+        Raises:
+            InsufficientFundsError: Debit larger than the current balance.
         """
         # --- Import User inside the method to avoid circular import at module level ---
         from .user import User # Import User model INSIDE the method
@@ -66,34 +77,35 @@ class WalletTransaction(db.Model):
             raise ValueError("Invalid description provided to record_transaction.")
         # --- End Validation ---
 
-        # Calculate new balance based on transaction type
+        # --- Apply the balance change in SQL, then ledger it with the resulting balance ---
+        # One UPDATE ... SET wallet_balance = wallet_balance + :delta (see utils/wallet_service.py):
+        # the row stays locked until the caller commits, so balance_after cannot be computed
+        # from a stale in-memory value and concurrent transactions cannot lose updates.
         if transaction_type in ['deposit', 'earning', 'refund', 'bonus']:
-            new_balance = user.wallet_balance + amount
+            delta = amount
         elif transaction_type in ['withdrawal', 'deduction', 'penalty']:
-            new_balance = user.wallet_balance - amount
+            delta = -amount
         else:
             raise ValueError(f"Invalid transaction type: {transaction_type}")
 
+        new_balance = apply_balance_delta(User, user.id, delta, allow_overdraft=allow_overdraft)
+        # --- End Balance Change ---
+
         # Create transaction record
         transaction = cls(
             user_id=user.id,
             amount=round(amount, 2),
             transaction_type=transaction_type,
             description=description[:255], # Truncate description
-            balance_after=round(new_balance, 2),
+            balance_after=new_balance,
             reference_id=reference_id,
             reference_type=reference_type,
             timestamp=datetime.utcnow()
         )
 
-        # Update user's wallet balance in memory (actual DB update happens in calling function)
-        # This assumes user.add_to_wallet/deduct_from_wallet handles DB persistence
-        if transaction_type in ['deposit', 'earning', 'refund', 'bonus']:
-            user.wallet_balance = new_balance # Update in memory
-        elif transaction_type in ['withdrawal', 'deduction', 'penalty']:
-            user.wallet_balance = new_balance # Update in memory
-
         db.session.add(transaction) # Add transaction to session
+        # Double-entry counterpart (platform or gateway account), same transaction
+        ledger.record_wallet_transaction(transaction, delta)
         # Note: Don't commit here, let the caller handle the transaction
         return transaction
     # --- END CRITICAL FIX ---
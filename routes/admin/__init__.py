@@ -5,6 +5,6 @@ from flask import Blueprint
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
 # Import route modules to register them with the blueprint
-from . import auth, dashboard, users, hosts, cars, bookings, transactions, admins
+from . import auth, dashboard, users, hosts, cars, bookings, transactions, admins, offers
 
-__all__ = ['admin_bp', 'auth', 'dashboard', 'users', 'hosts', 'cars', 'bookings', 'transactions', 'admins']
\ No newline at end of file
+__all__ = ['admin_bp', 'auth', 'dashboard', 'users', 'hosts', 'cars', 'bookings', 'transactions', 'admins', 'offers']
\ No newline at end of file
@@ -5,6 +5,7 @@ from . import admin_bp
 from models import db
 from models.car import Car
 from models.host import Host
+from utils.upload_store import release_upload
 
 
 @admin_bp.route('/cars')
@@ -96,9 +97,7 @@ def delete_car(car_id):
 
         # Delete associated images first (filesystem cleanup)
         for image in car.images:
-            filepath = os.path.join('static', 'uploads', image.filename)
-            if os.path.exists(filepath):
-                os.remove(filepath)
+            release_upload(image.filename)  # The file goes once no other row references it
             db.session.delete(image)
 
         # Delete the car
@@ -1,13 +1,14 @@
 # routes/admin/dashboard.py
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required, current_user
 from . import admin_bp
-from models import db
-from models.user import User
-from models.host import Host
-from models.car import Car
-from models.booking import Booking
 from models.admin import Admin  # <-- Import Admin model
+from models.scheduler import SchedulerJobStat
+from utils.admin_metrics import get_dashboard_metrics
+from utils.payment_gateway import get_payment_gateway
+from utils.admin_timeseries import TimeSeriesError, get_booking_timeseries, parse_timeseries_args
+from utils.search_log import get_demand_heatmap
+from utils.timezone import get_current_ist_time
 
 
 @admin_bp.route('/')  # <-- This creates the 'admin.dashboard' endpoint
@@ -30,28 +31,80 @@ def dashboard():
     # --- END CRITICAL FIX 1 ---
 
     # --- Get statistics ---
-    total_users = User.query.count()
-    total_hosts = Host.query.count()
-    total_cars = Car.query.count()
-    total_bookings = Booking.query.count()
-    total_admins = Admin.query.count()
-
-    # Get recent entities
-    recent_users = User.query.order_by(User.created_at.desc()).limit(5).all()
-    recent_hosts = Host.query.order_by(Host.created_at.desc()).limit(5).all()
-    recent_bookings = Booking.query.order_by(Booking.created_at.desc()).limit(5).all()
-    recent_cars = Car.query.order_by(Car.created_at.desc()).limit(5).all()
-    recent_admins = Admin.query.order_by(Admin.created_at.desc()).limit(5).all()
+    # Counters and recent lists come from the background-refreshed snapshot
+    # (one COUNT round trip, eager-loaded recent lists) instead of ten queries per load.
+    metrics = get_dashboard_metrics()
     # --- End Get Statistics ---
 
     return render_template('admin/dashboard.html',
-                           total_users=total_users,
-                           total_hosts=total_hosts,
-                           total_cars=total_cars,
-                           total_bookings=total_bookings,
-                           total_admins=total_admins,
-                           recent_users=recent_users,
-                           recent_hosts=recent_hosts,
-                           recent_bookings=recent_bookings,
-                           recent_cars=recent_cars,
-                           recent_admins=recent_admins)
+                           total_users=metrics['total_users'],
+                           total_hosts=metrics['total_hosts'],
+                           total_cars=metrics['total_cars'],
+                           total_bookings=metrics['total_bookings'],
+                           total_admins=metrics['total_admins'],
+                           recent_users=metrics['recent_users'],
+                           recent_hosts=metrics['recent_hosts'],
+                           recent_bookings=metrics['recent_bookings'],
+                           recent_cars=metrics['recent_cars'],
+                           recent_admins=metrics['recent_admins'],
+                           metrics_generated_at=metrics['generated_at'])
+
+
+@admin_bp.route('/metrics/timeseries')
+@login_required
+def booking_timeseries():
+    """
+    Booking and revenue trends as JSON
+    (?start=YYYY-MM-DD&end=YYYY-MM-DD&bucket=day|week|month&group_by=city|fuel_type|host).
+    This is the 'admin.booking_timeseries' endpoint.
+    """
+    if not isinstance(current_user, Admin):
+        return jsonify({'error': 'Access denied.'}), 403
+    try:
+        start_day, end_day, bucket, group_by = parse_timeseries_args(request.args, get_current_ist_time().date())
+        return jsonify(get_booking_timeseries(start_day, end_day, bucket=bucket, group_by=group_by))
+    except TimeSeriesError as e:
+        return jsonify({'error': str(e)}), 400
+
+
+@admin_bp.route('/metrics/search-demand')
+@login_required
+def search_demand():
+    """
+    Search demand against available cars per geo cell as JSON
+    (?start=YYYY-MM-DD&end=YYYY-MM-DD&limit=N, defaults to the last 90 days).
+    This is the 'admin.search_demand' endpoint.
+    """
+    if not isinstance(current_user, Admin):
+        return jsonify({'error': 'Access denied.'}), 403
+    try:
+        start_day, end_day, _, _ = parse_timeseries_args(request.args, get_current_ist_time().date())
+    except TimeSeriesError as e:
+        return jsonify({'error': str(e)}), 400
+    limit = min(max(request.args.get('limit', 500, type=int), 1), 5000)
+    return jsonify(get_demand_heatmap(start_day, end_day, limit=limit))
+
+
+@admin_bp.route('/metrics/scheduler')
+@login_required
+def scheduler_metrics():
+    """
+    Background job run counts, failures, durations and lag as JSON (written by the scheduler leader).
+    This is the 'admin.scheduler_metrics' endpoint.
+    """
+    if not isinstance(current_user, Admin):
+        return jsonify({'error': 'Access denied.'}), 403
+    stats = SchedulerJobStat.query.order_by(SchedulerJobStat.job_id).all()
+    return jsonify([stat.to_dict() for stat in stats])
+
+
+@admin_bp.route('/metrics/payment-gateway')
+@login_required
+def payment_gateway_metrics():
+    """
+    Payment gateway breaker state and per-operation latency/error metrics as JSON (this worker only).
+    This is the 'admin.payment_gateway_metrics' endpoint.
+    """
+    if not isinstance(current_user, Admin):
+        return jsonify({'error': 'Access denied.'}), 403
+    return jsonify(get_payment_gateway().get_metrics())
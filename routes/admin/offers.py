@@ -1,25 +1,85 @@
 # routes/admin/offers.py
-# ... (imports) ...
-from flask_login import login_required
+from flask import request, jsonify, url_for
+from flask_login import login_required, current_user
 
+from models import db
+from models.admin import Admin
+from models.broadcast import Broadcast
 from routes.admin import admin_bp
-from utils.notification_sender import send_notification_to_user # Import notification sender
-# ... (blueprint definition) ...
+from utils.broadcasts import BroadcastError, create_broadcast
 
-@admin_bp.route('/offers/create', methods=['POST']) # Example endpoint
+
+@admin_bp.route('/offers/create', methods=['POST'])
 @login_required
 def create_offer():
-    # ... (admin authorization check) ...
-    # ... (offer creation logic) ...
-
-    # Example: Send notification to all users
-    # In practice, you might segment users or target specific ones
-    from models.user import User
-    all_users = User.query.all()
-    offer_message = f"New offer available: {offer_details}!" # Construct message
-    for user in all_users:
-        send_notification_to_user(user_id=user.id, message=offer_message)
-
-    flash('Offer created and notifications sent!', 'success')
-    return redirect(url_for('admin.list_offers')) # Example redirect
-# ... (rest of routes) ...
\ No newline at end of file
+    """
+    Queue an offer broadcast (form or JSON: message, segment=all|city|recent_bookers, segment_value).
+    The notifications are written by the background fan-out job (tasks/broadcasts.py);
+    this request only inserts the broadcast row.
+    This is the 'admin.create_offer' endpoint.
+    """
+    if not isinstance(current_user, Admin):
+        return jsonify({'error': 'Access denied.'}), 403
+    data = request.get_json(silent=True) or request.form
+    try:
+        broadcast = create_broadcast(
+            data.get('message'),
+            segment=(data.get('segment') or 'all').lower(),
+            segment_value=data.get('segment_value'),
+            admin_id=current_user.id
+        )
+        db.session.commit()
+    except BroadcastError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    response = jsonify(broadcast.to_dict())
+    response.headers['Location'] = url_for('admin.broadcast_status', broadcast_id=broadcast.id)
+    return response, 202
+
+
+@admin_bp.route('/offers/broadcasts')
+@login_required
+def list_broadcasts():
+    """
+    The most recent broadcasts with their progress as JSON.
+    This is the 'admin.list_broadcasts' endpoint.
+    """
+    if not isinstance(current_user, Admin):
+        return jsonify({'error': 'Access denied.'}), 403
+    broadcasts = Broadcast.query.order_by(Broadcast.id.desc()).limit(50).all()
+    return jsonify([broadcast.to_dict() for broadcast in broadcasts])
+
+
+@admin_bp.route('/offers/broadcasts/<int:broadcast_id>')
+@login_required
+def broadcast_status(broadcast_id):
+    """
+    Progress of one broadcast as JSON.
+    This is the 'admin.broadcast_status' endpoint.
+    """
+    if not isinstance(current_user, Admin):
+        return jsonify({'error': 'Access denied.'}), 403
+    broadcast = db.session.get(Broadcast, broadcast_id)
+    if broadcast is None:
+        return jsonify({'error': 'Broadcast not found.'}), 404
+    return jsonify(broadcast.to_dict())
+
+
+@admin_bp.route('/offers/broadcasts/<int:broadcast_id>/resume', methods=['POST'])
+@login_required
+def resume_broadcast(broadcast_id):
+    """
+    Re-queue a failed broadcast; it continues from its cursor, already-notified users are not repeated.
+    This is the 'admin.resume_broadcast' endpoint.
+    """
+    if not isinstance(current_user, Admin):
+        return jsonify({'error': 'Access denied.'}), 403
+    broadcast = db.session.get(Broadcast, broadcast_id)
+    if broadcast is None:
+        return jsonify({'error': 'Broadcast not found.'}), 404
+    if broadcast.status != 'failed':
+        return jsonify({'error': f"Only failed broadcasts can be resumed (status is '{broadcast.status}')."}), 400
+    broadcast.status = 'queued'
+    broadcast.error = None
+    db.session.commit()
+    return jsonify(broadcast.to_dict()), 202
@@ -1,9 +1,12 @@
-from flask import Blueprint, jsonify, request
+import time
+
+from flask import Blueprint, jsonify, request, current_app
 from models import db
 from models.car import Car
 from models.location import Location
 from models.booking import Booking
 from utils.distance_calculator import calculate_distance
+from utils.search_log import record_search
 from datetime import datetime
 
 api_bp = Blueprint('api', __name__)
@@ -75,6 +78,7 @@ def api_locations():
 @api_bp.route('/search')
 def api_search():
     """Search cars with location and date filters"""
+    search_started = time.perf_counter()
     location_id = request.args.get('location_id', type=int)
     lat = request.args.get('lat', type=float)
     lng = request.args.get('lng', type=float)
@@ -118,6 +122,14 @@ def api_search():
         }
         cars_data.append(car_dict)
 
+    radius_km = current_app.config['SEARCH_DEMAND_RADIUS_KM']
+    record_search(
+        'api_search', lat, lng,
+        {'location_id': location_id, 'start_date': start_date, 'end_date': end_date},
+        result_count=sum(1 for car in cars_data if car['distance'] is None or car['distance'] <= radius_km),
+        latency_ms=(time.perf_counter() - search_started) * 1000
+    )
+
     return jsonify(cars_data)
 
 
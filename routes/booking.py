@@ -1,42 +1,29 @@
 # routes/booking.py
-import hashlib
-import hmac
 from datetime import datetime, timedelta
 from flask_wtf.csrf import CSRFProtect  # ✅ Keep this if you need CSRF globally
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify, current_app
 from flask_login import login_required, current_user
-from razorpay.errors import SignatureVerificationError
 
 # Import the Booking model correctly from models
 from models.booking import Booking # <-- Import from models, not defined here
 from models.car import Car
 from models import db # Import db for session operations
-# Import Razorpay
-import razorpay
 import os
 from models.notification import Notification
 from utils.notification_sender import send_notification_to_user
+from utils.payment_gateway import get_payment_gateway, PaymentGatewayError
+from controllers.payment_controller import (
+    process_payment_success, verify_payment_signature,
+    PAYMENT_DUPLICATE, PAYMENT_FORBIDDEN, PAYMENT_IGNORED, PAYMENT_NOT_FOUND
+)
 
 # AFTER (Correct - Import the csrf instance)
 # --- END CRITICAL FIX 1 ---
 # csrf = CSRFProtect()
 booking_bp = Blueprint('booking', __name__, url_prefix='/booking')
 
-# --- Razorpay Client Initialization ---
-RAZORPAY_KEY_ID = os.getenv('RAZORPAY_KEY_ID')
-RAZORPAY_KEY_SECRET = os.getenv('RAZORPAY_KEY_SECRET')
-
-# Initialize Razorpay client
-if RAZORPAY_KEY_ID and RAZORPAY_KEY_SECRET:
-    try:
-        razorpay_client = razorpay.Client(auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET))
-        razorpay_client.set_app_details({"title": "ZoomCarClone", "version": "1.0"})
-    except Exception as e:
-        current_app.logger.error(f"Error initializing Razorpay client: {e}")
-        razorpay_client = None
-else:
-    current_app.logger.warning("Razorpay keys not found in environment variables.")
-    razorpay_client = None
+# --- Razorpay Client ---
+# Shared, lazily built gateway client: see utils/payment_gateway.py
 # --- End Razorpay Client ---
 
 # --- Route Definitions ---
@@ -135,6 +122,7 @@ def initiate_booking(car_id):
             user_id=current_user.id,
             message=f"Booking failed for {car.make} {car.model}. Car is not available for the selected dates/times."
         )
+        db.session.commit()  # Nothing else changed; this only writes the queued notification
         # --- End Send Booking Failed Notification ---
         return redirect(url_for('booking.show_booking_initiation', car_id=car_id))
 
@@ -185,19 +173,17 @@ def complete_payment(booking_id):
     # --- End Check ---
 
     # --- Razorpay Integration ---
-    if not razorpay_client:
+    gateway = get_payment_gateway()
+    if not gateway.is_configured:
         flash('Payment gateway is currently unavailable. Please try again later.', 'danger')
         return redirect(url_for('booking.booking_detail', booking_id=booking_id))
 
     try:
-        # Create a Razorpay Order
-        order_data = {
-            'amount': int(booking.total_price * 100), # Razorpay expects amount in paise
-            'currency': 'INR',
-            'receipt': f"booking_receipt_{booking.id}",
-            'payment_capture': 1 # Auto-capture payment
-        }
-        razorpay_order = razorpay_client.order.create(order_data)
+        # Create a Razorpay Order (shared pooled client: timeouts, bounded retries, circuit breaker)
+        razorpay_order = gateway.create_order(
+            amount_paise=int(booking.total_price * 100),  # Razorpay expects amount in paise
+            receipt=f"booking_receipt_{booking.id}"
+        )
         razorpay_order_id = razorpay_order['id']
 
         # Store order ID in booking
@@ -207,7 +193,7 @@ def complete_payment(booking_id):
         # --- Prepare Context for Razorpay Checkout Template ---
         context = {
             'booking': booking,
-            'razorpay_key_id': RAZORPAY_KEY_ID,
+            'razorpay_key_id': gateway.key_id,
             'razorpay_order_id': razorpay_order_id,
             'total_amount_paise': int(booking.total_price * 100),
             'total_amount_rupees': booking.total_price
@@ -217,7 +203,7 @@ def complete_payment(booking_id):
         # This template will contain the Razorpay Checkout.js script
         return render_template('booking/razorpay_checkout.html', **context)
 
-    except razorpay.errors.RazorpayError as e:
+    except PaymentGatewayError as e:
         print(f"Razorpay API error: {e}")
         flash('Failed to initiate payment. Please try again.', 'danger')
         return redirect(url_for('booking.booking_detail', booking_id=booking_id))
@@ -255,19 +241,17 @@ def process_payment(booking_id):
     # - End Check -
 
     # - Razorpay Integration -
-    if not razorpay_client:
+    gateway = get_payment_gateway()
+    if not gateway.is_configured:
         flash('Payment gateway is currently unavailable. Please try again later.', 'danger')
         return redirect(url_for('booking.booking_detail', booking_id=booking_id))
 
     try:
-        # Create a Razorpay Order
-        order_data = {
-            "amount": int(booking.total_price * 100),  # Razorpay expects amount in paise
-            "currency": "INR",
-            "receipt": f"booking_receipt_{booking.id}",
-            "payment_capture": 1 # Auto-capture payment
-        }
-        razorpay_order = razorpay_client.order.create(order_data)
+        # Create a Razorpay Order (shared pooled client: timeouts, bounded retries, circuit breaker)
+        razorpay_order = gateway.create_order(
+            amount_paise=int(booking.total_price * 100),  # Razorpay expects amount in paise
+            receipt=f"booking_receipt_{booking.id}"
+        )
         razorpay_order_id = razorpay_order['id']
 
         # --- CRITICAL FIX: Store order ID in booking and commit ---
@@ -279,7 +263,7 @@ def process_payment(booking_id):
         # Prepare context for Razorpay Checkout Template
         context = {
             'booking': booking,
-            'razorpay_key_id': RAZORPAY_KEY_ID,
+            'razorpay_key_id': gateway.key_id,
             'razorpay_order_id': razorpay_order_id,
             'total_amount_paise': int(booking.total_price * 100),
             'total_amount_rupees': booking.total_price
@@ -291,7 +275,7 @@ def process_payment(booking_id):
 
     # - CRITICAL FIX: Catch the correct Razorpay exception -
     # AFTER (Correct - Catch specific known errors or general Exception)
-    except razorpay.errors.BadRequestError as e: # Catch specific known Razorpay API errors
+    except PaymentGatewayError as e: # Gateway rejected the order or is unavailable
         print(f"Razorpay API error (BadRequest): {e}")
         flash(f'Failed to initiate payment: {str(e)}', 'danger')
         return redirect(url_for('booking.booking_detail', booking_id=booking_id))
@@ -328,8 +312,8 @@ def handle_payment():
     # --- END CRITICAL FIX 1 ---
 
     # --- CRITICAL FIX 1: Robust Razorpay Client Check ---
-    if not razorpay_client:
-        current_app.logger.error("Razorpay client is not initialized.")
+    if not get_payment_gateway().is_configured:
+        current_app.logger.error("Payment gateway is not configured.")
         # Return JSON error for AJAX handler
         return jsonify(
             {'success': False, 'message': 'Payment gateway is currently unavailable. Please try again later.'}), 500
@@ -359,17 +343,8 @@ def handle_payment():
 
         # --- CRITICAL FIX 4: Verify the payment signature using HMAC SHA256 ---
         try:
-            # Create the expected signature string
-            signature_data = f"{order_id}|{payment_id}"
-            # Generate the expected signature using HMAC-SHA256
-            expected_signature = hmac.new(
-                key=RAZORPAY_KEY_SECRET.encode(),
-                msg=signature_data.encode(),
-                digestmod=hashlib.sha256
-            ).hexdigest()
-
-            # Securely compare the signatures
-            if not hmac.compare_digest(expected_signature, signature):
+            # Shared helper: HMAC-SHA256 of "order_id|payment_id" with the key secret
+            if not verify_payment_signature(order_id, payment_id, signature):
                 current_app.logger.warning(f"Payment verification failed: Signature mismatch for order {order_id}.")
                 return jsonify({'success': False, 'message': 'Payment verification failed. Signature mismatch.'}), 400
 
@@ -382,28 +357,27 @@ def handle_payment():
 
         if result:
             # Payment signature verified successfully
-            # --- CRITICAL FIX 5: Fetch booking by razorpay_order_id ---
-            # Find the booking associated with this Razorpay order ID
-            booking = Booking.query.filter_by(razorpay_order_id=order_id).first()
-            if not booking:
+            # --- Apply through the shared idempotent processor ---
+            # Looks the booking up by the indexed razorpay_order_id, checks ownership and
+            # records the payment id in the payment_events ledger. Double callbacks and
+            # retries come back as PAYMENT_DUPLICATE without touching the booking.
+            outcome, booking = process_payment_success(
+                order_id=order_id,
+                payment_id=payment_id,
+                user_id=current_user.id,
+                source='booking.handle_payment'
+            )
+            # --- End Processor ---
+
+            if outcome == PAYMENT_NOT_FOUND:
                 current_app.logger.warning(f"handle_payment: Booking not found for Razorpay order ID {order_id}")
-                # Return 404 JSON for AJAX handler
                 return jsonify({'success': False, 'message': 'Booking record not found for this payment.'}), 404
-            # --- END CRITICAL FIX 5 ---
-
-            # --- CRITICAL FIX 6: Authorization Check (Frontend JS Call) ---
-            # This endpoint is called by the frontend JS *after* payment.
-            # The frontend JS runs in the context of the logged-in user.
-            # Therefore, `current_user` should be available here.
-            # Verify that the booking belongs to the current user.
-            if booking.user_id != current_user.id:
-                 current_app.logger.warning(f"handle_payment: Access denied for user {current_user.id} on booking {booking.id}")
-                 return jsonify({'success': False, 'message': 'Booking not found or access denied.'}), 403 # Use 403 Forbidden
-            # --- END CRITICAL FIX 6 ---
-
-            # --- CRITICAL FIX 7: Prevent Double Payment ---
-            # Check if booking payment is already completed
-            if booking.payment_status == 'completed':
+
+            if outcome == PAYMENT_FORBIDDEN:
+                current_app.logger.warning(f"handle_payment: Access denied for user {current_user.id} on booking {booking.id}")
+                return jsonify({'success': False, 'message': 'Booking not found or access denied.'}), 403 # Use 403 Forbidden
+
+            if outcome == PAYMENT_DUPLICATE:
                 current_app.logger.info(f"handle_payment: Payment already processed for booking {booking.id}")
                 # Already processed - Return success JSON for AJAX handler
                 return jsonify({
@@ -411,86 +385,20 @@ def handle_payment():
                     'message': 'Payment already processed for this booking.',
                     'redirect_url': url_for('booking.booking_detail', booking_id=booking.id)
                 })
-            # --- END CRITICAL FIX 7 ---
-
-                # --- CRITICAL FIX 8: Update booking status and host wallet ---
-                # BEFORE (Incorrect - Simple status updates)
-                # booking.payment_status = 'completed'
-                # booking.payment_date = datetime.utcnow()
-                # booking.razorpay_payment_id = payment_id # Store payment ID
-                # booking.status = 'paid' # Or 'active' if trip starts immediately after payment
-                #
-                # # - Update Host Wallet -
-                # host = booking.car.host
-                # if host:
-                #     # Example: Add 90% of total price to host's wallet
-                #     host_earning = booking.total_price * 0.9
-                #     host.add_to_wallet(host_earning)
-                #     # You might want to record this in a WalletTransaction model
-                # # - End Update Host Wallet -
-                # db.session.commit() # Commit changes
-                # AFTER (Corrected - Use model methods and record transaction)
-                # --- Update Booking ---
-                booking.payment_status = 'completed'
-                booking.payment_date = datetime.utcnow()
-                booking.razorpay_payment_id = payment_id  # Store payment ID
-                # Status stays 'paid' until user activates trip
-                booking.status = 'paid'
-                db.session.add(booking)  # Add booking to session
-
-                # --- Update Host Wallet & Record Transaction ---
-                host = booking.car.host
-                host_earning = 0.0
-                if host:
-                    # Calculate host's earning (e.g., 90% of total price)
-                    host_earning = round(booking.total_price * 0.9, 2)  # Example: 90%, rounded
-
-                    # Add earning to host's wallet balance (Model method)
-                    host.add_to_wallet(host_earning)  # This updates host.wallet_balance
-
-                    # --- CRITICAL FIX: Record Host Earning Transaction ---
-                    # Record the earning in the wallet_transactions table
-                    WalletTransaction.record_host_earning(
-                        host_user=host.user,  # Pass the User object associated with the host
-                        booking=booking,
-                        earning_amount=host_earning
-                    )
-                    # --- END CRITICAL FIX ---
-                # --- END Update Host Wallet & Record Transaction ---
-
-                # --- CRITICAL FIX: Record User Payment Transaction ---
-                # Record the user's payment deduction in the wallet_transactions table
-                WalletTransaction.record_booking_payment(
-                    user=booking.user,  # Pass the User object who made the booking
-                    booking=booking,
-                    amount_paid=booking.total_price  # The amount deducted from user's perspective
-                )
-                # --- END CRITICAL FIX ---
-
-                # --- CRITICAL FIX: Commit Changes ---
-                db.session.commit()  # Commit booking update, host wallet update, and transaction records
-                # --- END CRITICAL FIX ---
-            # --- CRITICAL FIX 8: Update booking status and host wallet ---
-            # Use the model's method to mark payment as completed
-            # This ensures consistency with the logic defined in the Booking model
-            # The total_price used here is already calculated based on hours and price_per_hour
-            if booking.mark_as_paid(razorpay_payment_id=payment_id):
-                db.session.commit()
-                current_app.logger.info(f"handle_payment: Payment successful and booking {booking.id} updated.")
-                # Return success JSON for AJAX handler
-                # Assuming called by frontend JS after Razorpay popup closes
-                return jsonify({
-                    'success': True,
-                    'message': 'Payment successful! Your booking is confirmed.',
-                    'redirect_url': url_for('booking.booking_detail', booking_id=booking.id)
-                })
-            else:
-                db.session.rollback()
+
+            if outcome == PAYMENT_IGNORED:
                 current_app.logger.error(
                     f"handle_payment: Failed to mark booking {booking.id} as paid after verification.")
                 return jsonify(
                     {'success': False, 'message': 'Failed to update booking status after payment verification.'}), 500
-            # --- END CRITICAL FIX 8 ---
+
+            current_app.logger.info(f"handle_payment: Payment successful and booking {booking.id} updated.")
+            # Return success JSON for AJAX handler
+            return jsonify({
+                'success': True,
+                'message': 'Payment successful! Your booking is confirmed.',
+                'redirect_url': url_for('booking.booking_detail', booking_id=booking.id)
+            })
 
         else:
             # Payment signature verification failed
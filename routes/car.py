@@ -1,7 +1,8 @@
 # routes/car.py
+import time
 from datetime import timedelta, datetime
 
-from flask import Blueprint, render_template, request, jsonify, redirect, url_for, flash, session
+from flask import Blueprint, render_template, request, jsonify, redirect, url_for, flash, session, current_app
 from flask_login import current_user, login_required
 from flask_wtf import FlaskForm
 from wtforms.fields.datetime import DateField
@@ -14,6 +15,7 @@ from models.car import Car
 # from models.location import Location # If you still use Location model for other purposes
 # Import the distance calculator utility
 from utils.distance_calculator import calculate_distance
+from utils.search_log import record_search
 # Import requests for the Nominatim API call
 import requests
 
@@ -75,6 +77,7 @@ def car_list():
     4. Renders the consolidated car_list.html template.
     This is the 'car.car_list' endpoint.
     """
+    search_started = time.perf_counter()
     # --- 1. Get Location Parameters ---
     user_lat_str = request.args.get('user_lat')
     user_lng_str = request.args.get('user_lng')
@@ -277,6 +280,17 @@ def car_list():
     }
     # --- End Prepare Filter Context ---
 
+    # --- Log search demand (queued, never blocks the response) ---
+    # Every available car is listed, so demand is judged by the cars within the search radius
+    radius_km = current_app.config['SEARCH_DEMAND_RADIUS_KM']
+    record_search(
+        'car_list', user_lat, user_lng, active_filters_context,
+        result_count=sum(1 for _, distance in car_distances if distance <= radius_km),
+        latency_ms=(time.perf_counter() - search_started) * 1000,
+        user_id=current_user.id if current_user.is_authenticated else None
+    )
+    # --- End Log ---
+
     # --- 9. Render Consolidated Template ---
     # Pass the sorted list, context messages, user location data, and active filters
     return render_template(
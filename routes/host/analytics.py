@@ -0,0 +1,48 @@
+# routes/host/analytics.py
+from datetime import datetime
+
+from flask import jsonify, request
+from flask_login import login_required, current_user
+
+from . import host_bp
+from controllers.host.analytics import AnalyticsRangeError, get_host_earnings_analytics, parse_analytics_args
+from models.host import Host
+from utils.occupancy import OccupancyError, get_host_week_occupancy
+from utils.timezone import get_current_ist_time
+
+
+@host_bp.route('/analytics/earnings')
+@login_required
+def earnings_analytics():
+    """
+    Host earnings, bookings and cancellation rates as JSON, bucketed by time
+    (?start=YYYY-MM-DD&end=YYYY-MM-DD&bucket=day|week|month&car_id=<id>).
+    Served from the daily rollup tables, not from the bookings.
+    This is the 'host.earnings_analytics' endpoint.
+    """
+    host = Host.query.filter_by(user_id=current_user.id).first_or_404()
+    try:
+        start_day, end_day, bucket, car_id = parse_analytics_args(request.args, get_current_ist_time().date())
+    except AnalyticsRangeError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(get_host_earnings_analytics(host.id, start_day, end_day, bucket=bucket, car_id=car_id))
+
+
+@host_bp.route('/analytics/occupancy')
+@login_required
+def occupancy_analytics():
+    """
+    Per-car occupancy (fraction of the week booked, with a daily breakdown) for the
+    IST week containing ?week=YYYY-MM-DD (default: this week) as JSON.
+    This is the 'host.occupancy_analytics' endpoint.
+    """
+    host = Host.query.filter_by(user_id=current_user.id).first_or_404()
+    try:
+        week = request.args.get('week')
+        day = datetime.strptime(week, '%Y-%m-%d').date() if week else get_current_ist_time().date()
+    except ValueError:
+        return jsonify({'error': 'week must be in YYYY-MM-DD format.'}), 400
+    try:
+        return jsonify(get_host_week_occupancy(host.id, day))
+    except OccupancyError as e:
+        return jsonify({'error': str(e)}), 503
@@ -12,8 +12,7 @@ from models.host import Host
 from models.car import Car
 from models.car_image import CarImage
 from models.location import Location
-from werkzeug.utils import secure_filename
-import os
+from utils.upload_store import release_upload, save_upload
 from models.location import Location # <-- Add this import
 import requests # For Nominatim API call
 
@@ -120,14 +119,8 @@ def add_car():
                 files = request.files.getlist('images')
                 for i, file in enumerate(files):
                     if file and file.filename != '':
-                        filename = secure_filename(file.filename)
-                        name, ext = os.path.splitext(filename)
-                        # Include car ID in filename
-                        filename = f"{name}_{car.id}_{i}{ext}"
-                        filepath = os.path.join('static', 'uploads', filename)
-                        # Ensure the uploads directory exists
-                        os.makedirs(os.path.dirname(filepath), exist_ok=True)
-                        file.save(filepath)
+                        # Content-addressed: identical images are stored once
+                        filename = save_upload(file)
 
                         car_image = CarImage(
                             filename=filename,
@@ -213,13 +206,7 @@ def edit_car(car_id):
                 files = request.files.getlist('images')
                 for i, file in enumerate(files):
                     if file and file.filename != '':
-                        filename = secure_filename(file.filename)
-                        name, ext = os.path.splitext(filename)
-                        # Include car ID in filename
-                        filename = f"{name}_{car.id}_{len(car.images) + i}{ext}" # Append to existing count
-                        filepath = os.path.join('static', 'uploads', filename)
-                        os.makedirs(os.path.dirname(filepath), exist_ok=True)
-                        file.save(filepath)
+                        filename = save_upload(file)  # Content-addressed: identical images are stored once
 
                         car_image = CarImage(
                             filename=filename,
@@ -257,9 +244,7 @@ def delete_car(car_id):
 
     # Delete associated images
     for image in car.images:
-        filepath = os.path.join('static', 'uploads', image.filename)
-        if os.path.exists(filepath):
-            os.remove(filepath)
+        release_upload(image.filename)  # The file goes once no other row references it
         db.session.delete(image)
 
     db.session.delete(car)
@@ -283,10 +268,8 @@ def delete_car_image(image_id):
         flash('Access denied')
         return redirect(url_for('host.list_cars'))
 
-    # Delete file
-    filepath = os.path.join('static', 'uploads', image.filename)
-    if os.path.exists(filepath):
-        os.remove(filepath)
+    # Release the stored file (shared with any identical upload)
+    release_upload(image.filename)
 
     db.session.delete(image)
     db.session.commit()
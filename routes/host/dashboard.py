@@ -5,6 +5,7 @@ from models import db
 from models.host import Host
 from models.car import Car
 from models.booking import Booking
+from utils.host_stats import get_host_stats
 
 
 @host_bp.route('/')
@@ -24,25 +25,12 @@ def dashboard():
     # --- END CRITICAL FIX 1 ---
 
     # --- Fetch Host Statistics ---
-    # 1. Total Cars Listed
-    total_cars = Car.query.filter_by(host_id=host.id).count()
-
-    # 2. Pending Booking Approvals
-    # Join Booking with Car to link bookings to the host's cars
-    # Filter for bookings with status 'pending' for the host's cars
-    pending_approvals = Booking.query.join(Car).filter(
-        Car.host_id == host.id,
-        Booking.status == 'pending' # Use status field
-    ).count()
-
-    # 3. Active Bookings
-    # Filter for bookings with status 'active' for the host's cars
-    # --- CRITICAL FIX 2: Use 'status' field instead of non-existent 'is_active' ---
-    active_bookings = Booking.query.join(Car).filter(
-        Car.host_id == host.id,
-        Booking.status == 'active' # Use status field to find active bookings
-    ).count()
-    # --- END CRITICAL FIX 2 ---
+    # Car and booking-status counts come from one memoized GROUP BY status query
+    # (shared with the navigation badges), invalidated whenever a booking changes.
+    stats = get_host_stats(host.id)
+    total_cars = stats['total_cars']
+    pending_approvals = stats['pending']
+    active_bookings = stats['active']
 
     # 4. Total Earnings (from host's wallet balance)
     total_earnings = host.wallet_balance # Assumes wallet_balance is updated correctly on the Host model
@@ -71,6 +59,15 @@ def dashboard():
 # --- End Dashboard Route ---
 
 
+@host_bp.context_processor
+def inject_host_nav_counts():
+    """Badge counts for the host navigation (same memoized counters as the dashboard)."""
+    if not current_user.is_authenticated:
+        return {}
+    host = getattr(current_user, 'host_profile', None)
+    return {'host_nav_counts': get_host_stats(host.id)} if host else {}
+
+
 @host_bp.route('/bookings/<int:booking_id>/approve', methods=['POST'])
 @login_required
 def approve_booking(booking_id):
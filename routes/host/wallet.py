@@ -11,6 +11,8 @@ from models.host import Host
 from models.wallet_transaction import WalletTransaction
 # Import HostBankAccount for bank account management
 from models.host_bank_account import HostBankAccount
+from models.payout import PayoutRequest
+from utils.statement_export import statement_response, StatementExportError
 
 @host_bp.route('/wallet')
 @host_bp.route('/wallet/history') # Alias route for clarity
@@ -58,6 +60,28 @@ def wallet():
     # --- End Render ---
 # --- End Wallet Route ---
 
+
+# --- Statement Export Route ---
+@host_bp.route('/wallet/statement')
+@login_required
+def wallet_statement():
+    """
+    Download the host wallet's statement for a date range (?start=YYYY-MM-DD&end=YYYY-MM-DD&format=csv|parquet).
+    Covers payouts (the host wallet's transaction rows); earnings are credited to the
+    balance without a transaction row, so they are not itemised. Streamed row by row.
+    This is the 'host.wallet_statement' endpoint.
+    """
+    host = Host.query.filter_by(user_id=current_user.id).first_or_404()
+    try:
+        return statement_response(
+            host.user_id, request.args, f"host_statement_{host.id}",
+            chunk_size=current_app.config['STATEMENT_EXPORT_CHUNK_SIZE'], host_wallet=True
+        )
+    except StatementExportError as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('host.wallet'))
+# --- End Statement Export Route ---
+
 # --- NEW: Transaction Detail Route ---
 @host_bp.route('/wallet/transactions/<int:transaction_id>')
 @login_required
@@ -217,9 +241,9 @@ def set_primary_bank_account(account_id):
 @login_required
 def withdraw_funds():
     """
-    Placeholder for withdrawing funds from the host's wallet.
+    Request a withdrawal from the host's wallet.
     This is the 'host.withdraw_funds' endpoint.
-    Implement logic for withdrawal requests and processing.
+    The request is queued; the wallet is debited when the payout batch is built.
     """
     host = Host.query.filter_by(user_id=current_user.id).first_or_404()
 
@@ -251,48 +275,22 @@ def withdraw_funds():
             return render_template('host/wallet/withdraw.html', host=host, bank_accounts=host.get_all_bank_accounts())
         # --- END Validate Selected Account ---
 
-        # --- CRITICAL FIX: Implement Withdrawal Request Logic ---
-        # This creates a withdrawal request record in the database.
-        # It deducts the amount from the host's wallet balance (in memory).
-        # It records the transaction as 'withdrawal' (using the existing method).
-        # It notifies the admin (placeholder).
-        # It redirects to the wallet page with a success message.
+        # --- Queue the withdrawal for the next payout batch ---
+        # A single INSERT: the payout job (tasks/payouts.py) debits the wallet, groups
+        # requests per bank into batch files and notifies the host of the outcome.
         try:
-            # --- CRITICAL FIX: Use existing record_withdrawal method ---
-            # Record the withdrawal transaction using the existing helper method
-            # This deducts the amount from host.wallet_balance in memory and records the transaction
-            WalletTransaction.record_withdrawal( # <-- Use record_withdrawal, NOT record_withdrawal_request
-                user=host.user, # Pass the User object associated with the host
-                amount=amount,
-                withdrawal_reference=f"Requested to {selected_account.bank_name} ({selected_account.mask_account_number()})" # Add account details to reference
-            )
-            # --- END CRITICAL FIX ---
-            db.session.commit() # Commit the transaction record and wallet balance update
-
-            # --- CRITICAL FIX: Send Notification to Host ---
-            # Send notification to host after successful withdrawal request
-            from utils.notification_sender import send_notification_to_host
-            send_notification_to_host(
-                host_user_id=host.user_id, # Pass the host's user ID
-                message=f"Withdrawal request of ₹{amount:.2f} initiated to {selected_account.bank_name} ({selected_account.mask_account_number()}). Awaiting admin approval."
-            )
-            # --- END CRITICAL FIX ---
-
-            # --- CRITICAL FIX: Send Notification to Admin (Placeholder) ---
-            # Notify Admin (placeholder - implement notification logic)
-            # You might want to create a separate AdminNotification model or use a general notification system
-            print(f"[ADMIN NOTIFICATION] Host {host.user.username} requested withdrawal of ₹{amount:.2f} to {selected_account.bank_name} ({selected_account.mask_account_number()}).") # Log for now
-            # --- END CRITICAL FIX ---
-
-            flash(f'Withdrawal request of ₹{amount:.2f} initiated successfully! Awaiting admin approval.', 'success')
-            return redirect(url_for('host.wallet')) # Redirect to wallet page
-
+            db.session.add(PayoutRequest(host_id=host.id, bank_account_id=selected_account.id, amount=round(amount, 2)))
+            db.session.commit()
         except Exception as e:
             db.session.rollback()
-            current_app.logger.error(f"Error processing withdrawal request for host {host.id}: {e}")
+            current_app.logger.error(f"Error queuing withdrawal request for host {host.id}: {e}")
             flash('An error occurred while processing your withdrawal request. Please try again.', 'danger')
             return render_template('host/wallet/withdraw.html', host=host, bank_accounts=host.get_all_bank_accounts())
-        # --- END CRITICAL FIX ---
+        # --- End Queue ---
+
+        flash(f'Withdrawal request of ₹{amount:.2f} to {selected_account.bank_name} '
+              f'({selected_account.mask_account_number()}) queued for the next payout batch.', 'success')
+        return redirect(url_for('host.wallet')) # Redirect to wallet page
 
     # GET request: Show the withdrawal form
     return render_template('host/wallet/withdraw.html', host=host, bank_accounts=host.get_all_bank_accounts())
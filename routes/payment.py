@@ -1,41 +1,21 @@
 # routes/payment.py
 import os  # <-- Import os at the top
-from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, abort, jsonify
 from flask_login import login_required, current_user
-import razorpay
-import hmac
-import hashlib
 from datetime import datetime
 from models import db
 from models.booking import Booking
+from utils.payment_gateway import get_payment_gateway, FakePaymentGateway, PaymentGatewayError
+from controllers.payment_controller import (
+    process_payment_success, verify_payment_signature, PAYMENT_DUPLICATE, PAYMENT_FORBIDDEN, PAYMENT_IGNORED, PAYMENT_NOT_FOUND
+)
 
 # from models.car import Car # If needed
 
 payment_bp = Blueprint('payment', __name__)
 
-# --- CRITICAL FIX: Move Razorpay client initialization ---
-# BEFORE (Incorrect - Module level access to current_app)
-# RAZORPAY_KEY_ID = current_app.config.get('RAZORPAY_KEY_ID')
-# RAZORPAY_KEY_SECRET = current_app.config.get('RAZORPAY_KEY_SECRET')
-# AFTER (Correct - Use os.getenv or access within app context)
-# Option 1: Use os.getenv (recommended for keys that don't change)
-RAZORPAY_KEY_ID = os.getenv('RAZORPAY_KEY_ID')  # Get from environment variables
-RAZORPAY_KEY_SECRET = os.getenv('RAZORPAY_KEY_SECRET')  # Get from environment variables
-
-# Initialize client only if keys are present
-if RAZORPAY_KEY_ID and RAZORPAY_KEY_SECRET:
-    try:
-        razorpay_client = razorpay.Client(auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET))
-        razorpay_client.set_app_details({"title": "ZoomCarClone", "version": "1.0"})
-    except Exception as e:
-        print(f"Error initializing Razorpay client: {e}")
-        razorpay_client = None
-else:
-    print("Razorpay keys not found in environment variables (.env file).")
-    razorpay_client = None
-
-
-# --- END CRITICAL FIX ---
+# Razorpay access goes through the shared client in utils/payment_gateway.py
+# (pooled connections, timeouts, bounded retries, circuit breaker).
 
 @payment_bp.route('/initiate/<int:booking_id>')
 @login_required
@@ -54,19 +34,17 @@ def initiate_payment(booking_id):
         return redirect(url_for('user.booking_detail', booking_id=booking_id))  # Assuming user blueprint
 
     # --- Razorpay Integration ---
-    if not razorpay_client:
+    gateway = get_payment_gateway()
+    if not gateway.is_configured:
         flash('Payment gateway is currently unavailable. Please try again later.', 'danger')
         return redirect(url_for('user.booking_detail', booking_id=booking_id))  # Assuming user blueprint
 
     try:
-        # Create a Razorpay Order
-        order_data = {
-            'amount': int(booking.total_price * 100),  # Razorpay expects amount in paise
-            'currency': 'INR',
-            'receipt': f"booking_receipt_{booking.id}",
-            'payment_capture': 1  # Auto-capture payment
-        }
-        razorpay_order = razorpay_client.order.create(order_data)
+        # Create a Razorpay Order (shared pooled client: timeouts, bounded retries, circuit breaker)
+        razorpay_order = gateway.create_order(
+            amount_paise=int(booking.total_price * 100),  # Razorpay expects amount in paise
+            receipt=f"booking_receipt_{booking.id}"
+        )
         razorpay_order_id = razorpay_order['id']
 
         # Store order ID in booking
@@ -76,7 +54,7 @@ def initiate_payment(booking_id):
         # Prepare context for template
         context = {
             'booking': booking,
-            'razorpay_key_id': RAZORPAY_KEY_ID,
+            'razorpay_key_id': gateway.key_id,
             'razorpay_order_id': razorpay_order_id,
             'total_amount_paise': int(booking.total_price * 100),
             'total_amount_rupees': booking.total_price
@@ -84,7 +62,7 @@ def initiate_payment(booking_id):
 
         return render_template('payment/checkout.html', **context)
 
-    except razorpay.errors.RazorpayError as e:
+    except PaymentGatewayError as e:
         print(f"Razorpay API error: {e}")
         flash('Failed to initiate payment. Please try again.', 'danger')
         return redirect(url_for('user.booking_detail', booking_id=booking_id))  # Assuming user blueprint
@@ -99,7 +77,7 @@ def initiate_payment(booking_id):
 @login_required
 def handle_payment():
     """Handle Razorpay payment callback/verification."""
-    if not razorpay_client:
+    if not get_payment_gateway().is_configured:
         flash('Payment gateway is currently unavailable.', 'danger')
         # Redirect to appropriate place (user dashboard?)
         return redirect(url_for('car.home'))  # Or user dashboard
@@ -115,48 +93,31 @@ def handle_payment():
             return redirect(url_for('car.home'))  # Or user dashboard
 
         # Verify the payment signature
-        params_dict = {
-            'razorpay_order_id': order_id,
-            'razorpay_payment_id': payment_id,
-            'razorpay_signature': signature
-        }
-
-        result = razorpay_client.utility.verify_payment_signature(params_dict)
+        result = verify_payment_signature(order_id, payment_id, signature)
 
         if result:
             # Payment signature verified successfully
-            # Find the booking associated with this order
-            booking = Booking.query.filter_by(razorpay_order_id=order_id).first()
-            if not booking or booking.user_id != current_user.id:
+            # --- Apply through the shared idempotent processor ---
+            # Redeliveries of the same payment id are answered from the payment_events ledger
+            # and change nothing. Host earnings are credited once, on trip completion.
+            outcome, booking = process_payment_success(
+                order_id=order_id,
+                payment_id=payment_id,
+                user_id=current_user.id,
+                source='payment.handle_payment'
+            )
+            # --- End Processor ---
+
+            if outcome in (PAYMENT_NOT_FOUND, PAYMENT_FORBIDDEN):
                 flash('Booking not found or access denied.', 'danger')
                 return redirect(url_for('car.home'))  # Or user dashboard
 
-            if booking.payment_status == 'completed':
+            if outcome == PAYMENT_DUPLICATE:
                 flash('Payment already processed for this booking.', 'info')
-                # Redirect to booking detail or user dashboard
-                return redirect(url_for('user.booking_detail', booking_id=booking.id))  # Assuming user blueprint
-
-            # --- CRITICAL: Update booking status ---
-            booking.payment_status = 'completed'
-            booking.payment_date = datetime.utcnow()
-            booking.razorpay_payment_id = payment_id  # Store payment ID
-            # Update booking status to 'paid' or 'active' depending on your flow
-            booking.status = 'paid'  # Or 'active' if trip starts immediately after payment
-
-            # --- CRITICAL: Update Host Wallet ---
-            # Assuming Host model has add_to_wallet method and a relationship to Car
-            # This assumes Car has a 'host' relationship
-            host = booking.car.host  # Access host via car relationship
-            if host:
-                # Example: Add 90% of total price to host's wallet
-                host_earning = booking.total_price * 0.9
-                host.add_to_wallet(host_earning)
-                # You might want to record this in a WalletTransaction model
-            # --- END CRITICAL ---
-
-            db.session.commit()
-
-            flash('Payment successful! Your booking is confirmed.', 'success')
+            elif outcome == PAYMENT_IGNORED:
+                flash('This booking could not be updated with the payment. Please contact support.', 'warning')
+            else:
+                flash('Payment successful! Your booking is confirmed.', 'success')
             # Redirect to booking detail page
             return redirect(url_for('user.booking_detail', booking_id=booking.id))  # Assuming user blueprint
         else:
@@ -165,10 +126,10 @@ def handle_payment():
             print(f"Razorpay signature verification failed for order {order_id}")
             return redirect(url_for('car.home'))  # Or user dashboard
 
-    except razorpay.errors.SignatureVerificationError as e:
-        # Specific Razorpay signature error
+    except PaymentGatewayError as e:
+        # Gateway-side error while verifying
         flash(f"Payment verification failed: {str(e)}", "danger")
-        print(f"SignatureVerificationError: {e}")
+        print(f"PaymentGatewayError: {e}")
         return redirect(url_for('car.home'))  # Or user dashboard
     except Exception as e:
         # Handle other unexpected errors
@@ -177,5 +138,23 @@ def handle_payment():
         flash("An error occurred during payment processing. Please contact support.", "danger")
         return redirect(url_for('car.home'))  # Or user dashboard
 
+
+@payment_bp.route('/fake/pay/<order_id>', methods=['POST'])
+@login_required
+def fake_pay(order_id):
+    """
+    Pay an order on the fake gateway, as the checkout widget would (offline load testing).
+    Returns the signed callback fields to post to /payment/handler. 404 unless PAYMENT_GATEWAY=fake.
+    """
+    gateway = get_payment_gateway()
+    if not isinstance(gateway, FakePaymentGateway):
+        abort(404)
+    booking = Booking.query.filter_by(razorpay_order_id=order_id).first()
+    if booking is None or booking.user_id != current_user.id or order_id not in gateway.orders:
+        abort(404)  # Orders live in this worker's memory only
+    status = 'failed' if request.form.get('status') == 'failed' else 'captured'
+    return jsonify(gateway.simulate_payment(order_id, status=status))
+
+
 # Register blueprint in app.py
 # app.register_blueprint(payment_bp, url_prefix='/payment')
@@ -2,6 +2,6 @@ from flask import Blueprint
 
 user_bp = Blueprint('user', __name__, url_prefix='/user')
 
-from . import dashboard, bookings, notifications, profile, wallet
+from . import dashboard, bookings, notifications, profile, wallet, events
 
-__all__ = ['user_bp', 'dashboard', 'bookings', 'profile', 'wallet', 'notifications']
\ No newline at end of file
+__all__ = ['user_bp', 'dashboard', 'bookings', 'profile', 'wallet', 'notifications', 'events']
\ No newline at end of file
@@ -1,5 +1,4 @@
 # routes/user/bookings.py
-import razorpay
 from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
 from flask_login import login_required, current_user
 
@@ -9,27 +8,15 @@ from models.booking import Booking
 from models.host_feedback import HostFeedback
 from models.host_rating import HostRating
 from models.photo import Photo # Import the Photo model
-from werkzeug.utils import secure_filename
-import os
 import json
 
 from models.wallet_transaction import WalletTransaction
+from utils.payment_gateway import get_payment_gateway, PaymentGatewayError
+from utils.upload_store import UploadError, save_upload
+from utils.wallet_service import InsufficientFundsError
 # Import user_bp from the package's __init__.py
 from routes.user import user_bp
 
-RAZORPAY_KEY_ID = os.getenv('RAZORPAY_KEY_ID')
-RAZORPAY_KEY_SECRET = os.getenv('RAZORPAY_KEY_SECRET')
-if RAZORPAY_KEY_ID and RAZORPAY_KEY_SECRET:
-    try:
-        razorpay_client = razorpay.Client(auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET))
-        razorpay_client.set_app_details({"title": "ZoomCarClone", "version": "1.0"})
-    except Exception as e:
-        current_app.logger.error(f"Error initializing Razorpay client in user/bookings: {e}")
-        razorpay_client = None
-else:
-    current_app.logger.warning("Razorpay keys not found in environment variables (user/bookings).")
-    razorpay_client = None
-# - End Razorpay Client Initialization -
 
 
 # --- List Bookings ---
@@ -171,13 +158,8 @@ def start_trip(booking_id):
                 # Check if a file was actually selected (browsers might send empty entries)
                 if file and file.filename != '':
                     try:
-                        filename = secure_filename(file.filename)
-                        # Add booking ID to filename for uniqueness
-                        name, ext = os.path.splitext(filename)
-                        # Format: pickup_<booking_id>_<original_name><extension>
-                        filename = f"pickup_{booking.id}_{name}{ext}"
-                        filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-                        file.save(filepath)
+                        # Content-addressed store (utils/upload_store.py); the key is unique per content
+                        filename = save_upload(file)
 
                         # Create Photo record in the database
                         photo = Photo(
@@ -188,6 +170,10 @@ def start_trip(booking_id):
                         db.session.add(photo)
                         uploaded_photo_records.append(photo) # Store for potential use
 
+                    except UploadError as e:
+                        db.session.rollback()
+                        flash(str(e), 'danger')
+                        return render_template('user/bookings/start_trip.html', booking=booking, form=form)
                     except Exception as e:
                         current_app.logger.error(f"Error saving pickup photo: {e}")
                         flash('An error occurred while saving photos. Please try again.', 'danger')
@@ -261,12 +247,7 @@ def complete_trip(booking_id):
         for file in files:
             if file and file.filename != '':
                 try:
-                    filename = secure_filename(file.filename)
-                    # Add booking ID to filename for uniqueness
-                    name, ext = os.path.splitext(filename)
-                    filename = f"dropoff_{booking.id}_{name}{ext}"
-                    filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-                    file.save(filepath)
+                    filename = save_upload(file)  # Content-addressed store (utils/upload_store.py)
 
                     # Create Photo record
                     photo = Photo(
@@ -276,6 +257,10 @@ def complete_trip(booking_id):
                     )
                     db.session.add(photo)
                     uploaded_photo_filenames.append(filename) # Store for potential use
+                except UploadError as e:
+                    db.session.rollback()
+                    flash(str(e))
+                    return render_template('user/bookings/complete_trip.html', booking=booking)
                 except Exception as e:
                     current_app.logger.error(f"Error saving dropoff photo: {e}")
                     flash('An error occurred while saving photos. Please try again.')
@@ -339,23 +324,7 @@ def cancel_booking(booking_id):
             flash(
                 f'Booking #{booking.id} cancelled successfully. A refund of ₹{booking.refund_amount:.2f} will be processed.',
                 'success')
-
-            # --- CRITICAL FIX: Send Notification to User ---
-            from utils.notification_sender import send_notification_to_user
-            send_notification_to_user(
-                user_id=booking.user_id,
-                message=f'Your booking #{booking.id} for {booking.car.make} {booking.car.model} has been cancelled. Reason: {reason[:50]}...'
-            )
-            # --- END CRITICAL FIX ---
-
-            # --- CRITICAL FIX: Send Notification to Host ---
-            from utils.notification_sender import send_notification_to_host
-            send_notification_to_host(
-                host_user_id=booking.car.host.user_id,
-                message=f'A booking #{booking.id} for your {booking.car.make} {booking.car.model} has been cancelled by the user. Reason: {reason[:50]}...'
-            )
-            # --- END CRITICAL FIX ---
-
+            # User and host notifications were queued by cancel_by_user() and written by the commit above
         else:
             flash('Failed to cancel booking.', 'danger')
     except Exception as e:
@@ -389,19 +358,17 @@ def pay_booking(booking_id):
     # - End Check -
 
     # - Razorpay Integration -
-    if not razorpay_client:
+    gateway = get_payment_gateway()
+    if not gateway.is_configured:
         flash('Payment gateway is currently unavailable. Please try again later.', 'danger')
         return redirect(url_for('user.booking_detail', booking_id=booking_id))
 
     try:
-        # Create a Razorpay Order
-        order_data = {
-            "amount": int(booking.total_price * 100),  # Razorpay expects amount in paise
-            "currency": "INR",
-            "receipt": f"booking_receipt_{booking.id}",
-            "payment_capture": 1 # Auto-capture payment
-        }
-        razorpay_order = razorpay_client.order.create(order_data)
+        # Create a Razorpay Order (shared pooled client: timeouts, bounded retries, circuit breaker)
+        razorpay_order = gateway.create_order(
+            amount_paise=int(booking.total_price * 100),  # Razorpay expects amount in paise
+            receipt=f"booking_receipt_{booking.id}"
+        )
         razorpay_order_id = razorpay_order['id']
 
         # Store order ID in booking and commit
@@ -411,7 +378,7 @@ def pay_booking(booking_id):
         # Prepare context for Razorpay Checkout Template
         context = {
             'booking': booking,
-            'razorpay_key_id': RAZORPAY_KEY_ID,
+            'razorpay_key_id': gateway.key_id,
             'razorpay_order_id': razorpay_order_id,
             'total_amount_paise': int(booking.total_price * 100),
             'total_amount_rupees': booking.total_price
@@ -422,7 +389,7 @@ def pay_booking(booking_id):
         return render_template('user/bookings/razorpay_checkout.html', **context)
 
     # - CRITICAL FIX: Catch the correct Razorpay exception -
-    except razorpay.errors.BadRequestError as e: # Catch specific known errors or general Exception
+    except PaymentGatewayError as e: # Gateway rejected the order or is unavailable
         print(f"Razorpay API error (BadRequest): {e}")
         flash(f'Failed to initiate payment: {str(e)}', 'danger')
         return redirect(url_for('user.booking_detail', booking_id=booking_id))
@@ -494,10 +461,8 @@ def give_feedback(booking_id):
             )
             db.session.add(host_feedback)
 
-            db.session.commit()
-            flash('Thank you for your feedback and rating!', 'success')
-
             # --- CRITICAL FIX: Send Notification to Host ---
+            # Queued here so it is written by the same commit as the feedback
             from utils.notification_sender import send_notification_to_host
             send_notification_to_host(
                 host_user_id=booking.car.host.user_id,
@@ -505,6 +470,9 @@ def give_feedback(booking_id):
             )
             # --- END CRITICAL FIX ---
 
+            db.session.commit()
+            flash('Thank you for your feedback and rating!', 'success')
+
             return redirect(url_for('user.booking_detail', booking_id=booking_id))
 
         except Exception as e:
@@ -552,9 +520,10 @@ def withdraw_funds():
             # 5. Updating the user's wallet balance and recording the transaction.
             # For now, simulate a successful withdrawal
             flash(f'Withdrawal of ₹{amount:.2f} initiated. Integration with payment/banking system required.', 'info')
-            # Simulate deducting from wallet and recording transaction
-            if current_user.deduct_from_wallet(amount):
-                # Record the withdrawal transaction
+            # Simulate deducting from wallet and recording transaction.
+            # record_withdrawal debits the balance atomically (conditional SQL UPDATE) and
+            # writes the ledger row; it raises InsufficientFundsError instead of overdrawing.
+            try:
                 WalletTransaction.record_withdrawal(
                     user=current_user,
                     amount=amount,
@@ -562,7 +531,7 @@ def withdraw_funds():
                 )
                 db.session.commit()
                 flash(f'Simulated withdrawal of ₹{amount:.2f} successful!', 'success')
-            else:
+            except InsufficientFundsError:
                 db.session.rollback()
                 flash('Failed to simulate withdrawal.', 'danger')
             # --- END CRITICAL FIX ---
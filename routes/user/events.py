@@ -0,0 +1,63 @@
+# routes/user/events.py
+import time
+
+from flask import Response, abort, current_app, jsonify, stream_with_context
+from flask_login import login_required, current_user
+
+from models import db
+from models.user import User
+from routes.user import user_bp
+import utils.booking_events  # noqa: F401  (registers the booking status hooks)
+from utils.notification_counters import get_unread_count
+from utils.realtime import RealtimeCapacityError, format_sse, get_realtime_hub
+
+
+@user_bp.route('/events')
+@login_required
+def event_stream():
+    """
+    Server-Sent Events stream of the user's notifications and booking updates
+    (and, for hosts, updates to bookings of their cars).
+    This is the 'user.event_stream' endpoint. 404 unless REALTIME_ENABLED.
+    """
+    if not current_app.config['REALTIME_ENABLED']:
+        abort(404)  # Sync workers would be held by every open stream
+    if not isinstance(current_user._get_current_object(), User):
+        return jsonify({'error': 'Access denied.'}), 403
+
+    channels = [f"user:{current_user.id}", 'all']
+    host = current_user.host_profile
+    if host:
+        channels.append(f"host:{host.id}")
+    unread = get_unread_count(current_user.id)
+    db.session.remove()  # Nothing below touches the database; give the connection back now
+
+    try:
+        subscription = get_realtime_hub().subscribe(channels)
+    except RealtimeCapacityError:
+        response = jsonify({'error': 'Too many live connections, retry shortly.'})
+        response.headers['Retry-After'] = str(current_app.config['REALTIME_RETRY_MS'] // 1000)
+        return response, 503
+
+    hub = get_realtime_hub()
+    heartbeat = current_app.config['REALTIME_HEARTBEAT_SECONDS']
+    max_age = current_app.config['REALTIME_MAX_CONNECTION_SECONDS']
+    retry_ms = current_app.config['REALTIME_RETRY_MS']
+
+    def stream():
+        opened = time.monotonic()
+        try:
+            yield f"retry: {retry_ms}\n" + format_sse('hello', {'unread': unread})
+            # Recycle long-lived connections; EventSource reconnects on its own
+            while time.monotonic() - opened < max_age:
+                message = subscription.next(timeout=heartbeat)
+                yield message if message is not None else ": heartbeat\n\n"
+        finally:
+            hub.unsubscribe(subscription)
+
+    response = Response(stream_with_context(stream()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',  # Stop nginx from buffering the stream
+    })
+    response.call_on_close(lambda: hub.unsubscribe(subscription))  # Also frees the slot if streaming never starts
+    return response
@@ -3,13 +3,23 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_required, current_user
 from models import db
 from models.notification import Notification # Import the Notification model
+from models.user import User
 from routes.user import user_bp
+from utils.notification_counters import get_unread_count, mark_all_notifications_read, mark_notification_read
 
 # Define the user notifications blueprint
 # Make sure this matches the import in routes/user/__init__.py
 # The url_prefix='/user' is defined in routes/user/__init__.py
 user_notifications_bp = Blueprint('user_notifications', __name__)
 
+@user_bp.app_context_processor
+def inject_unread_notification_count():
+    """Unread badge for the navigation in base.html (one cached counter read, no COUNT(*))."""
+    if not current_user.is_authenticated or not isinstance(current_user._get_current_object(), User):
+        return {}
+    return {'unread_notification_count': get_unread_count(current_user.id)}
+
+
 @user_bp.route('/notifications')
 @login_required
 def list_notifications():
@@ -46,7 +56,8 @@ def mark_notification_as_read(notification_id):
         flash('Access denied.')
         return redirect(url_for('car.home'))
 
-    notification.mark_as_read()
+    # Conditional UPDATE: only an unread -> read change decrements the unread counter
+    mark_notification_read(notification.id, current_user.id)
     db.session.commit()
 
     flash('Notification marked as read.', 'success')
@@ -59,11 +70,7 @@ def mark_notification_as_read(notification_id):
 @login_required
 def mark_all_notifications_as_read():
     """Mark all notifications for the current user as read."""
-    Notification.query.filter_by(
-        user_id=current_user.id,
-        is_read=False
-    ).update({Notification.is_read: True})
-
+    mark_all_notifications_read(current_user.id)  # Subtracts exactly the rows it flipped
     db.session.commit()
 
     flash('All notifications marked as read.', 'success')
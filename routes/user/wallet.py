@@ -1,10 +1,11 @@
 # routes/user/wallet.py
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
 from flask_login import login_required, current_user
 from . import user_bp
 from models import db
 # Import WalletTransaction
 from models.wallet_transaction import WalletTransaction
+from utils.statement_export import statement_response, StatementExportError
 
 @user_bp.route('/wallet')
 @user_bp.route('/wallet/history') # Alias route for clarity
@@ -86,3 +87,22 @@ def wallet_transaction_detail(transaction_id):
     # --- End Render ---
 # --- END NEW: Transaction Detail Route ---
 
+
+# --- Statement Export Route ---
+@user_bp.route('/wallet/statement')
+@login_required
+def wallet_statement():
+    """
+    Download the user's wallet statement for a date range (?start=YYYY-MM-DD&end=YYYY-MM-DD&format=csv|parquet).
+    Streamed row by row, so the size of the history does not matter.
+    This is the 'user.wallet_statement' endpoint.
+    """
+    try:
+        return statement_response(
+            current_user.id, request.args, f"wallet_statement_{current_user.id}",
+            chunk_size=current_app.config['STATEMENT_EXPORT_CHUNK_SIZE']
+        )
+    except StatementExportError as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('user.wallet'))
+# --- End Statement Export Route ---
@@ -0,0 +1,37 @@
+// static/js/live_updates.js
+// Live notifications and booking updates over Server-Sent Events (routes/user/events.py).
+// - Keeps every [data-unread-badge] element in step with the unread count.
+// - Reloads a page carrying data-live-booking-id when that booking changes status.
+(function () {
+    var root = document.querySelector('[data-live-events-url]');
+    if (!root || !window.EventSource) {
+        return;
+    }
+    var unread = 0;
+
+    function renderBadges() {
+        document.querySelectorAll('[data-unread-badge]').forEach(function (badge) {
+            badge.textContent = unread;
+            badge.style.display = unread > 0 ? '' : 'none';
+        });
+    }
+
+    var source = new EventSource(root.getAttribute('data-live-events-url'));
+
+    source.addEventListener('hello', function (event) {
+        unread = JSON.parse(event.data).unread || 0;
+        renderBadges();
+    });
+
+    source.addEventListener('notification', function () {
+        unread += 1;
+        renderBadges();
+    });
+
+    source.addEventListener('booking', function (event) {
+        var data = JSON.parse(event.data);
+        if (document.querySelector('[data-live-booking-id="' + data.booking_id + '"]')) {
+            window.location.reload();
+        }
+    });
+})();
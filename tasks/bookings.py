@@ -0,0 +1,107 @@
+# tasks/bookings.py
+"""
+Background jobs that maintain booking state.
+"""
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import select, update
+
+from models import db
+from models.booking import Booking
+from utils.cache import invalidate_car_availability
+from utils.host_stats import invalidate_host_stats_for_cars
+from utils.notification_outbox import queue_notification
+
+
+def expire_stale_pending_bookings(ttl_minutes=None, batch_size=None):
+    """
+    Cancel pending, unpaid bookings (payment pending or failed) older than the
+    configured TTL so they stop blocking their cars in overlap checks.
+
+    Works in chunks of set-based UPDATEs instead of loading Booking objects:
+    each chunk locks a batch of ids, updates them in one statement, writes one
+    bulk notification INSERT for the affected users and commits.
+
+    Args:
+        ttl_minutes (int, optional): Age after which a pending booking expires.
+            Defaults to PENDING_BOOKING_TTL_MINUTES.
+        batch_size (int, optional): Rows per UPDATE. Defaults to PENDING_BOOKING_SWEEP_BATCH_SIZE.
+    Returns:
+        int: Number of bookings expired.
+    """
+    ttl_minutes = ttl_minutes or current_app.config['PENDING_BOOKING_TTL_MINUTES']
+    batch_size = batch_size or current_app.config['PENDING_BOOKING_SWEEP_BATCH_SIZE']
+    now = datetime.utcnow()
+    cutoff = now - timedelta(minutes=ttl_minutes)
+    reason = f"Payment not completed within {ttl_minutes} minutes"
+
+    stale_filter = (
+        Booking.status == 'pending',
+        Booking.payment_status.in_(('pending', 'failed')),  # mark_payment_failed() leaves the booking pending
+        Booking.created_at < cutoff,
+    )
+
+    total_expired = 0
+    touched_car_ids = set()
+    last_id = 0
+
+    while True:
+        # --- Lock the next chunk of stale rows (skip rows a payment callback holds) ---
+        rows = db.session.execute(
+            select(Booking.id, Booking.user_id, Booking.car_id)
+            .where(Booking.id > last_id, *stale_filter)
+            .order_by(Booking.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        ).all()
+        if not rows:
+            db.session.rollback()  # Release the (empty) read transaction
+            break
+        last_id = rows[-1].id
+        ids = [row.id for row in rows]
+        # --- End Lock ---
+
+        try:
+            # --- One UPDATE for the whole chunk ---
+            # Core UPDATE skips the ORM before_update price hook on purpose: only status columns change.
+            db.session.execute(
+                update(Booking)
+                .where(Booking.id.in_(ids), *stale_filter)
+                .values(
+                    status='cancelled',
+                    cancelled_by='system',
+                    cancellation_reason=reason,
+                    cancelled_at=now,
+                    cancellation_fee_deducted=0.0,
+                    refund_amount=0.0,
+                    updated_at=now,
+                )
+                .execution_options(synchronize_session=False)
+            )
+
+            # --- One bulk INSERT for the user notifications (outbox, written by the commit) ---
+            for row in rows:
+                queue_notification(
+                    row.user_id,
+                    f"Your booking #{row.id} was cancelled because payment was not completed in time."
+                )
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Error expiring pending bookings {ids[0]}..{ids[-1]}: {e}")
+            raise
+
+        total_expired += len(rows)
+        touched_car_ids.update(row.car_id for row in rows)
+
+        if len(rows) < batch_size:
+            break
+
+    # --- Drop cached availability for every car that got a slot back ---
+    invalidate_car_availability(touched_car_ids)
+    invalidate_host_stats_for_cars(touched_car_ids)
+
+    if total_expired:
+        current_app.logger.info(f"Expired {total_expired} stale pending bookings across {len(touched_car_ids)} cars.")
+    return total_expired
@@ -0,0 +1,128 @@
+# tasks/broadcasts.py
+"""
+Broadcast fan-out.
+
+Each window of user ids becomes one INSERT INTO notifications ... SELECT FROM
+users, committed together with the broadcast's cursor and counters. The user
+list never leaves the database and one window is one short transaction,
+whatever the segment size.
+"""
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import and_, false, func, insert, literal, or_, select, update
+
+from models import db
+from models.broadcast import Broadcast
+from models.notification import Notification
+from models.user import User
+from utils.broadcasts import segment_filter
+from utils.cache import cache, UNREAD_NOTIFICATIONS_NAMESPACE
+from utils.notification_counters import increment_unread_for_users
+from utils.realtime import publish
+
+
+def _claim(broadcast_id, now):
+    """Take ownership of a queued broadcast, or of a running one whose owner stopped heart-beating."""
+    stale = now - timedelta(seconds=current_app.config['BROADCAST_HEARTBEAT_TIMEOUT_SECONDS'])
+    claimed = db.session.execute(
+        update(Broadcast)
+        .where(Broadcast.id == broadcast_id, or_(
+            Broadcast.status == 'queued',
+            and_(Broadcast.status == 'running', Broadcast.heartbeat_at < stale),
+        ))
+        .values(status='running', heartbeat_at=now)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return bool(claimed)
+
+
+def run_broadcast(broadcast_id, window_size=None):
+    """
+    Fan one broadcast out, resuming from its cursor.
+    Args:
+        window_size (int, optional): User ids per INSERT ... SELECT. Defaults to BROADCAST_WINDOW_SIZE.
+    Returns:
+        Broadcast | None: The broadcast, or None if another run owns it (or took it over midway).
+    """
+    window_size = window_size or current_app.config['BROADCAST_WINDOW_SIZE']
+    if not _claim(broadcast_id, datetime.utcnow()):
+        return None
+    broadcast = db.session.get(Broadcast, broadcast_id)
+    try:
+        target = segment_filter(broadcast.segment, broadcast.segment_value)
+        if broadcast.max_user_id is None:
+            # First start: fix the id range and count the audience once
+            broadcast.max_user_id = db.session.execute(select(func.max(User.id))).scalar() or 0
+            broadcast.total_recipients = db.session.execute(
+                select(func.count()).select_from(User).where(target, User.id <= broadcast.max_user_id)
+            ).scalar()
+            broadcast.started_at = datetime.utcnow()
+            db.session.commit()
+
+        columns = ('user_id', 'message', 'is_read', 'timestamp', 'dispatch_status')
+        while broadcast.last_user_id < broadcast.max_user_id:
+            lower = broadcast.last_user_id
+            upper = min(lower + window_size, broadcast.max_user_id)
+            now = datetime.utcnow()
+            # Advance the cursor first, only from where this run left it. The row lock makes a second owner
+            # (one that took over after a missed heartbeat) wait here and then find the cursor moved.
+            advanced = db.session.execute(
+                update(Broadcast)
+                .where(Broadcast.id == broadcast_id, Broadcast.last_user_id == lower)
+                .values(last_user_id=upper, heartbeat_at=now)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if not advanced:
+                db.session.rollback()
+                current_app.logger.warning(f"Broadcast {broadcast_id} was taken over at user id {lower}; stopping.")
+                return None
+            # Offers stay in-app: 'skipped' keeps them out of the WhatsApp dispatcher
+            window = (User.id > lower, User.id <= upper, target)
+            inserted = db.session.execute(
+                insert(Notification).from_select(columns, select(
+                    User.id, literal(broadcast.message), false(), literal(now), literal('skipped')
+                ).where(*window))
+            ).rowcount
+            increment_unread_for_users(select(User.id).where(*window))
+            db.session.execute(
+                update(Broadcast)
+                .where(Broadcast.id == broadcast_id)
+                .values(sent_count=Broadcast.sent_count + max(inserted or 0, 0))
+                .execution_options(synchronize_session=False)
+            )
+            db.session.commit()  # Window, counters and cursor together: a restart never duplicates a window
+            db.session.refresh(broadcast)
+            cache.invalidate(UNREAD_NOTIFICATIONS_NAMESPACE)  # Too many users to drop one by one
+
+        broadcast.status = 'completed'
+        broadcast.completed_at = datetime.utcnow()
+        db.session.commit()
+        current_app.logger.info(f"Broadcast {broadcast.id} completed: {broadcast.sent_count} notifications.")
+        if broadcast.segment == 'all':
+            # One push reaches every open connection; narrower segments show up on the next page load
+            publish('all', 'notification', {'message': broadcast.message, 'broadcast_id': broadcast.id})
+    except Exception as e:
+        db.session.rollback()
+        broadcast = db.session.get(Broadcast, broadcast_id)
+        broadcast.status = 'failed'
+        broadcast.error = str(e)[:255]
+        db.session.commit()
+        current_app.logger.error(f"Broadcast {broadcast_id} failed at user id {broadcast.last_user_id}: {e}")
+    return broadcast
+
+
+def run_queued_broadcasts():
+    """Scheduler entry point: run every queued broadcast, plus running ones whose owner died."""
+    stale = datetime.utcnow() - timedelta(seconds=current_app.config['BROADCAST_HEARTBEAT_TIMEOUT_SECONDS'])
+    broadcast_ids = db.session.execute(
+        select(Broadcast.id)
+        .where(or_(Broadcast.status == 'queued',
+                   and_(Broadcast.status == 'running', Broadcast.heartbeat_at < stale)))
+        .order_by(Broadcast.id)
+    ).scalars().all()
+    db.session.rollback()  # Release the read transaction
+    for broadcast_id in broadcast_ids:
+        run_broadcast(broadcast_id)
+    return len(broadcast_ids)
@@ -0,0 +1,288 @@
+# tasks/cli.py
+"""
+`flask ...` commands for the batch jobs in tasks/.
+Registered on the app in create_app() via register_commands(app).
+"""
+import click
+
+
+def register_commands(app):
+    """Attach the batch-job CLI commands to `app`."""
+
+    @app.cli.command('reconcile-payments')
+    @click.option('--export', 'export_path', type=click.Path(exists=True, dir_okay=False), required=True,
+                  help='Payments export CSV from the gateway dashboard (id, order_id, amount in paise, status).')
+    @click.option('--report', 'report_path', type=click.Path(dir_okay=False),
+                  help='Where to write the mismatch report (CSV).')
+    @click.option('--chunk-size', type=int, default=None, help='Rows per server-side fetch.')
+    def reconcile_payments_command(export_path, report_path, chunk_size):
+        """Cross-check bookings, wallets and gateway payments; write a mismatch report."""
+        from tasks.reconciliation import reconcile_payments
+
+        # Always an export: Razorpay has no listing in the client, and the fake gateway's payments
+        # live in the web workers' memory, not in this process
+        try:
+            summary = reconcile_payments(export_path=export_path, report_path=report_path, chunk_size=chunk_size)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+
+        for check, count in summary['checked'].items():
+            click.echo(f"{check}: {count} checked")
+        if summary['issues']:
+            for issue, count in sorted(summary['issues'].items()):
+                click.echo(f"  {issue}: {count}")
+        else:
+            click.echo("No mismatches found.")
+        click.echo(f"Report: {summary['report_path']}")
+
+    @app.cli.command('wallet-stress')
+    @click.option('--user-id', type=int, required=True, help='User whose wallet receives the concurrent credits.')
+    @click.option('--host-id', type=int, default=None, help='Optionally also stress this host wallet.')
+    @click.option('--workers', type=int, default=16, show_default=True, help='Concurrent threads.')
+    @click.option('--credits', 'credits_per_worker', type=int, default=50, show_default=True,
+                  help='Credits per thread.')
+    @click.option('--amount', type=float, default=1.0, show_default=True, help='Amount per credit.')
+    def wallet_stress_command(user_id, host_id, workers, credits_per_worker, amount):
+        """Fire concurrent wallet credits and verify none were lost (credits are reverted afterwards)."""
+        from tasks.wallet_stress import run_wallet_stress
+
+        report = run_wallet_stress(user_id, host_id=host_id, workers=workers,
+                                   credits_per_worker=credits_per_worker, amount=amount)
+        lost = False
+        for wallet, stats in report.items():
+            click.echo(f"{wallet}: " + ", ".join(f"{key}={value}" for key, value in stats.items()))
+            lost = lost or stats['lost_updates'] != 0
+        if lost:
+            raise click.ClickException("Lost wallet updates detected.")
+        click.echo("No lost updates.")
+
+    @app.cli.command('ledger-snapshot')
+    def ledger_snapshot_command():
+        """Write per-account ledger balance snapshots now."""
+        from tasks.ledger import snapshot_ledger_balances
+
+        written = snapshot_ledger_balances()
+        click.echo(f"Wrote {written} ledger balance snapshots." if written else "No new postings since the last snapshot.")
+
+    @app.cli.command('payouts-run')
+    @click.option('--max-requests', type=int, default=None, help='Queued requests to take in this run.')
+    def payouts_run_command(max_requests):
+        """Batch queued host withdrawals per bank, debit wallets and write payout files."""
+        from models.payout import PayoutBatch
+        from tasks.payouts import build_payout_batches
+
+        batch_ids = build_payout_batches(max_requests=max_requests)
+        if not batch_ids:
+            click.echo("No payout batches created.")
+        for batch in PayoutBatch.query.filter(PayoutBatch.id.in_(batch_ids)).order_by(PayoutBatch.id):
+            click.echo(f"Batch {batch.id} [{batch.bank_code}]: {batch.request_count} requests, "
+                       f"₹{batch.total_amount:.2f} -> {batch.file_path}")
+
+    @app.cli.command('payouts-settle')
+    @click.argument('batch_id', type=int)
+    @click.option('--failed', default='', help='Comma-separated request ids the bank rejected.')
+    @click.option('--reason', default=None, help='Failure reason recorded on rejected requests.')
+    def payouts_settle_command(batch_id, failed, reason):
+        """Record a batch's settlement; rejected requests are refunded to the host wallets."""
+        from tasks.payouts import settle_payout_batch
+
+        try:
+            failed_ids = [int(request_id) for request_id in failed.split(',') if request_id.strip()]
+            batch = settle_payout_batch(batch_id, failed_request_ids=failed_ids, reason=reason)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        click.echo(f"Batch {batch.id} {batch.status}: ₹{batch.settled_amount:.2f} of ₹{batch.total_amount:.2f} paid.")
+
+    @app.cli.command('verify-ledgers')
+    @click.option('--workers', type=int, default=None, help='Worker processes (default: LEDGER_VERIFY_WORKERS or CPU count).')
+    @click.option('--partition-size', type=int, default=None, help='Owner ids per worker task.')
+    @click.option('--report', 'report_path', type=click.Path(dir_okay=False),
+                  help='Where to write the drift report (CSV).')
+    def verify_ledgers_command(workers, partition_size, report_path):
+        """Recompute every wallet balance from its history in parallel and report drift."""
+        from tasks.ledger_verify import verify_wallet_ledgers
+
+        try:
+            summary = verify_wallet_ledgers(workers=workers, partition_size=partition_size, report_path=report_path)
+        except RuntimeError as e:
+            raise click.ClickException(str(e))
+
+        click.echo(f"Users: {summary['users']} ({summary['transactions']} transactions), "
+                   f"hosts: {summary['hosts']} ({summary['postings']} ledger postings) in {summary['seconds']}s")
+        click.echo(f"Drift found: {summary['issues']}" if summary['issues'] else "No drift found.")
+        click.echo(f"Report: {summary['report_path']}")
+
+    @app.cli.command('rollups-backfill')
+    @click.option('--start', 'start_day', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+                  help='First IST day (YYYY-MM-DD). Defaults to the beginning of history.')
+    @click.option('--end', 'end_day', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+                  help='Last IST day (YYYY-MM-DD), inclusive.')
+    @click.option('--host-id', type=int, default=None, help='Only rebuild this host.')
+    def rollups_backfill_command(start_day, end_day, host_id):
+        """Rebuild the daily host earnings rollups from bookings."""
+        from tasks.rollups import rebuild_host_rollups
+
+        written = rebuild_host_rollups(
+            start_day=start_day.date() if start_day else None,
+            end_day=end_day.date() if end_day else None,
+            host_id=host_id
+        )
+        click.echo(f"Wrote {written} host rollup rows.")
+
+    @app.cli.command('search-log-compact')
+    def search_log_compact_command():
+        """Fold settled search log rows into the per-cell demand table now."""
+        from tasks.search_demand import compact_search_log
+
+        click.echo(f"Compacted {compact_search_log()} search log rows.")
+
+    @app.cli.command('notifications-dispatch')
+    @click.option('--batch-size', type=int, default=None, help='Rows handed off (default: NOTIFICATION_DISPATCH_BATCH_SIZE).')
+    def notifications_dispatch_command(batch_size):
+        """Hand one batch of pending notifications to the outbound message queue now."""
+        from tasks.notification_dispatch import dispatch_pending_notifications
+
+        counts = dispatch_pending_notifications(batch_size=batch_size)
+        click.echo(', '.join(f"{outcome}: {count}" for outcome, count in counts.items()))
+
+    @app.cli.command('messages-dispatch')
+    @click.option('--batch-size', type=int, default=None, help='Messages claimed (default: MESSAGING_BATCH_SIZE).')
+    def messages_dispatch_command(batch_size):
+        """Send one batch of due WhatsApp/SMS messages now."""
+        from tasks.messaging import dispatch_outbound_messages
+
+        counts = dispatch_outbound_messages(batch_size=batch_size)
+        click.echo(', '.join(f"{outcome}: {count}" for outcome, count in counts.items()))
+
+    @app.cli.command('messages-requeue-dead')
+    @click.option('--since', type=click.DateTime(), default=None, help='Only messages created at or after this UTC time.')
+    def messages_requeue_dead_command(since):
+        """Give dead-lettered messages a fresh set of attempts."""
+        from tasks.messaging import requeue_dead_messages
+
+        click.echo(f"Requeued {requeue_dead_messages(since=since)} dead messages.")
+
+    @app.cli.command('messages-benchmark')
+    @click.option('--count', type=int, default=1000, show_default=True, help='Synthetic messages to send.')
+    @click.option('--threads', type=int, default=None, help='Sender threads (default: MESSAGING_SENDER_THREADS).')
+    @click.option('--rate', type=float, default=None, help='Token bucket rate per second (default: MESSAGING_RATE_PER_SECOND).')
+    @click.option('--burst', type=int, default=None, help='Token bucket size (default: the rate).')
+    @click.option('--latency-ms', type=int, default=100, show_default=True, help='Simulated provider latency.')
+    @click.option('--failure-rate', type=float, default=0.0, show_default=True, help='Fraction of transient failures.')
+    def messages_benchmark_command(count, threads, rate, burst, latency_ms, failure_rate):
+        """Measure dispatcher throughput against the fake provider (no database, nothing is sent)."""
+        from tasks.messaging import run_messaging_benchmark
+
+        if count <= 0:
+            raise click.ClickException("--count must be positive.")
+        report = run_messaging_benchmark(
+            count,
+            threads=threads or app.config['MESSAGING_SENDER_THREADS'],
+            rate=rate or app.config['MESSAGING_RATE_PER_SECOND'],
+            burst=burst, latency_ms=latency_ms, failure_rate=failure_rate,
+        )
+        click.echo(", ".join(f"{key}={value}" for key, value in report.items()))
+
+    @app.cli.command('broadcast-run')
+    @click.option('--id', 'broadcast_id', type=int, default=None, help='Broadcast to run (default: every queued one).')
+    @click.option('--window-size', type=int, default=None, help='User ids per INSERT ... SELECT.')
+    def broadcast_run_command(broadcast_id, window_size):
+        """Fan out queued broadcasts now, reporting progress."""
+        from tasks.broadcasts import run_broadcast, run_queued_broadcasts
+
+        if broadcast_id is None:
+            click.echo(f"Ran {run_queued_broadcasts()} broadcasts.")
+            return
+        broadcast = run_broadcast(broadcast_id, window_size=window_size)
+        if broadcast is None:
+            raise click.ClickException(f"Broadcast {broadcast_id} is not queued or is owned by another run.")
+        click.echo(f"Broadcast {broadcast.id}: {broadcast.status}, {broadcast.sent_count}/{broadcast.total_recipients} "
+                   f"notified ({broadcast.progress():.0%} of users scanned).")
+
+    @app.cli.command('reminders-backfill')
+    def reminders_backfill_command():
+        """Schedule reminders for paid bookings created before the reminder queue existed."""
+        from tasks.reminders import backfill_booking_reminders
+
+        click.echo(f"Scheduled reminders for {backfill_booking_reminders()} bookings.")
+
+    @app.cli.command('scheduler')
+    def scheduler_command():
+        """Run the background jobs in this process (leader-elected; set SCHEDULER_EMBEDDED=false on the web workers)."""
+        from tasks.scheduler import SchedulerRunner
+
+        click.echo("Scheduler runner started; waiting for leadership. Ctrl+C to stop.")
+        # Per-process cache warmers only matter inside web workers
+        SchedulerRunner(app, run_per_process_jobs=False).run_forever()
+        click.echo("Scheduler runner stopped.")
+
+    @app.cli.command('notifications-reconcile')
+    @click.option('--window-size', type=int, default=None, help='User ids per transaction.')
+    def notifications_reconcile_command(window_size):
+        """Recount unread notifications and repair drifted per-user counters."""
+        from tasks.notification_counters import reconcile_unread_counters
+
+        click.echo(f"Corrected {reconcile_unread_counters(window_size=window_size)} unread counters.")
+
+    @app.cli.command('retention-run')
+    @click.option('--policy', type=click.Choice(['notifications', 'photos', 'trip_photos']), default=None,
+                  help='Only this policy (default: all).')
+    @click.option('--max-chunks', type=int, default=None, help='Chunks per policy (default: RETENTION_MAX_CHUNKS_PER_RUN).')
+    def retention_run_command(policy, max_chunks):
+        """Move rows past their retention period into the archive tables now."""
+        from tasks.retention import apply_retention_policies
+
+        for name, archived in apply_retention_policies(policy_name=policy, max_chunks=max_chunks).items():
+            click.echo(f"{name}: {archived} rows archived")
+
+    @app.cli.command('retention-export')
+    @click.option('--policy', type=click.Choice(['notifications', 'photos', 'trip_photos']), required=True)
+    @click.option('--purge', is_flag=True, help='Delete exported rows from the archive table.')
+    @click.option('--dir', 'export_dir', type=click.Path(file_okay=False), default=None,
+                  help='Output directory (default: RETENTION_EXPORT_DIR).')
+    def retention_export_command(policy, purge, export_dir):
+        """Export archived rows not yet exported to a gzip'd JSON Lines file."""
+        from tasks.retention import export_archive
+
+        result = export_archive(policy, purge=purge, export_dir=export_dir)
+        if not result['rows']:
+            click.echo("Nothing to export.")
+            return
+        click.echo(f"Exported {result['rows']} rows to {result['path']}" + (" (purged)." if purge else "."))
+
+    @app.cli.command('uploads-migrate')
+    @click.option('--chunk-size', type=int, default=200, show_default=True, help='Rows per transaction.')
+    @click.option('--delete-legacy', is_flag=True, help='Remove flat legacy files once no row references them.')
+    def uploads_migrate_command(chunk_size, delete_legacy):
+        """Move rows that point at flat files in the uploads folders into the content-addressed store."""
+        from tasks.uploads import migrate_legacy_uploads
+
+        summary = migrate_legacy_uploads(chunk_size=chunk_size, delete_legacy=delete_legacy)
+        click.echo(", ".join(f"{key}: {value}" for key, value in summary.items()))
+
+    @app.cli.command('uploads-gc')
+    def uploads_gc_command():
+        """Delete upload blobs (and orphaned files) unreferenced for UPLOAD_BLOB_GC_GRACE_HOURS."""
+        from tasks.uploads import collect_orphan_files, collect_unreferenced_blobs
+
+        click.echo(f"Collected {collect_unreferenced_blobs()} unreferenced blobs.")
+        click.echo(f"Removed {collect_orphan_files()} orphaned files.")
+
+    @app.cli.command('images-derive')
+    @click.option('--batch-size', type=int, default=None, help='Blobs per batch (default: IMAGE_DERIVATIVE_BATCH_SIZE).')
+    @click.option('--requeue', type=click.Choice(['failed', 'all']), default=None,
+                  help='First mark failed (or all rendered) images for rendering again.')
+    def images_derive_command(batch_size, requeue):
+        """Render thumbnails and resized variants for every pending image now."""
+        from tasks.images import generate_pending_derivatives, requeue_image_derivatives
+
+        if requeue:
+            click.echo(f"Requeued {requeue_image_derivatives(failed_only=requeue == 'failed')} images.")
+        totals = {'ready': 0, 'failed': 0}
+        while True:
+            counts = generate_pending_derivatives(batch_size=batch_size)
+            if not any(counts.values()):
+                break
+            for outcome, count in counts.items():
+                totals[outcome] += count
+        click.echo(", ".join(f"{outcome}: {count}" for outcome, count in totals.items()))
@@ -0,0 +1,134 @@
+# tasks/images.py
+"""
+Derivative worker: renders thumbnails and resized variants of uploaded
+images (utils/image_variants.py) off the request path.
+
+Each run claims pending image blobs in a short transaction ('processing',
+claim time in derivatives_claimed_at; SKIP LOCKED so concurrent runs take
+different blobs), renders them on a thread pool of IMAGE_WORKER_THREADS
+(no database access on the workers) and records 'ready' or 'failed' for
+each blob. A claim older than IMAGE_DERIVATIVE_CLAIM_TIMEOUT_SECONDS (the
+process died mid-batch) is taken again. Until a blob is 'ready', templates
+keep serving the original.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import and_, or_, select, update
+
+from models import db
+from models.blob import Blob
+from utils.image_variants import IMAGE_FORMATS, IMAGE_VARIANTS, derivative_key, render_derivatives
+from utils.upload_store import upload_path
+
+_pool = None
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:  # Only the scheduler leader (or a CLI run) calls this, from one thread
+        _pool = ThreadPoolExecutor(max_workers=current_app.config['IMAGE_WORKER_THREADS'],
+                                   thread_name_prefix='image-derivatives')
+    return _pool
+
+
+def _claim_batch(batch_size, now):
+    stale_claim = now - timedelta(seconds=current_app.config['IMAGE_DERIVATIVE_CLAIM_TIMEOUT_SECONDS'])
+    claimable = or_(
+        Blob.derivatives_status == 'pending',
+        and_(Blob.derivatives_status == 'processing', Blob.derivatives_claimed_at < stale_claim),
+    )
+    try:
+        rows = db.session.execute(
+            select(Blob.id, Blob.key)
+            .where(claimable, Blob.ref_count > 0)
+            .order_by(Blob.id.desc())  # Newest uploads first: they are the ones being looked at
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        ).all()
+        if rows:
+            db.session.execute(
+                update(Blob)
+                .where(Blob.id.in_([row.id for row in rows]))
+                .values(derivatives_status='processing', derivatives_claimed_at=now)
+                .execution_options(synchronize_session=False)
+            )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return rows
+
+
+def generate_pending_derivatives(batch_size=None):
+    """
+    Render derivatives for one batch of pending image blobs.
+    Args:
+        batch_size (int, optional): Defaults to IMAGE_DERIVATIVE_BATCH_SIZE.
+    Returns:
+        dict: Count of blobs per outcome ('ready', 'failed').
+    """
+    config = current_app.config
+    batch_size = batch_size or config['IMAGE_DERIVATIVE_BATCH_SIZE']
+    rows = _claim_batch(batch_size, datetime.utcnow())
+    if not rows:
+        return {'ready': 0, 'failed': 0}
+
+    pool = _get_pool()
+    futures = {}
+    for row in rows:
+        targets = [(variant, fmt, upload_path(derivative_key(row.key, variant, fmt)))
+                   for variant in IMAGE_VARIANTS for fmt in IMAGE_FORMATS]
+        futures[row.id] = pool.submit(
+            render_derivatives, upload_path(row.key), targets,
+            config['IMAGE_JPEG_QUALITY'], config['IMAGE_WEBP_QUALITY'],
+        )
+
+    ready, failed = [], []
+    for blob_id, future in futures.items():
+        try:
+            future.result()
+            ready.append({'id': blob_id, 'derivatives_status': 'ready', 'derivatives_claimed_at': None,
+                          'derivatives_error': None})
+        except Exception as e:  # Corrupt or unsupported image, missing file, Pillow not installed
+            current_app.logger.warning(f"Could not render derivatives for blob {blob_id}: {e}")
+            failed.append({'id': blob_id, 'derivatives_status': 'failed', 'derivatives_claimed_at': None,
+                           'derivatives_error': str(e)[:255]})
+
+    try:
+        for changes in (ready, failed):
+            if changes:
+                db.session.execute(update(Blob), changes)  # executemany by primary key
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error recording image derivative results: {e}")
+        raise
+
+    counts = {'ready': len(ready), 'failed': len(failed)}
+    current_app.logger.info(f"Rendered image derivatives: {counts}")
+    return counts
+
+
+def requeue_image_derivatives(failed_only=True):
+    """
+    Mark image blobs for (re)rendering, e.g. after changing IMAGE_VARIANTS.
+    Args:
+        failed_only (bool): Only blobs whose last render failed; otherwise every 'ready' one too.
+    Returns:
+        int: Blobs requeued.
+    """
+    statuses = ('failed',) if failed_only else ('failed', 'ready')
+    try:
+        requeued = db.session.execute(
+            update(Blob)
+            .where(Blob.derivatives_status.in_(statuses))
+            .values(derivatives_status='pending', derivatives_error=None)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return requeued
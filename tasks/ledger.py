@@ -0,0 +1,81 @@
+# tasks/ledger.py
+"""
+Periodic per-account balance snapshots for the double-entry ledger.
+"""
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import func, insert, literal, select
+
+from models import db
+from models.ledger import LedgerAccount, LedgerBalanceSnapshot, LedgerPosting
+
+
+def snapshot_ledger_balances(as_of=None):
+    """
+    Write one LedgerBalanceSnapshot per account: the previous run's balance plus the
+    postings since, computed and inserted by a single INSERT ... SELECT.
+
+    Postings younger than LEDGER_SNAPSHOT_SETTLE_SECONDS are left for the next run,
+    so a transaction still open when the run starts cannot commit an id below the
+    snapshot watermark and be skipped forever.
+
+    Returns:
+        int: Number of snapshot rows written (0 when nothing was posted since the last run).
+    """
+    as_of = as_of or datetime.utcnow()
+    settle_cutoff = as_of - timedelta(seconds=current_app.config['LEDGER_SNAPSHOT_SETTLE_SECONDS'])
+
+    last_posting_id = db.session.execute(
+        select(func.max(LedgerPosting.id)).where(LedgerPosting.created_at <= settle_cutoff)
+    ).scalar() or 0
+
+    previous = db.session.execute(
+        select(LedgerBalanceSnapshot.as_of, LedgerBalanceSnapshot.last_posting_id)
+        .order_by(LedgerBalanceSnapshot.as_of.desc())
+        .limit(1)
+    ).first()
+    previous_as_of, previous_last_id = previous if previous else (None, 0)
+
+    if last_posting_id <= previous_last_id:
+        db.session.rollback()
+        return 0
+
+    # --- Balance = previous snapshot + postings in (previous_last_id, last_posting_id] ---
+    delta = (
+        select(LedgerPosting.account_id, func.sum(LedgerPosting.amount).label('amount'))
+        .where(LedgerPosting.id > previous_last_id, LedgerPosting.id <= last_posting_id)
+        .group_by(LedgerPosting.account_id)
+        .subquery()
+    )
+    prior = (
+        select(LedgerBalanceSnapshot.account_id, LedgerBalanceSnapshot.balance)
+        .where(LedgerBalanceSnapshot.as_of == previous_as_of)
+        .subquery()
+    )
+    rows = (
+        select(
+            LedgerAccount.id,
+            literal(as_of, type_=db.DateTime),
+            literal(last_posting_id, type_=db.Integer),
+            func.coalesce(prior.c.balance, 0) + func.coalesce(delta.c.amount, 0),
+        )
+        .outerjoin(prior, prior.c.account_id == LedgerAccount.id)
+        .outerjoin(delta, delta.c.account_id == LedgerAccount.id)
+    )
+    # --- End Balance ---
+
+    try:
+        result = db.session.execute(
+            insert(LedgerBalanceSnapshot).from_select(
+                ['account_id', 'as_of', 'last_posting_id', 'balance'], rows
+            )
+        )
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error writing ledger snapshots as of {as_of}: {e}")
+        raise
+
+    current_app.logger.info(f"Wrote {result.rowcount} ledger balance snapshots up to posting {last_posting_id}.")
+    return result.rowcount
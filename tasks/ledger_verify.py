@@ -0,0 +1,231 @@
+# tasks/ledger_verify.py
+"""
+Offline wallet integrity verifier.
+
+Proves that every stored wallet balance matches the history behind it:
+
+- users: wallet_transactions are replayed per user (running balance from zero)
+  and compared row by row with balance_after, and the final value with
+  users.wallet_balance;
+- hosts: hosts.wallet_balance is compared with the sum of the host's postings
+  in the double-entry ledger (host earnings are not WalletTransactions).
+
+Owners are partitioned into id ranges and verified in a process pool. Each
+worker loads one range as NumPy arrays and computes the per-owner running
+sums with a single cumulative sum, so the cost is a sequential scan plus
+vectorised arithmetic rather than a Python loop per transaction.
+"""
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from multiprocessing import get_context
+
+from flask import current_app
+from sqlalchemy import create_engine, func, or_, select
+
+from models import db
+from models.host import Host
+from models.ledger import LedgerAccount, LedgerPosting
+from models.user import User
+from models.wallet_transaction import WalletTransaction
+
+REPORT_FIELDS = ['owner', 'owner_id', 'issue', 'transaction_id', 'expected', 'actual', 'drift']
+CREDIT_TYPES = ('deposit', 'earning', 'refund', 'bonus')
+
+# --- Worker Process State ---
+_worker_engine = None
+
+
+def _init_worker(database_uri):
+    """Give each worker process its own engine (connections must not cross a fork)."""
+    global _worker_engine
+    _worker_engine = create_engine(database_uri, pool_size=1, max_overflow=0)
+# --- End Worker Process State ---
+
+
+def _fetch_columns(statement, columns):
+    """Run `statement` on the worker engine and return its columns as a dict of lists."""
+    with _worker_engine.connect() as conn:
+        rows = conn.execute(statement).all()
+    return {name: [row[i] for row in rows] for i, name in enumerate(columns)}
+
+
+def _verify_user_range(low, high, tolerance, max_issues):
+    """
+    Verify users with low <= id < high.
+    Returns:
+        tuple: (users checked, transactions checked, issue rows, issue count).
+    """
+    import numpy as np
+
+    txns = _fetch_columns(
+        select(WalletTransaction.user_id, WalletTransaction.id, WalletTransaction.transaction_type,
+               WalletTransaction.amount, WalletTransaction.balance_after)
+        # Host-wallet payout rows carry the host balance, not the user's
+        .where(WalletTransaction.user_id >= low, WalletTransaction.user_id < high,
+               or_(WalletTransaction.reference_type.is_(None), WalletTransaction.reference_type != 'host_withdrawal'))
+        .order_by(WalletTransaction.user_id, WalletTransaction.id),
+        ['user_id', 'id', 'type', 'amount', 'balance_after']
+    )
+    users = _fetch_columns(
+        select(User.id, User.wallet_balance).where(User.id >= low, User.id < high).order_by(User.id),
+        ['id', 'wallet_balance']
+    )
+
+    issues = []
+    issue_count = 0
+
+    def add_issue(*row):
+        nonlocal issue_count
+        issue_count += 1
+        if len(issues) < max_issues:
+            issues.append(row)
+
+    user_ids = np.asarray(txns['user_id'], dtype=np.int64)
+    final_by_user = {}
+    if len(user_ids):
+        txn_ids = np.asarray(txns['id'], dtype=np.int64)
+        amounts = np.asarray(txns['amount'], dtype=np.float64)
+        recorded = np.asarray(txns['balance_after'], dtype=np.float64)
+        is_credit = np.isin(np.asarray(txns['type'], dtype=object), CREDIT_TYPES)
+        signed = np.where(is_credit, amounts, -amounts)
+
+        # --- Per-user running balance from one global cumulative sum ---
+        starts = np.flatnonzero(np.r_[True, user_ids[1:] != user_ids[:-1]])
+        lengths = np.diff(np.r_[starts, len(user_ids)])
+        totals = np.cumsum(signed)
+        offsets = totals[starts] - signed[starts]  # Running total before each user's first row
+        expected = totals - np.repeat(offsets, lengths)
+        # --- End Running Balance ---
+
+        drift = recorded - expected
+        bad = np.abs(drift) > tolerance
+        if bad.any():
+            # Report the first diverging row per user (later rows usually inherit the drift)
+            group_of_row = np.repeat(np.arange(len(starts)), lengths)
+            _, first_bad = np.unique(group_of_row[bad], return_index=True)
+            for row in np.flatnonzero(bad)[first_bad]:
+                add_issue('user', int(user_ids[row]), 'balance_after_drift', int(txn_ids[row]),
+                          round(float(expected[row]), 2), round(float(recorded[row]), 2), round(float(drift[row]), 2))
+
+        last_rows = starts + lengths - 1
+        final_by_user = dict(zip(user_ids[starts].tolist(), expected[last_rows].tolist()))
+
+    for user_id, balance in zip(users['id'], users['wallet_balance']):
+        expected_balance = final_by_user.pop(user_id, 0.0)
+        balance = balance or 0.0
+        if abs(balance - expected_balance) > tolerance:
+            add_issue('user', user_id, 'wallet_balance_drift', '', round(expected_balance, 2),
+                      round(balance, 2), round(balance - expected_balance, 2))
+    for user_id, expected_balance in final_by_user.items():
+        add_issue('user', user_id, 'orphan_transactions', '', round(expected_balance, 2), '', '')
+
+    return len(users['id']), len(user_ids), issues, issue_count
+
+
+def _verify_host_range(low, high, tolerance, max_issues):
+    """
+    Verify hosts with low <= id < high against their ledger postings.
+    Returns:
+        tuple: (hosts checked, postings checked, issue rows, issue count).
+    """
+    import numpy as np
+
+    postings = _fetch_columns(
+        select(LedgerAccount.owner_id, LedgerPosting.amount)
+        .join(LedgerAccount, LedgerPosting.account_id == LedgerAccount.id)
+        .where(LedgerAccount.account_type == 'host', LedgerAccount.owner_id >= low, LedgerAccount.owner_id < high)
+        .order_by(LedgerAccount.owner_id),
+        ['owner_id', 'amount']
+    )
+    hosts = _fetch_columns(
+        select(Host.id, Host.wallet_balance).where(Host.id >= low, Host.id < high).order_by(Host.id),
+        ['id', 'wallet_balance']
+    )
+
+    issues = []
+    issue_count = 0
+    owners = np.asarray(postings['owner_id'], dtype=np.int64)
+    ledger_by_host = {}
+    if len(owners):
+        amounts = np.asarray([float(amount) for amount in postings['amount']], dtype=np.float64)
+        starts = np.flatnonzero(np.r_[True, owners[1:] != owners[:-1]])
+        ledger_by_host = dict(zip(owners[starts].tolist(), np.add.reduceat(amounts, starts).tolist()))
+
+    for host_id, balance in zip(hosts['id'], hosts['wallet_balance']):
+        expected_balance = ledger_by_host.get(host_id, 0.0)
+        balance = balance or 0.0
+        if abs(balance - expected_balance) > tolerance:
+            issue_count += 1
+            if len(issues) < max_issues:
+                issues.append(('host', host_id, 'wallet_balance_drift', '', round(expected_balance, 2),
+                               round(balance, 2), round(balance - expected_balance, 2)))
+    return len(hosts['id']), len(owners), issues, issue_count
+
+
+def _id_ranges(model, partition_size):
+    """Split [min(id), max(id)] into half-open ranges of `partition_size` ids."""
+    low, high = db.session.execute(select(func.min(model.id), func.max(model.id))).one()
+    if low is None:
+        return []
+    return [(start, min(start + partition_size, high + 1)) for start in range(low, high + 1, partition_size)]
+
+
+def verify_wallet_ledgers(workers=None, partition_size=None, report_path=None, max_issues_per_partition=1000):
+    """
+    Verify all user and host wallets in parallel and write a drift report (CSV).
+
+    Args:
+        workers (int, optional): Processes. Defaults to LEDGER_VERIFY_WORKERS (or the CPU count).
+        partition_size (int, optional): Owner ids per task. Defaults to LEDGER_VERIFY_PARTITION_SIZE.
+        report_path (str, optional): Defaults to RECONCILIATION_REPORT_DIR/ledger_verify_<timestamp>.csv.
+    Returns:
+        dict: Owners/rows checked, drift counts and the report path.
+    """
+    try:
+        import numpy  # noqa: F401 - fail before starting the pool
+    except ImportError:
+        raise RuntimeError("The ledger verifier requires the 'numpy' package.")
+
+    config = current_app.config
+    workers = workers or config['LEDGER_VERIFY_WORKERS'] or os.cpu_count() or 1
+    partition_size = partition_size or config['LEDGER_VERIFY_PARTITION_SIZE']
+    tolerance = config['RECONCILIATION_AMOUNT_TOLERANCE']
+    if not report_path:
+        os.makedirs(config['RECONCILIATION_REPORT_DIR'], exist_ok=True)
+        report_path = os.path.join(config['RECONCILIATION_REPORT_DIR'],
+                                   f"ledger_verify_{datetime.utcnow():%Y%m%d_%H%M%S}.csv")
+
+    tasks = [(_verify_user_range, r) for r in _id_ranges(User, partition_size)]
+    tasks += [(_verify_host_range, r) for r in _id_ranges(Host, partition_size)]
+    db.session.rollback()
+
+    summary = {'users': 0, 'transactions': 0, 'hosts': 0, 'postings': 0, 'issues': 0, 'report_path': report_path}
+    started = datetime.utcnow()
+    with open(report_path, 'w', newline='', encoding='utf-8') as report_file, ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=get_context('spawn'),
+        initializer=_init_worker,
+        initargs=(config['SQLALCHEMY_DATABASE_URI'],)
+    ) as pool:
+        writer = csv.writer(report_file)
+        writer.writerow(REPORT_FIELDS)
+        futures = {
+            pool.submit(func, low, high, tolerance, max_issues_per_partition): func
+            for func, (low, high) in tasks
+        }
+        for future in as_completed(futures):
+            owners, rows, issues, issue_count = future.result()
+            if futures[future] is _verify_user_range:
+                summary['users'] += owners
+                summary['transactions'] += rows
+            else:
+                summary['hosts'] += owners
+                summary['postings'] += rows
+            summary['issues'] += issue_count
+            writer.writerows(issues)
+
+    summary['seconds'] = round((datetime.utcnow() - started).total_seconds(), 1)
+    current_app.logger.info(f"Ledger verification finished: {summary}")
+    return summary
@@ -0,0 +1,193 @@
+# tasks/messaging.py
+"""
+Dispatcher for the outbound WhatsApp/SMS queue (models/outbound_message.py).
+
+Each run claims due rows in a short transaction ('sending', attempts + 1,
+claim time in claimed_at; SKIP LOCKED so concurrent runs take different
+rows), sends them on the shared sender pool (utils/messaging.send_batch)
+outside any transaction, then records every outcome in one executemany
+UPDATE:
+
+- sent: provider message id and sent_at.
+- retry: back to 'queued' with next_attempt_at pushed out exponentially.
+- dead: the provider rejected the message, or MESSAGING_MAX_ATTEMPTS was
+  reached. Dead rows are kept for inspection (`flask messages-requeue-dead`).
+
+A claim older than MESSAGING_CLAIM_TIMEOUT_SECONDS (the process died
+mid-batch) is taken again.
+"""
+import statistics
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import and_, or_, select, update
+
+from models import db
+from models.outbound_message import OutboundMessage
+from utils.messaging import (
+    FakeMessagingProvider, TokenBucket, get_messaging_provider, get_rate_limiter, get_sender_pool,
+    next_attempt_time, send_batch,
+)
+
+
+def _claim_batch(batch_size, now):
+    """Mark up to batch_size due messages as 'sending' and return them."""
+    stale_claim = now - timedelta(seconds=current_app.config['MESSAGING_CLAIM_TIMEOUT_SECONDS'])
+    claimable = or_(
+        and_(OutboundMessage.status == 'queued', OutboundMessage.next_attempt_at <= now),
+        and_(OutboundMessage.status == 'sending', OutboundMessage.claimed_at < stale_claim),
+    )
+    try:
+        rows = db.session.execute(
+            select(OutboundMessage.id, OutboundMessage.channel, OutboundMessage.provider,
+                   OutboundMessage.to_number, OutboundMessage.body, OutboundMessage.attempts)
+            .where(claimable)
+            .order_by(OutboundMessage.next_attempt_at)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        ).all()
+        if rows:
+            db.session.execute(
+                update(OutboundMessage)
+                .where(OutboundMessage.id.in_([row.id for row in rows]))
+                .values(status='sending', claimed_at=now, attempts=OutboundMessage.attempts + 1)
+                .execution_options(synchronize_session=False)
+            )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return rows
+
+
+def dispatch_outbound_messages(batch_size=None):
+    """
+    Send one batch of due outbound messages.
+    Args:
+        batch_size (int, optional): Defaults to MESSAGING_BATCH_SIZE.
+    Returns:
+        dict: Count of messages per outcome ('sent', 'retry', 'dead').
+    """
+    batch_size = batch_size or current_app.config['MESSAGING_BATCH_SIZE']
+    max_attempts = current_app.config['MESSAGING_MAX_ATTEMPTS']
+    rows = _claim_batch(batch_size, datetime.utcnow())
+    if not rows:
+        return {'sent': 0, 'retry': 0, 'dead': 0}
+
+    by_provider = defaultdict(list)
+    for row in rows:
+        by_provider[row.provider].append(row)
+
+    results = {}
+    for provider_name, provider_rows in by_provider.items():
+        try:
+            provider = get_messaging_provider(provider_name)
+        except Exception as e:  # Misconfigured provider: count as a failed attempt for each row
+            current_app.logger.error(f"Messaging provider '{provider_name}' unavailable: {e}")
+            results.update({row.id: ('retry', str(e)) for row in provider_rows})
+            continue
+        results.update(send_batch(
+            [(row.id, row.channel, row.to_number, row.body) for row in provider_rows],
+            provider, get_rate_limiter(provider_name), get_sender_pool(),
+        ))
+
+    # --- Record outcomes (one executemany UPDATE by primary key) ---
+    now = datetime.utcnow()
+    attempts = {row.id: row.attempts + 1 for row in rows}
+    changes = []
+    counts = Counter()
+    for message_id, (outcome, detail) in results.items():
+        if outcome == 'retry' and attempts[message_id] >= max_attempts:
+            outcome = 'dead'
+        counts[outcome] += 1
+        if outcome == 'sent':
+            changes.append({'id': message_id, 'status': 'sent', 'provider_message_id': detail, 'sent_at': now,
+                            'claimed_at': None, 'last_error': None})
+        elif outcome == 'retry':
+            changes.append({'id': message_id, 'status': 'queued', 'claimed_at': None, 'last_error': detail[:255],
+                            'next_attempt_at': next_attempt_time(attempts[message_id], now)})
+        else:
+            changes.append({'id': message_id, 'status': 'dead', 'claimed_at': None, 'last_error': detail[:255]})
+    try:
+        for status in ('sent', 'queued', 'dead'):  # Rows of an executemany must share their columns
+            group = [change for change in changes if change['status'] == status]
+            if group:
+                db.session.execute(update(OutboundMessage), group)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error recording outbound message results: {e}")
+        raise
+    # --- End Record ---
+
+    counts = {outcome: counts.get(outcome, 0) for outcome in ('sent', 'retry', 'dead')}
+    current_app.logger.info(f"Dispatched outbound messages: {counts}")
+    return counts
+
+
+def requeue_dead_messages(since=None):
+    """
+    Give dead-lettered messages a fresh set of attempts.
+    Args:
+        since (datetime, optional): Only messages created at or after this time.
+    Returns:
+        int: Messages requeued.
+    """
+    query = update(OutboundMessage).where(OutboundMessage.status == 'dead')
+    if since is not None:
+        query = query.where(OutboundMessage.created_at >= since)
+    try:
+        requeued = db.session.execute(
+            query.values(status='queued', attempts=0, next_attempt_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return requeued
+
+
+def run_messaging_benchmark(count, threads, rate, burst=None, latency_ms=0, failure_rate=0.0):
+    """
+    Push `count` synthetic messages through send_batch with a fake provider,
+    the given thread count and token bucket. No database access.
+    Returns:
+        dict: Elapsed time, achieved throughput, the expected ceiling
+              (min of the rate limit and threads / latency) and outcome counts.
+    """
+    provider = FakeMessagingProvider(latency_ms=latency_ms, failure_rate=failure_rate)
+    limiter = TokenBucket(rate, burst or rate)
+    messages = [(i, 'whatsapp', f"+9100000{i:05d}", f"Benchmark message {i}") for i in range(count)]
+
+    latencies = []
+    timed_send = provider.send
+
+    def send_and_time(channel, to_number, body):
+        started = time.perf_counter()
+        try:
+            return timed_send(channel, to_number, body)
+        finally:
+            latencies.append((time.perf_counter() - started) * 1000)  # list.append is thread-safe
+
+    provider.send = send_and_time
+    with ThreadPoolExecutor(max_workers=threads, thread_name_prefix='messaging-benchmark') as executor:
+        started = time.perf_counter()
+        results = send_batch(messages, provider, limiter, executor)
+        elapsed = time.perf_counter() - started
+
+    ceiling = rate if not latency_ms else min(rate, threads * 1000.0 / latency_ms)
+    outcomes = Counter(result.outcome for result in results.values())
+    return {
+        'messages': count,
+        'elapsed_seconds': round(elapsed, 3),
+        'throughput_per_second': round(count / elapsed, 1) if elapsed else None,
+        'expected_ceiling_per_second': round(ceiling, 1),
+        'send_latency_p50_ms': round(statistics.median(latencies), 1) if latencies else None,
+        'sent': outcomes.get('sent', 0),
+        'retry': outcomes.get('retry', 0),
+        'dead': outcomes.get('dead', 0),
+    }
@@ -0,0 +1,76 @@
+# tasks/notification_counters.py
+"""
+Reconciliation of the unread notification counters.
+
+Walks users in id windows. For each window, the counter rows are locked first
+(FOR UPDATE), then the true unread counts are taken from the
+(user_id, is_read, timestamp) index and every counter that differs is
+rewritten. A writer that wants to bump a locked counter waits for the
+window's commit. Its notification is not committed yet, so it is not
+counted, and its own increment lands on the repaired value.
+"""
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import func, insert, select, update
+
+from models import db
+from models.notification import Notification, NotificationCounter
+from models.user import User
+from utils.cache import cache, UNREAD_NOTIFICATIONS_NAMESPACE
+
+
+def reconcile_unread_counters(window_size=None):
+    """
+    Repair drift between notification_counters and the notifications table.
+    Args:
+        window_size (int, optional): User ids per transaction. Defaults to UNREAD_RECONCILE_WINDOW_SIZE.
+    Returns:
+        int: Number of counters corrected (including rows created).
+    """
+    window_size = window_size or current_app.config['UNREAD_RECONCILE_WINDOW_SIZE']
+    max_user_id = db.session.execute(select(func.max(User.id))).scalar() or 0
+    db.session.rollback()
+    corrected = 0
+    lower = 0
+    while lower < max_user_id:
+        upper = lower + window_size
+        now = datetime.utcnow()
+        try:
+            stored = dict(db.session.execute(
+                select(NotificationCounter.user_id, NotificationCounter.unread_count)
+                .where(NotificationCounter.user_id > lower, NotificationCounter.user_id <= upper)
+                .with_for_update()
+            ).all())
+            actual = dict(db.session.execute(
+                select(Notification.user_id, func.count())
+                .where(Notification.user_id > lower, Notification.user_id <= upper, Notification.is_read == False)
+                .group_by(Notification.user_id)
+            ).all())
+
+            drifted = [user_id for user_id in set(stored) | set(actual)
+                       if stored.get(user_id, 0) != actual.get(user_id, 0)]
+            for user_id in drifted:
+                if user_id not in stored:
+                    db.session.execute(insert(NotificationCounter).values(
+                        user_id=user_id, unread_count=actual[user_id], reconciled_at=now))
+                else:
+                    db.session.execute(
+                        update(NotificationCounter)
+                        .where(NotificationCounter.user_id == user_id)
+                        .values(unread_count=actual.get(user_id, 0), reconciled_at=now)
+                        .execution_options(synchronize_session=False)
+                    )
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Error reconciling unread counters for users {lower + 1}..{upper}: {e}")
+            raise
+        for user_id in drifted:
+            cache.invalidate(UNREAD_NOTIFICATIONS_NAMESPACE, user_id)
+        if drifted:
+            current_app.logger.warning(f"Unread counters corrected for users {sorted(drifted)[:20]}"
+                                       f"{'...' if len(drifted) > 20 else ''}")
+        corrected += len(drifted)
+        lower = upper
+    return corrected
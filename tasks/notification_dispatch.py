@@ -0,0 +1,76 @@
+# tasks/notification_dispatch.py
+"""
+Hand-off of committed notifications to external channels.
+
+Rows are written by the outbox (utils/notification_outbox.py) with
+dispatch_status='pending'. Each run takes a batch (SKIP LOCKED so concurrent
+runs take different rows) and, in one short transaction, enqueues a WhatsApp
+message for every recipient with a phone number (models/outbound_message.py)
+and marks the notifications 'queued', or 'skipped' when there is no external
+channel. Nothing is sent here: the messaging dispatcher (tasks/messaging.py)
+sends, rate-limits, retries and dead-letters the queued messages.
+"""
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import insert, select, update
+
+from models import db
+from models.notification import Notification
+from models.outbound_message import OutboundMessage
+from models.user import User
+
+
+def dispatch_pending_notifications(batch_size=None):
+    """
+    Hand one batch of pending notifications to the outbound message queue.
+    Args:
+        batch_size (int, optional): Defaults to NOTIFICATION_DISPATCH_BATCH_SIZE.
+    Returns:
+        dict: Count of notifications per outcome ('queued', 'skipped').
+    """
+    batch_size = batch_size or current_app.config['NOTIFICATION_DISPATCH_BATCH_SIZE']
+    whatsapp_enabled = current_app.config['NOTIFICATION_WHATSAPP_ENABLED']
+    provider = current_app.config['MESSAGING_PROVIDER']
+    now = datetime.utcnow()
+    try:
+        rows = db.session.execute(
+            select(Notification.id, Notification.message, User.phone)
+            .join(User, User.id == Notification.user_id)
+            .where(Notification.dispatch_status == 'pending')
+            .order_by(Notification.id)
+            .limit(batch_size)
+            .with_for_update(of=Notification, skip_locked=True)
+        ).all()
+        queued = [row for row in rows if whatsapp_enabled and row.phone]
+        skipped = [row.id for row in rows if not (whatsapp_enabled and row.phone)]
+        if queued:
+            db.session.execute(insert(OutboundMessage), [{
+                'channel': 'whatsapp',
+                'provider': provider,
+                'to_number': row.phone,
+                'body': row.message,
+                'notification_id': row.id,
+                'status': 'queued',
+                'attempts': 0,
+                'next_attempt_at': now,
+                'created_at': now,
+            } for row in queued])
+        for status, ids in (('queued', [row.id for row in queued]), ('skipped', skipped)):
+            if ids:
+                db.session.execute(
+                    update(Notification)
+                    .where(Notification.id.in_(ids))
+                    .values(dispatch_status=status, dispatched_at=now)
+                    .execution_options(synchronize_session=False)
+                )
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error handing notifications to the message queue: {e}")
+        raise
+
+    counts = {'queued': len(queued), 'skipped': len(skipped)}
+    if rows:
+        current_app.logger.info(f"Dispatched notifications: {counts}")
+    return counts
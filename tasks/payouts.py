@@ -0,0 +1,283 @@
+# tasks/payouts.py
+"""
+Batched host payouts.
+
+build_payout_batches() turns queued PayoutRequests into one PayoutBatch per
+bank (IFSC prefix): it locks the requests and the host rows, debits every host
+wallet with a single UPDATE, writes the wallet and ledger rows in bulk and
+produces a bank upload file per batch. settle_payout_batch() records the bank's
+outcome, marking requests paid or failed and refunding failed ones.
+"""
+import csv
+import os
+from collections import defaultdict
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import insert, select, update
+
+from models import db
+from models.host import Host
+from models.host_bank_account import HostBankAccount
+from models.payout import PayoutBatch, PayoutRequest
+from models.wallet_transaction import WalletTransaction
+from utils.ledger_service import record_host_payouts
+from utils.notification_outbox import queue_notification
+from utils.wallet_service import apply_balance_deltas
+
+PAYOUT_FILE_FIELDS = ['batch_id', 'request_id', 'beneficiary_name', 'account_number', 'ifsc', 'amount', 'narration']
+
+
+def _bank_code(ifsc_code):
+    """First four IFSC characters identify the bank (e.g. 'HDFC0001234' -> 'HDFC')."""
+    return (ifsc_code or '').strip().upper()[:4] or 'UNKN'
+
+
+def _write_payout_file(batch, rows):
+    """Write the bank bulk-upload CSV for a batch; returns the file path."""
+    payout_dir = current_app.config['PAYOUT_FILE_DIR']
+    os.makedirs(payout_dir, exist_ok=True)
+    path = os.path.join(payout_dir, f"payout_batch_{batch.id}_{batch.bank_code}_{batch.created_at:%Y%m%d}.csv")
+    with open(path, 'w', newline='', encoding='utf-8') as payout_file:
+        writer = csv.writer(payout_file)
+        writer.writerow(PAYOUT_FILE_FIELDS)
+        for row in rows:
+            writer.writerow([
+                batch.id, row.id, row.account_holder_name, row.account_number,
+                row.ifsc_code.strip().upper(), f"{row.amount:.2f}", f"Payout {row.id}",
+            ])
+    return path
+
+
+def _wallet_rows(rows, host_users, start_balances, transaction_type, description, now, sign):
+    """Bulk WalletTransaction values with a running balance_after per host (rows in request order)."""
+    balances = dict(start_balances)
+    values = []
+    for row in rows:
+        balances[row.host_id] = round(balances[row.host_id] + sign * row.amount, 2)
+        values.append({
+            'user_id': host_users[row.host_id],
+            'transaction_type': transaction_type,
+            'amount': round(row.amount, 2),
+            'balance_after': balances[row.host_id],
+            'description': description(row)[:255],
+            # Host-wallet rows: kept out of the user wallet chain by the reconciliation job
+            'reference_id': row.id,
+            'reference_type': 'host_withdrawal',
+            'timestamp': now,
+        })
+    return values
+
+
+def build_payout_batches(max_requests=None):
+    """
+    Batch queued payout requests per bank and debit the host wallets.
+
+    Requests are taken oldest first; when a host's balance no longer covers a
+    request it is failed (the host is notified) instead of overdrawing the wallet.
+
+    Returns:
+        list[int]: IDs of the batches created.
+    """
+    max_requests = max_requests or current_app.config['PAYOUT_BATCH_MAX_REQUESTS']
+    now = datetime.utcnow()
+
+    try:
+        # --- Lock the queued requests (concurrent runs skip each other's rows) ---
+        rows = db.session.execute(
+            select(
+                PayoutRequest.id, PayoutRequest.host_id, PayoutRequest.amount,
+                HostBankAccount.ifsc_code, HostBankAccount.account_number, HostBankAccount.account_holder_name,
+            )
+            .join(HostBankAccount, PayoutRequest.bank_account_id == HostBankAccount.id)
+            .where(PayoutRequest.status == 'queued')
+            .order_by(PayoutRequest.requested_at, PayoutRequest.id)
+            .limit(max_requests)
+            .with_for_update(of=PayoutRequest, skip_locked=True)
+        ).all()
+        if not rows:
+            db.session.rollback()
+            return []
+
+        # --- Lock the host wallets and decide which requests they cover ---
+        hosts = db.session.execute(
+            select(Host.id, Host.user_id, Host.wallet_balance)
+            .where(Host.id.in_({row.host_id for row in rows}))
+            .with_for_update()
+        ).all()
+        start_balances = {host.id: host.wallet_balance or 0.0 for host in hosts}
+        host_users = {host.id: host.user_id for host in hosts}
+
+        remaining = dict(start_balances)
+        approved, rejected, orphaned = [], [], []
+        for row in rows:
+            if row.host_id not in remaining:
+                orphaned.append(row)  # Host deleted (SQLite does not enforce the foreign key)
+            elif row.amount <= remaining[row.host_id] + 0.005:
+                remaining[row.host_id] -= row.amount
+                approved.append(row)
+            else:
+                rejected.append(row)
+        # --- End Lock ---
+
+        # --- One UPDATE debits every host in the run ---
+        debits = defaultdict(float)
+        for row in approved:
+            debits[row.host_id] += row.amount
+        apply_balance_deltas(Host, {host_id: -amount for host_id, amount in debits.items()})
+
+        if approved:
+            db.session.execute(insert(WalletTransaction), _wallet_rows(
+                approved, host_users, start_balances, 'withdrawal',
+                lambda row: f"Payout to {row.account_holder_name} ({_bank_code(row.ifsc_code)}) - request #{row.id}",
+                now, -1
+            ))
+        # --- End Debit ---
+
+        # --- One batch per bank ---
+        by_bank = defaultdict(list)
+        for row in approved:
+            by_bank[_bank_code(row.ifsc_code)].append(row)
+
+        batch_ids = []
+        for bank_code, bank_rows in sorted(by_bank.items()):
+            batch = PayoutBatch(
+                bank_code=bank_code,
+                status='created',
+                request_count=len(bank_rows),
+                total_amount=round(sum(row.amount for row in bank_rows), 2),
+                created_at=now
+            )
+            db.session.add(batch)
+            db.session.flush()  # Batch id for the requests, ledger and file name
+
+            db.session.execute(
+                update(PayoutRequest)
+                .where(PayoutRequest.id.in_([row.id for row in bank_rows]))
+                .values(status='batched', batch_id=batch.id, processed_at=now)
+                .execution_options(synchronize_session=False)
+            )
+            host_amounts = defaultdict(float)
+            for row in bank_rows:
+                host_amounts[row.host_id] += row.amount
+            record_host_payouts('host_payout', f"Payout batch #{batch.id} ({bank_code})", host_amounts, batch.id)
+            batch.file_path = _write_payout_file(batch, bank_rows)
+            batch_ids.append(batch.id)
+        # --- End Batches ---
+
+        # --- Requests the wallet could not cover ---
+        if rejected:
+            db.session.execute(
+                update(PayoutRequest)
+                .where(PayoutRequest.id.in_([row.id for row in rejected]))
+                .values(status='failed', failure_reason='Insufficient wallet balance at payout time', processed_at=now)
+                .execution_options(synchronize_session=False)
+            )
+        if orphaned:
+            # Failed rather than left queued: oldest first, they would block every later run
+            db.session.execute(
+                update(PayoutRequest)
+                .where(PayoutRequest.id.in_([row.id for row in orphaned]))
+                .values(status='failed', failure_reason='Host not found', processed_at=now)
+                .execution_options(synchronize_session=False)
+            )
+
+        # Outbox: one bulk INSERT at commit, unread counters updated with it
+        for row in approved:
+            queue_notification(host_users[row.host_id],
+                               f"Your withdrawal of ₹{row.amount:.2f} (request #{row.id}) has been sent to your bank.")
+        for row in rejected:
+            queue_notification(host_users[row.host_id],
+                               f"Your withdrawal of ₹{row.amount:.2f} (request #{row.id}) failed: insufficient wallet balance.")
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error building payout batches: {e}")
+        raise
+
+    current_app.logger.info(
+        f"Payout run: {len(approved)} requests in {len(batch_ids)} batches, {len(rejected)} failed for insufficient balance"
+        f", {len(orphaned)} failed for a missing host."
+    )
+    return batch_ids
+
+
+def settle_payout_batch(batch_id, failed_request_ids=(), reason=None):
+    """
+    Record the bank's settlement of a batch.
+    Requests listed in `failed_request_ids` are failed and their amounts credited back
+    to the host wallets; every other batched request is marked paid.
+
+    Returns:
+        PayoutBatch: The updated batch.
+    Raises:
+        ValueError: Unknown batch, or batch already settled.
+    """
+    now = datetime.utcnow()
+    failed_request_ids = set(failed_request_ids)
+    reason = (reason or 'Rejected by bank')[:255]
+
+    try:
+        batch = db.session.execute(
+            select(PayoutBatch).where(PayoutBatch.id == batch_id).with_for_update()
+        ).scalar_one_or_none()
+        if batch is None:
+            raise ValueError(f"Payout batch {batch_id} does not exist.")
+        if batch.status != 'created':
+            raise ValueError(f"Payout batch {batch_id} is already {batch.status}.")
+
+        rows = db.session.execute(
+            select(PayoutRequest.id, PayoutRequest.host_id, PayoutRequest.amount)
+            .where(PayoutRequest.batch_id == batch_id, PayoutRequest.status == 'batched')
+            .order_by(PayoutRequest.id)
+        ).all()
+        failed = [row for row in rows if row.id in failed_request_ids]
+        paid_ids = [row.id for row in rows if row.id not in failed_request_ids]
+
+        if paid_ids:
+            db.session.execute(
+                update(PayoutRequest).where(PayoutRequest.id.in_(paid_ids))
+                .values(status='paid', settled_at=now)
+                .execution_options(synchronize_session=False)
+            )
+
+        if failed:
+            # --- Refund failed payouts: one UPDATE, bulk wallet rows, one reversing ledger entry ---
+            refunds = defaultdict(float)
+            for row in failed:
+                refunds[row.host_id] += row.amount
+            hosts = db.session.execute(
+                select(Host.id, Host.user_id, Host.wallet_balance)
+                .where(Host.id.in_(list(refunds)))
+                .with_for_update()
+            ).all()
+            host_users = {host.id: host.user_id for host in hosts}
+            start_balances = {host.id: host.wallet_balance or 0.0 for host in hosts}
+
+            apply_balance_deltas(Host, dict(refunds))
+            db.session.execute(insert(WalletTransaction), _wallet_rows(
+                failed, host_users, start_balances, 'refund',
+                lambda row: f"Payout request #{row.id} returned: {reason}", now, 1
+            ))
+            record_host_payouts('host_payout_reversal', f"Failed payouts in batch #{batch.id}",
+                                {host_id: -amount for host_id, amount in refunds.items()}, batch.id)
+            db.session.execute(
+                update(PayoutRequest).where(PayoutRequest.id.in_([row.id for row in failed]))
+                .values(status='failed', failure_reason=reason, settled_at=now)
+                .execution_options(synchronize_session=False)
+            )
+            for row in failed:
+                queue_notification(host_users[row.host_id],
+                                   f"Your withdrawal of ₹{row.amount:.2f} (request #{row.id}) was returned and credited back to your wallet.")
+            # --- End Refund ---
+
+        batch.settled_amount = round(sum(row.amount for row in rows if row.id not in failed_request_ids), 2)
+        batch.status = 'partially_settled' if failed else 'settled'
+        batch.settled_at = now
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error settling payout batch {batch_id}: {e}")
+        raise
+
+    return batch
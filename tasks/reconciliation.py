@@ -0,0 +1,339 @@
+# tasks/reconciliation.py
+"""
+Batch reconciliation of payments and wallets.
+
+Three passes, each a single merge over sorted streams, so memory stays bounded
+by the chunk size no matter how many rows the tables hold:
+
+1. Payments: bookings (initial + extension payments) ordered by payment id,
+   merge-joined with the gateway's payments (a CSV export or the fake gateway)
+   ordered the same way.
+2. User wallets: wallet_transactions ordered by (user_id, id) checked for a
+   consistent balance_after chain, merge-joined with users ordered by id.
+3. Host wallets: per-host earnings aggregated from bookings, merge-joined with
+   hosts ordered by id.
+
+Every mismatch becomes one row of a CSV report.
+"""
+import csv
+import heapq
+import itertools
+import os
+import tempfile
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import case, func, literal, or_, select
+
+from models import db
+from models.booking import Booking
+from models.car import Car
+from models.host import Host
+from models.payment_event import PaymentEvent
+from models.user import User
+from models.wallet_transaction import WalletTransaction
+from utils.streaming import stream_rows
+
+# --- Report Columns ---
+REPORT_FIELDS = ['check', 'issue', 'reference', 'expected', 'actual', 'detail']
+# --- End Report Columns ---
+
+CREDIT_TYPES = ('deposit', 'earning', 'refund', 'bonus')
+DEBIT_TYPES = ('withdrawal', 'deduction', 'penalty')
+
+
+# --- Streaming Helpers ---
+def _byte_order(column):
+    """
+    Order string ids by raw bytes so the database and Python agree on ordering
+    (Razorpay ids are mixed case; MySQL's default collation is case-insensitive).
+    """
+    dialect = db.engine.dialect.name
+    if dialect == 'mysql':
+        return column.collate('utf8mb4_bin')
+    if dialect == 'postgresql':
+        return column.collate('C')
+    return column  # SQLite compares TEXT with BINARY by default
+
+
+def _check_sorted(rows, key, label):
+    """Pass rows through, failing loudly if a stream is not ascending (a merge would silently mis-join)."""
+    previous = None
+    for row in rows:
+        current = key(row)
+        if previous is not None and current < previous:
+            raise ValueError(f"{label} is not sorted: {current!r} after {previous!r}")
+        previous = current
+        yield row
+# --- End Streaming Helpers ---
+
+
+# --- Gateway Side ---
+def _normalize_payment(payment):
+    return {
+        'id': payment['id'],
+        'order_id': payment.get('order_id') or '',
+        'amount': int(float(payment.get('amount') or 0)),  # Paise, as in the Payments API
+        'status': (payment.get('status') or '').lower(),
+    }
+
+
+def _sorted_export_payments(path, chunk_size):
+    """
+    Yield the export's payments ordered by id with an external merge sort:
+    sorted runs of `chunk_size` rows are spilled to temp files and merged lazily.
+    """
+    run_files = []
+    try:
+        with open(path, newline='', encoding='utf-8') as export:
+            reader = csv.DictReader(export)
+            while True:
+                chunk = [_normalize_payment(row) for row in itertools.islice(reader, chunk_size)]
+                if not chunk:
+                    break
+                chunk.sort(key=lambda p: p['id'])
+                run = tempfile.TemporaryFile(mode='w+', newline='', encoding='utf-8')
+                writer = csv.DictWriter(run, fieldnames=['id', 'order_id', 'amount', 'status'])
+                writer.writerows(chunk)
+                run.seek(0)
+                run_files.append(run)
+
+        runs = [
+            (_normalize_payment(row) for row in csv.DictReader(run, fieldnames=['id', 'order_id', 'amount', 'status']))
+            for run in run_files
+        ]
+        yield from heapq.merge(*runs, key=lambda p: p['id'])
+    finally:
+        for run in run_files:
+            run.close()
+
+
+def _gateway_payments(export_path, gateway, chunk_size):
+    """Payments from a CSV export (id, order_id, amount in paise, status) or the gateway itself."""
+    if export_path:
+        return _sorted_export_payments(export_path, chunk_size)
+    if gateway is not None and hasattr(gateway, 'iter_payments'):
+        return (_normalize_payment(p) for p in gateway.iter_payments())
+    raise ValueError("No payment source: pass a payments export file or use the fake gateway.")
+# --- End Gateway Side ---
+
+
+# --- Database Side ---
+def _booking_payments(chunk_size):
+    """
+    Initial and extension payments recorded on bookings, merged into one stream ordered by payment id.
+    Amounts come from the payment_events ledger (what was actually charged). Without a ledger row, the
+    initial payment is total_price less a paid extension, which mark_extension_paid() adds to it.
+    """
+    initial_price = case(
+        (Booking.extension_payment_status == 'completed',
+         Booking.total_price - func.coalesce(Booking.extension_additional_price, 0)),
+        else_=Booking.total_price,
+    )
+    initial = (
+        select(
+            Booking.razorpay_payment_id.label('payment_id'),
+            Booking.razorpay_order_id.label('order_id'),
+            Booking.id.label('booking_id'),
+            func.coalesce(PaymentEvent.amount, initial_price).label('amount'),
+            Booking.payment_status.label('payment_status'),
+            literal('booking_payment').label('kind'),
+        )
+        .outerjoin(PaymentEvent, PaymentEvent.razorpay_payment_id == Booking.razorpay_payment_id)
+        .where(Booking.razorpay_payment_id.isnot(None))
+        .order_by(_byte_order(Booking.razorpay_payment_id))
+    )
+    extension = (
+        select(
+            Booking.extension_razorpay_payment_id.label('payment_id'),
+            Booking.extension_razorpay_order_id.label('order_id'),
+            Booking.id.label('booking_id'),
+            func.coalesce(PaymentEvent.amount, Booking.extension_additional_price).label('amount'),
+            Booking.extension_payment_status.label('payment_status'),
+            literal('extension_payment').label('kind'),
+        )
+        .outerjoin(PaymentEvent, PaymentEvent.razorpay_payment_id == Booking.extension_razorpay_payment_id)
+        .where(Booking.extension_razorpay_payment_id.isnot(None))
+        .order_by(_byte_order(Booking.extension_razorpay_payment_id))
+    )
+    return heapq.merge(
+        stream_rows(initial, chunk_size),
+        stream_rows(extension, chunk_size),
+        key=lambda row: row.payment_id
+    )
+# --- End Database Side ---
+
+
+# --- Passes ---
+def _reconcile_payments(report, db_rows, gateway_rows, tolerance):
+    """Merge-join booking payments with gateway payments on payment id."""
+    db_rows = _check_sorted(db_rows, lambda r: r.payment_id, 'Booking payment stream')
+    gateway_rows = _check_sorted(gateway_rows, lambda p: p['id'], 'Gateway payment stream')
+    db_row = next(db_rows, None)
+    payment = next(gateway_rows, None)
+    checked = 0
+
+    while db_row is not None or payment is not None:
+        if payment is None or (db_row is not None and db_row.payment_id < payment['id']):
+            report('payments', 'missing_in_gateway', db_row.payment_id, db_row.payment_status, None,
+                   f"{db_row.kind} on booking #{db_row.booking_id}")
+            db_row = next(db_rows, None)
+        elif db_row is None or payment['id'] < db_row.payment_id:
+            if payment['status'] == 'captured':
+                report('payments', 'missing_in_db', payment['id'], None, payment['amount'],
+                       f"Captured payment for order {payment['order_id']} has no booking")
+            payment = next(gateway_rows, None)
+        else:
+            reference = f"{payment['id']} (booking #{db_row.booking_id}, {db_row.kind})"
+            if db_row.order_id != payment['order_id']:
+                report('payments', 'order_mismatch', reference, db_row.order_id, payment['order_id'], '')
+            captured = payment['status'] == 'captured'
+            if captured and db_row.payment_status != 'completed':
+                report('payments', 'status_mismatch', reference, 'completed', db_row.payment_status,
+                       'Gateway captured the payment but the booking is not marked paid')
+            elif not captured and db_row.payment_status == 'completed':
+                report('payments', 'status_mismatch', reference, payment['status'], db_row.payment_status,
+                       'Booking marked paid but the gateway did not capture the payment')
+            expected_paise = int(round((db_row.amount or 0) * 100))
+            if captured and abs(expected_paise - payment['amount']) > tolerance * 100:
+                report('payments', 'amount_mismatch', reference, expected_paise, payment['amount'], 'Amounts in paise')
+            checked += 1
+            db_row = next(db_rows, None)
+            payment = next(gateway_rows, None)
+    return checked
+
+
+def _reconcile_user_wallets(report, chunk_size, tolerance):
+    """Check every user's balance_after chain and compare the last entry with users.wallet_balance."""
+    transactions = stream_rows(
+        select(
+            WalletTransaction.user_id, WalletTransaction.id, WalletTransaction.transaction_type,
+            WalletTransaction.amount, WalletTransaction.balance_after,
+        )
+        # Host wallet withdrawals carry the host balance, not the user's: keep them out of the user chain
+        .where(or_(WalletTransaction.reference_type.is_(None), WalletTransaction.reference_type != 'host_withdrawal'))
+        .order_by(WalletTransaction.user_id, WalletTransaction.id),
+        chunk_size
+    )
+    users = stream_rows(select(User.id, User.wallet_balance).order_by(User.id), chunk_size)
+
+    grouped = itertools.groupby(transactions, key=lambda t: t.user_id)
+    group = next(grouped, None)
+    user = next(users, None)
+    checked = 0
+
+    while group is not None:
+        user_id, user_transactions = group
+        while user is not None and user.id < user_id:
+            user = next(users, None)
+
+        last_balance = None
+        for txn in user_transactions:
+            if txn.transaction_type not in CREDIT_TYPES + DEBIT_TYPES:
+                report('user_wallets', 'unknown_transaction_type', f"transaction #{txn.id}", None,
+                       txn.transaction_type, f"User #{user_id}")
+            elif last_balance is not None:
+                signed = txn.amount if txn.transaction_type in CREDIT_TYPES else -txn.amount
+                if abs(last_balance + signed - txn.balance_after) > tolerance:
+                    report('user_wallets', 'ledger_chain_break', f"transaction #{txn.id}",
+                           round(last_balance + signed, 2), txn.balance_after, f"User #{user_id}")
+            last_balance = txn.balance_after
+
+        if user is None or user.id != user_id:
+            report('user_wallets', 'orphan_transactions', f"user #{user_id}", None, last_balance,
+                   'Wallet transactions reference a missing user')
+        elif abs((user.wallet_balance or 0) - last_balance) > tolerance:
+            report('user_wallets', 'wallet_balance_mismatch', f"user #{user_id}", last_balance,
+                   user.wallet_balance, 'Last ledger balance_after vs users.wallet_balance')
+        checked += 1
+        group = next(grouped, None)
+    return checked
+
+
+def _reconcile_host_wallets(report, chunk_size, tolerance):
+    """
+    Compare each host's wallet_balance with what its bookings can explain:
+    90% of completed trips (total_price includes paid extensions) plus the 50% kept on user cancellations
+    of paid bookings. Withdrawals only lower the balance, so anything above that is unexplained.
+    """
+    earnings = stream_rows(
+        select(
+            Car.host_id,
+            func.sum(case(
+                (Booking.status == 'completed', Booking.total_price * 0.9),
+                else_=0
+            )).label('trip_earnings'),
+            func.sum(case(
+                ((Booking.status == 'cancelled') & (Booking.cancelled_by == 'user')
+                 & (Booking.payment_status == 'completed'), Booking.total_price * 0.5),
+                else_=0
+            )).label('cancellation_earnings'),
+        )
+        .join(Car, Booking.car_id == Car.id)
+        .group_by(Car.host_id)
+        .order_by(Car.host_id),
+        chunk_size
+    )
+    hosts = stream_rows(select(Host.id, Host.wallet_balance).order_by(Host.id), chunk_size)
+
+    earning = next(earnings, None)
+    checked = 0
+    for host in hosts:
+        while earning is not None and earning.host_id < host.id:
+            earning = next(earnings, None)
+        explained = 0.0
+        if earning is not None and earning.host_id == host.id:
+            explained = float(earning.trip_earnings or 0) + float(earning.cancellation_earnings or 0)
+        balance = host.wallet_balance or 0.0
+        if balance < -tolerance:
+            report('host_wallets', 'negative_balance', f"host #{host.id}", 0, balance, '')
+        elif balance - explained > tolerance:
+            report('host_wallets', 'unexplained_balance', f"host #{host.id}", round(explained, 2), balance,
+                   'Wallet holds more than completed/cancelled bookings account for')
+        checked += 1
+    return checked
+# --- End Passes ---
+
+
+def reconcile_payments(export_path=None, gateway=None, report_path=None, chunk_size=None):
+    """
+    Run all reconciliation passes and write a CSV mismatch report.
+
+    Args:
+        export_path (str, optional): Payments export CSV with id, order_id, amount (paise), status.
+            Does not need to be sorted.
+        gateway (optional): Gateway exposing iter_payments() (the fake gateway, in-process only), used when
+            no export is given.
+        report_path (str, optional): Report file. Defaults to RECONCILIATION_REPORT_DIR/reconciliation_<timestamp>.csv.
+        chunk_size (int, optional): Rows per fetch / sort run. Defaults to RECONCILIATION_CHUNK_SIZE.
+    Returns:
+        dict: Rows checked per pass, mismatch counts per issue and the report path.
+    """
+    chunk_size = chunk_size or current_app.config['RECONCILIATION_CHUNK_SIZE']
+    tolerance = current_app.config['RECONCILIATION_AMOUNT_TOLERANCE']
+    if not report_path:
+        report_dir = current_app.config['RECONCILIATION_REPORT_DIR']
+        os.makedirs(report_dir, exist_ok=True)
+        report_path = os.path.join(report_dir, f"reconciliation_{datetime.utcnow():%Y%m%d_%H%M%S}.csv")
+
+    issues = {}
+    with open(report_path, 'w', newline='', encoding='utf-8') as report_file:
+        writer = csv.writer(report_file)
+        writer.writerow(REPORT_FIELDS)
+
+        def report(check, issue, reference, expected, actual, detail):
+            writer.writerow([check, issue, reference, expected, actual, detail])
+            issues[issue] = issues.get(issue, 0) + 1
+
+        checked = {
+            'payments': _reconcile_payments(
+                report, _booking_payments(chunk_size), _gateway_payments(export_path, gateway, chunk_size), tolerance
+            ),
+            'user_wallets': _reconcile_user_wallets(report, chunk_size, tolerance),
+            'host_wallets': _reconcile_host_wallets(report, chunk_size, tolerance),
+        }
+
+    current_app.logger.info(
+        f"Reconciliation finished: checked {checked}, {sum(issues.values())} mismatches, report at {report_path}"
+    )
+    return {'checked': checked, 'issues': issues, 'report_path': report_path}
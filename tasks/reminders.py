@@ -0,0 +1,117 @@
+# tasks/reminders.py
+"""
+Reminder worker and backfill.
+
+Each run pops due reminders through the (status, due_at) index in batches,
+queues their notifications on the outbox and marks them sent in the same
+transaction, so a reminder is delivered exactly once however late or often
+the job runs. Cost per run is proportional to the reminders that are due,
+not to the number of active bookings.
+"""
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import select, update
+
+from models import db
+from models.booking import Booking
+from models.reminder import BookingReminder
+from utils.notification_outbox import queue_notification
+from utils.reminders import schedule_booking_reminders
+from utils.timezone import utc_to_ist
+
+
+def send_due_reminders(batch_size=None, now=None):
+    """
+    Deliver every reminder due by now.
+
+    Reminders more than REMINDER_MAX_LATENESS_MINUTES overdue (the worker was down)
+    are marked 'expired' instead of telling the user about a start that has passed.
+
+    Returns:
+        dict: 'sent' and 'expired' counts.
+    """
+    batch_size = batch_size or current_app.config['REMINDER_BATCH_SIZE']
+    now = now or datetime.utcnow()
+    too_late = now - timedelta(minutes=current_app.config['REMINDER_MAX_LATENESS_MINUTES'])
+    counts = {'sent': 0, 'expired': 0}
+
+    while True:
+        try:
+            rows = db.session.execute(
+                select(BookingReminder.id, BookingReminder.user_id, BookingReminder.message, BookingReminder.due_at)
+                .where(BookingReminder.status == 'scheduled', BookingReminder.due_at <= now)
+                .order_by(BookingReminder.due_at)
+                .limit(batch_size)
+                .with_for_update(skip_locked=True)
+            ).all()
+            if not rows:
+                db.session.rollback()  # Release the (empty) read transaction
+                break
+
+            sent_ids, expired_ids = [], []
+            for row in rows:
+                if row.due_at < too_late:
+                    expired_ids.append(row.id)
+                else:
+                    queue_notification(row.user_id, row.message)
+                    sent_ids.append(row.id)
+            for ids, status in ((sent_ids, 'sent'), (expired_ids, 'expired')):
+                if ids:
+                    db.session.execute(
+                        update(BookingReminder)
+                        .where(BookingReminder.id.in_(ids))
+                        .values(status=status, sent_at=now)
+                        .execution_options(synchronize_session=False)
+                    )
+            db.session.commit()  # Notifications and sent markers together
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Error sending due reminders: {e}")
+            raise
+        counts['sent'] += len(sent_ids)
+        counts['expired'] += len(expired_ids)
+        if len(rows) < batch_size:
+            break
+
+    if counts['sent'] or counts['expired']:
+        current_app.logger.info(f"Reminders: {counts}")
+    return counts
+
+
+def backfill_booking_reminders(chunk_size=None):
+    """
+    Schedule reminders for paid bookings that predate the reminder queue.
+    Idempotent (schedule_booking_reminders skips unchanged reminders).
+
+    Returns:
+        int: Number of bookings processed.
+    """
+    chunk_size = chunk_size or current_app.config['REMINDER_BATCH_SIZE']
+    now = datetime.utcnow()
+    now_ist = utc_to_ist(now).replace(tzinfo=None)  # Booking dates are stored as naive IST
+    last_id = 0
+    processed = 0
+    while True:
+        bookings = (
+            Booking.query
+            .filter(Booking.id > last_id,
+                    Booking.status.in_(['paid', 'approved', 'active', 'extended']),
+                    Booking.end_date > now_ist)
+            .order_by(Booking.id)
+            .limit(chunk_size)
+            .all()
+        )
+        if not bookings:
+            break
+        try:
+            for booking in bookings:
+                schedule_booking_reminders(booking, now=now)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        last_id = bookings[-1].id
+        processed += len(bookings)
+        db.session.expunge_all()  # Keep the identity map to one chunk
+    return processed
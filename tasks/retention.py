@@ -0,0 +1,244 @@
+# tasks/retention.py
+"""
+Retention: move old rows out of hot tables into archive tables (models/archive.py)
+and export archived rows to compressed files.
+
+Every policy in RETENTION_POLICIES archives in small chunks. Each chunk is
+one short transaction:
+    SELECT id ... FOR UPDATE SKIP LOCKED LIMIT chunk
+    INSERT INTO <archive> SELECT ... WHERE id IN (chunk)
+    DELETE FROM <table> WHERE id IN (chunk)
+Chunks walk the primary key upwards from the oldest rows and stop at the
+first row that is still too young (age_column is set at insert time, so it
+grows with the id). New rows are inserted at the other end of the key range,
+so archiving never waits on or blocks the request path. A short pause
+between chunks lets replication and concurrent writers keep up.
+
+export_archive() writes archive rows not yet exported to a gzip'd JSON Lines
+file and marks them exported (or purges them) in the same chunked way.
+"""
+import gzip
+import json
+import os
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import delete, func, insert, literal, select, update
+
+from models import db
+from models.archive import NotificationArchive, PhotoArchive, TripPhotoArchive
+from models.booking import Booking
+from models.notification import Notification
+from models.outbound_message import OutboundMessage
+from models.photo import Photo
+from models.trip_photo import TripPhoto
+from utils.upload_store import release_upload
+
+
+def _finished_booking_ids(cutoff):
+    return (
+        select(Booking.id)
+        .where(Booking.status.in_(('completed', 'cancelled')), Booking.end_date < cutoff)
+    )
+
+
+def _detach_outbound_messages(ids):
+    # Sent messages keep their history; they just stop pointing at the archived notification
+    db.session.execute(
+        update(OutboundMessage)
+        .where(OutboundMessage.notification_id.in_(ids))
+        .values(notification_id=None)
+        .execution_options(synchronize_session=False)
+    )
+
+
+# --- Policy Registry ---
+RetentionPolicy = namedtuple('RetentionPolicy', [
+    'name',            # CLI / log name
+    'model',           # Live table
+    'archive_model',   # Archive table with the same columns plus archived_at / exported_at
+    'age_column',      # Grows with the primary key; the walk stops at the first row younger than the cutoff
+    'days_key',        # Config key: rows older than this many days are eligible
+    'eligible',        # cutoff -> extra WHERE clause
+    'before_delete',   # ids -> None; clears references to the rows (optional)
+    'upload_column',   # Archive column holding an upload key, released when the row is purged (optional)
+])
+
+RETENTION_POLICIES = (
+    RetentionPolicy(
+        'notifications', Notification, NotificationArchive, Notification.timestamp, 'RETENTION_NOTIFICATION_DAYS',
+        # Unread rows stay (they back the unread counters); pending rows have not been handed off yet
+        lambda cutoff: (Notification.is_read == True) & (Notification.dispatch_status != 'pending'),
+        _detach_outbound_messages,
+        None,
+    ),
+    RetentionPolicy(
+        'photos', Photo, PhotoArchive, Photo.uploaded_at, 'RETENTION_PHOTO_DAYS',
+        lambda cutoff: Photo.booking_id.in_(_finished_booking_ids(cutoff)),
+        None,
+        'filename',
+    ),
+    RetentionPolicy(
+        'trip_photos', TripPhoto, TripPhotoArchive, TripPhoto.uploaded_at, 'RETENTION_PHOTO_DAYS',
+        lambda cutoff: TripPhoto.booking_id.in_(_finished_booking_ids(cutoff)),
+        None,
+        'photo_path',
+    ),
+)
+
+
+def get_retention_policy(name):
+    for policy in RETENTION_POLICIES:
+        if policy.name == name:
+            return policy
+    raise ValueError(f"Unknown retention policy '{name}'. Choose from: "
+                     f"{', '.join(policy.name for policy in RETENTION_POLICIES)}.")
+# --- End Policy Registry ---
+
+
+def _copied_columns(policy):
+    return [column.name for column in policy.archive_model.__table__.columns
+            if column.name not in ('archived_at', 'exported_at')]
+
+
+def _pause():
+    pause_ms = current_app.config['RETENTION_CHUNK_PAUSE_MS']
+    if pause_ms:
+        time.sleep(pause_ms / 1000.0)
+
+
+def archive_policy(policy, now=None, max_chunks=None):
+    """
+    Archive one policy's eligible rows, chunk by chunk.
+    Args:
+        policy (RetentionPolicy): What to archive.
+        max_chunks (int, optional): Stop after this many chunks (default RETENTION_MAX_CHUNKS_PER_RUN);
+                                    the next run carries on.
+    Returns:
+        int: Rows archived.
+    """
+    config = current_app.config
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(days=config[policy.days_key])
+    chunk_size = config['RETENTION_CHUNK_SIZE']
+    max_chunks = max_chunks or config['RETENTION_MAX_CHUNKS_PER_RUN']
+    model = policy.model
+    columns = _copied_columns(policy)
+
+    # Upper end of the walk: everything from the first young row on is left alone
+    first_young = db.session.execute(
+        select(func.min(model.id)).where(policy.age_column >= cutoff)
+    ).scalar()
+    db.session.commit()
+
+    archived = 0
+    last_id = 0
+    for _ in range(max_chunks):
+        bounds = [model.id > last_id, policy.age_column < cutoff, policy.eligible(cutoff)]
+        if first_young is not None:
+            bounds.append(model.id < first_young)
+        try:
+            ids = db.session.execute(
+                select(model.id).where(*bounds).order_by(model.id).limit(chunk_size)
+                .with_for_update(skip_locked=True)
+            ).scalars().all()
+            if not ids:
+                db.session.commit()
+                break
+            db.session.execute(
+                insert(policy.archive_model).from_select(
+                    columns + ['archived_at'],
+                    select(*[model.__table__.c[name] for name in columns], literal(now)).where(model.id.in_(ids))
+                )
+            )
+            if policy.before_delete is not None:
+                policy.before_delete(ids)
+            db.session.execute(delete(model).where(model.id.in_(ids)).execution_options(synchronize_session=False))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Retention chunk for {policy.name} after id {last_id} failed: {e}")
+            raise
+        archived += len(ids)
+        last_id = ids[-1]
+        _pause()
+
+    if archived:
+        current_app.logger.info(f"Retention: archived {archived} {policy.name} rows older than {cutoff:%Y-%m-%d}.")
+    return archived
+
+
+def apply_retention_policies(policy_name=None, max_chunks=None):
+    """
+    Run every retention policy (or only `policy_name`).
+    Returns:
+        dict: {policy name: rows archived}
+    """
+    policies = [get_retention_policy(policy_name)] if policy_name else RETENTION_POLICIES
+    return {policy.name: archive_policy(policy, max_chunks=max_chunks) for policy in policies}
+
+
+def export_archive(policy_name, purge=False, export_dir=None):
+    """
+    Write archive rows not yet exported to <export_dir>/<table>_<first id>-<last id>_<time>.jsonl.gz.
+    Each chunk is marked exported, or deleted from the archive if `purge` is set,
+    right after it is written.
+    Returns:
+        dict: 'rows' written and the file 'path' (None when there was nothing to export).
+    """
+    policy = get_retention_policy(policy_name)
+    archive = policy.archive_model
+    config = current_app.config
+    chunk_size = config['RETENTION_CHUNK_SIZE']
+    first_id, last_id = db.session.execute(
+        select(func.min(archive.id), func.max(archive.id)).where(archive.exported_at.is_(None))
+    ).one()
+    db.session.commit()
+    if first_id is None:
+        return {'rows': 0, 'path': None}
+
+    export_dir = export_dir or config['RETENTION_EXPORT_DIR']
+    os.makedirs(export_dir, exist_ok=True)
+    table = archive.__tablename__
+    path = os.path.join(export_dir, f"{table}_{first_id}-{last_id}_{datetime.utcnow():%Y%m%d%H%M%S}.jsonl.gz")
+    rows = 0
+    # --- Write, then mark or purge exactly the written rows, one primary-key chunk at a time ---
+    with gzip.open(path, 'wt', encoding='utf-8') as export_file:
+        start = first_id
+        while start <= last_id:
+            end = min(start + chunk_size, last_id + 1)
+            try:
+                chunk = db.session.execute(
+                    select(archive.__table__)
+                    .where(archive.id >= start, archive.id < end, archive.exported_at.is_(None))
+                    .order_by(archive.id)
+                ).all()
+                for row in chunk:
+                    export_file.write(json.dumps(dict(row._mapping), default=str) + '\n')
+                if chunk:
+                    export_file.flush()  # On disk before the rows are marked or purged
+                    ids = [row.id for row in chunk]
+                    if purge:
+                        if policy.upload_column:
+                            # The archive rows hold upload references too; the blobs become collectable
+                            for row in chunk:
+                                release_upload(getattr(row, policy.upload_column))
+                        db.session.execute(delete(archive).where(archive.id.in_(ids))
+                                           .execution_options(synchronize_session=False))
+                    else:
+                        db.session.execute(update(archive).where(archive.id.in_(ids))
+                                           .values(exported_at=datetime.utcnow())
+                                           .execution_options(synchronize_session=False))
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            rows += len(chunk)
+            start = end
+            _pause()
+    # --- End Write ---
+
+    current_app.logger.info(f"Exported {rows} {table} rows to {path}{' and purged them' if purge else ''}.")
+    return {'rows': rows, 'path': path}
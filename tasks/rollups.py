@@ -0,0 +1,116 @@
+# tasks/rollups.py
+"""
+Backfill / rebuild of the daily host earnings rollups.
+
+The rollups are kept current by the booking status hooks; this job rebuilds a
+day range from the bookings themselves, for the initial backfill and to heal
+any drift (e.g. bookings changed outside the model methods).
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from flask import current_app
+from sqlalchemy import and_, delete, insert, or_, select, true
+
+from models import db
+from models.booking import Booking
+from models.car import Car
+from models.host_earnings import HostDailyEarnings
+from utils.host_rollups import COUNTED_CANCELLATIONS, ROLLUP_COUNTERS, booking_rollup_delta
+from utils.streaming import stream_rows
+from utils.timezone import ist_to_utc, get_current_ist_time
+
+
+def _ist_bound(day):
+    """Naive IST midnight starting `day`, for booking dates (stored as IST)."""
+    return datetime.combine(day, time.min)
+
+
+def _utc_bound(day):
+    """Naive UTC datetime of IST midnight starting `day`, for UTC timestamps such as cancelled_at."""
+    return ist_to_utc(_ist_bound(day)).replace(tzinfo=None)
+
+
+def rebuild_host_rollups(start_day=None, end_day=None, host_id=None, chunk_size=None):
+    """
+    Recompute the rollup rows for IST days start_day..end_day (inclusive) from bookings.
+    Existing rows in the range are replaced in the same transaction.
+
+    Args:
+        start_day (date, optional): First day. Defaults to the beginning of history.
+        end_day (date, optional): Last day. Defaults to no upper bound.
+        host_id (int, optional): Limit the rebuild to one host.
+    Returns:
+        int: Number of rollup rows written.
+    """
+    chunk_size = chunk_size or current_app.config['RECONCILIATION_CHUNK_SIZE']
+
+    def in_range(column, bound):
+        conditions = []
+        if start_day is not None:
+            conditions.append(column >= bound(start_day))
+        if end_day is not None:
+            conditions.append(column < bound(end_day + timedelta(days=1)))
+        return and_(true(), *conditions)
+
+    query = (
+        select(
+            Booking.id, Booking.car_id, Car.host_id, Booking.status, Booking.start_date, Booking.end_date,
+            Booking.total_price, Booking.cancelled_by, Booking.cancelled_at,
+            Booking.cancellation_fee_deducted, Booking.refund_amount,
+        )
+        .join(Car, Booking.car_id == Car.id)
+        .where(or_(
+            and_(Booking.status == 'completed', in_range(Booking.end_date, _ist_bound)),
+            and_(Booking.status == 'cancelled', Booking.cancelled_by.in_(COUNTED_CANCELLATIONS),
+                 in_range(Booking.cancelled_at, _utc_bound)),
+        ))
+    )
+    if host_id is not None:
+        query = query.where(Car.host_id == host_id)
+
+    # --- Aggregate per (host, car, day) while streaming ---
+    totals = defaultdict(lambda: dict.fromkeys(ROLLUP_COUNTERS, 0))
+    for row in stream_rows(query, chunk_size):
+        delta = booking_rollup_delta(row)
+        if delta is None:
+            continue
+        day, counters = delta
+        bucket = totals[(row.host_id, row.car_id, day)]
+        for name, amount in counters.items():
+            bucket[name] += amount
+    # --- End Aggregate ---
+
+    stale = delete(HostDailyEarnings)
+    if start_day is not None:
+        stale = stale.where(HostDailyEarnings.day >= start_day)
+    if end_day is not None:
+        stale = stale.where(HostDailyEarnings.day <= end_day)
+    if host_id is not None:
+        stale = stale.where(HostDailyEarnings.host_id == host_id)
+
+    now = datetime.utcnow()
+    values = [
+        {'host_id': key[0], 'car_id': key[1], 'day': key[2], 'updated_at': now,
+         **{name: round(amount, 2) for name, amount in counters.items()}}
+        for key, counters in totals.items()
+    ]
+    try:
+        db.session.execute(stale.execution_options(synchronize_session=False))
+        if values:
+            db.session.execute(insert(HostDailyEarnings), values)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error rebuilding host rollups ({start_day} to {end_day}): {e}")
+        raise
+
+    current_app.logger.info(f"Rebuilt {len(values)} host rollup rows ({start_day or 'start'} to {end_day or 'now'}).")
+    return len(values)
+
+
+def rebuild_recent_host_rollups():
+    """Scheduled job: rebuild the last HOST_ROLLUP_REBUILD_DAYS closed days (today is left to the hooks)."""
+    yesterday = get_current_ist_time().date() - timedelta(days=1)
+    days = current_app.config['HOST_ROLLUP_REBUILD_DAYS']
+    return rebuild_host_rollups(start_day=yesterday - timedelta(days=days - 1), end_day=yesterday)
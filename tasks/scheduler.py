@@ -0,0 +1,372 @@
+# tasks/scheduler.py
+"""
+Background job scheduler with single-leader election.
+
+Under gunicorn every worker imports app.py. If each started its own
+APScheduler, every job would run once per worker. Instead, each process runs
+a SchedulerRunner that competes for one leader lock:
+
+- database: MySQL GET_LOCK() / PostgreSQL pg_try_advisory_lock(), held on a
+  dedicated connection for as long as the process leads. If the connection
+  dies, the lock is released and another process takes over.
+- file: an exclusive lock on SCHEDULER_LOCK_FILE. This is the local stand-in
+  for SQLite and single-host setups.
+
+Only the leader schedules the shared jobs. Jobs that warm a per-process
+in-memory cache (see SCHEDULED_JOBS) run in every web process without a lock.
+
+Each run gets its own app context and therefore its own scoped session,
+which is removed afterwards. Run count, failures, duration and lag (actual
+start minus scheduled start) go to scheduler_job_stats.
+
+Deployments can set SCHEDULER_EMBEDDED=false and run the leader loop in a
+separate `flask scheduler` process instead.
+"""
+import os
+import socket
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+
+from apscheduler.events import EVENT_JOB_MISSED, EVENT_JOB_SUBMITTED
+from apscheduler.schedulers.background import BackgroundScheduler
+from flask import current_app
+from sqlalchemy import insert, text, update
+from sqlalchemy.exc import IntegrityError
+
+from models import db
+from models.scheduler import SchedulerJobStat
+
+RUNNER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+# --- Job Registry ---
+# (job id, 'module:function', trigger unit, config key for the interval, per_process)
+SCHEDULED_JOBS = (
+    ('send_due_reminders', 'tasks.reminders:send_due_reminders', 'seconds', 'REMINDER_POLL_SECONDS', False),
+    ('expire_stale_pending_bookings', 'tasks.bookings:expire_stale_pending_bookings',
+     'minutes', 'PENDING_BOOKING_SWEEP_INTERVAL_MINUTES', False),
+    ('snapshot_ledger_balances', 'tasks.ledger:snapshot_ledger_balances', 'hours', 'LEDGER_SNAPSHOT_INTERVAL_HOURS', False),
+    ('build_payout_batches', 'tasks.payouts:build_payout_batches', 'hours', 'PAYOUT_BATCH_INTERVAL_HOURS', False),
+    ('compact_search_log', 'tasks.search_demand:compact_search_log',
+     'minutes', 'SEARCH_LOG_COMPACTION_INTERVAL_MINUTES', False),
+    ('dispatch_pending_notifications', 'tasks.notification_dispatch:dispatch_pending_notifications',
+     'seconds', 'NOTIFICATION_DISPATCH_INTERVAL_SECONDS', False),
+    ('dispatch_outbound_messages', 'tasks.messaging:dispatch_outbound_messages',
+     'seconds', 'MESSAGING_DISPATCH_INTERVAL_SECONDS', False),
+    ('run_queued_broadcasts', 'tasks.broadcasts:run_queued_broadcasts', 'seconds', 'BROADCAST_POLL_SECONDS', False),
+    ('reconcile_unread_counters', 'tasks.notification_counters:reconcile_unread_counters',
+     'hours', 'UNREAD_RECONCILE_INTERVAL_HOURS', False),
+    ('apply_retention_policies', 'tasks.retention:apply_retention_policies', 'hours', 'RETENTION_INTERVAL_HOURS', False),
+    ('generate_pending_derivatives', 'tasks.images:generate_pending_derivatives',
+     'seconds', 'IMAGE_DERIVATIVE_POLL_SECONDS', False),
+    ('collect_unreferenced_blobs', 'tasks.uploads:collect_unreferenced_blobs',
+     'hours', 'UPLOAD_BLOB_GC_INTERVAL_HOURS', False),
+    ('collect_orphan_files', 'tasks.uploads:collect_orphan_files', 'hours', 'UPLOAD_BLOB_GC_INTERVAL_HOURS', False),
+    ('rebuild_recent_host_rollups', 'tasks.rollups:rebuild_recent_host_rollups',
+     'hours', 'HOST_ROLLUP_REBUILD_INTERVAL_HOURS', False),
+    # The admin dashboard snapshot lives in each worker's in-process cache
+    ('refresh_dashboard_metrics', 'utils.admin_metrics:refresh_dashboard_metrics',
+     'seconds', 'ADMIN_METRICS_REFRESH_SECONDS', True),
+)
+
+
+def _load(path):
+    module_name, func_name = path.split(':')
+    module = __import__(module_name, fromlist=[func_name])
+    return getattr(module, func_name)
+# --- End Job Registry ---
+
+
+# --- Leader Locks ---
+class DatabaseLeaderLock:
+    """Session-level advisory lock on a dedicated connection (MySQL or PostgreSQL)."""
+
+    def __init__(self, engine, name):
+        self.engine = engine
+        self.name = name
+        self.key = zlib.crc32(name.encode('utf-8'))  # pg advisory locks take an integer key
+        self.connection = None
+
+    def acquire(self):
+        connection = self.engine.connect()
+        try:
+            if self.engine.dialect.name == 'mysql':
+                acquired = connection.execute(text("SELECT GET_LOCK(:name, 0)"), {'name': self.name}).scalar() == 1
+            else:
+                acquired = bool(connection.execute(text("SELECT pg_try_advisory_lock(:key)"), {'key': self.key}).scalar())
+            connection.commit()
+        except Exception:
+            connection.close()
+            raise
+        if not acquired:
+            connection.close()
+            return False
+        self.connection = connection
+        return True
+
+    def still_held(self):
+        """Ping the lock's connection; a dropped connection means the lock is gone."""
+        try:
+            if self.engine.dialect.name == 'mysql':
+                held = self.connection.execute(
+                    text("SELECT IS_USED_LOCK(:name) = CONNECTION_ID()"), {'name': self.name}
+                ).scalar() == 1
+            else:
+                held = self.connection.execute(text("SELECT 1")).scalar() == 1
+            self.connection.commit()
+            return held
+        except Exception:
+            self.release()
+            return False
+
+    def release(self):
+        """
+        Unlock explicitly: close() only returns the connection to the pool, and the
+        server session (and its lock) lives on. If the unlock fails the connection is
+        invalidated instead, which closes the session and drops the lock with it.
+        """
+        if self.connection is None:
+            return
+        connection, self.connection = self.connection, None
+        try:
+            if self.engine.dialect.name == 'mysql':
+                connection.execute(text("SELECT RELEASE_LOCK(:name)"), {'name': self.name})
+            else:
+                connection.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': self.key})
+            connection.commit()
+            connection.close()
+        except Exception:
+            try:
+                connection.invalidate()
+                connection.close()
+            except Exception:
+                pass
+
+
+class FileLeaderLock:
+    """Exclusive non-blocking lock on a file; the OS releases it when the process exits."""
+
+    def __init__(self, path):
+        self.path = path
+        self.handle = None
+
+    def acquire(self):
+        handle = open(self.path, 'a+')
+        try:
+            if os.name == 'nt':
+                import msvcrt
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        handle.seek(0)
+        handle.truncate()
+        handle.write(RUNNER_ID)
+        handle.flush()
+        self.handle = handle
+        return True
+
+    def still_held(self):
+        return self.handle is not None
+
+    def release(self):
+        if self.handle is not None:
+            self.handle.close()  # Closing the descriptor drops the lock
+            self.handle = None
+
+
+def make_leader_lock(app):
+    """Leader lock for SCHEDULER_LOCK_BACKEND ('auto' picks database on MySQL/PostgreSQL, file otherwise)."""
+    backend = app.config['SCHEDULER_LOCK_BACKEND']
+    dialect = db.engine.dialect.name
+    if backend == 'auto':
+        backend = 'database' if dialect in ('mysql', 'postgresql') else 'file'
+    if backend == 'database':
+        if dialect not in ('mysql', 'postgresql'):
+            raise ValueError(f"Advisory locks are not supported on the '{dialect}' database; use the file backend.")
+        return DatabaseLeaderLock(db.engine, app.config['SCHEDULER_LOCK_NAME'])
+    return FileLeaderLock(app.config['SCHEDULER_LOCK_FILE'])
+# --- End Leader Locks ---
+
+
+# --- Job Statistics ---
+def record_job_run(job_id, started_at, duration, lag, error=None, missed=0):
+    """Add one run to the job's row in scheduler_job_stats (UPDATE, INSERT on first run)."""
+    values = {
+        'runs': SchedulerJobStat.runs + (0 if started_at is None else 1),
+        'failures': SchedulerJobStat.failures + (1 if error else 0),
+        'missed': SchedulerJobStat.missed + missed,
+        'total_duration_seconds': SchedulerJobStat.total_duration_seconds + (duration or 0.0),
+        'updated_at': datetime.utcnow(),
+    }
+    if started_at is not None:
+        values.update(last_started_at=started_at, last_duration_seconds=round(duration, 3),
+                      last_lag_seconds=None if lag is None else round(lag, 3),
+                      last_error=(str(error)[:255] if error else None), last_runner=RUNNER_ID)
+    increment = (update(SchedulerJobStat).where(SchedulerJobStat.job_id == job_id).values(values)
+                 .execution_options(synchronize_session=False))
+    try:
+        if not db.session.execute(increment).rowcount:
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(insert(SchedulerJobStat).values(
+                        job_id=job_id, runs=0, failures=0, missed=0, total_duration_seconds=0.0))
+            except IntegrityError:
+                pass
+            db.session.execute(increment)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.warning(f"Could not record scheduler stats for {job_id}: {e}")
+# --- End Job Statistics ---
+
+
+class SchedulerRunner:
+    """Leader election loop plus the APScheduler instances of one process."""
+
+    def __init__(self, app, run_per_process_jobs=True):
+        self.app = app
+        self.run_per_process_jobs = run_per_process_jobs
+        self.retry_seconds = app.config['SCHEDULER_LEADER_RETRY_SECONDS']
+        self.lock = None
+        self.leader_scheduler = None
+        self.local_scheduler = None
+        self._lag = {}
+        self._missed = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def is_leader(self):
+        return self.leader_scheduler is not None
+
+    # --- Job Execution ---
+    def _run_job(self, job_id, path):
+        with self.app.app_context():  # Own app context -> own scoped session
+            started_at = datetime.utcnow()
+            started = time.perf_counter()
+            error = None
+            try:
+                _load(path)()
+            except Exception as e:
+                error = e
+                current_app.logger.error(f"Scheduled job {job_id} failed: {e}")
+            finally:
+                db.session.remove()
+            duration = time.perf_counter() - started
+            record_job_run(job_id, started_at, duration, self._lag.pop(job_id, None), error,
+                           missed=self._missed.pop(job_id, 0))
+            db.session.remove()
+
+    def _on_event(self, event):
+        if event.code == EVENT_JOB_SUBMITTED and event.scheduled_run_times:
+            scheduled = event.scheduled_run_times[-1]
+            self._lag[event.job_id] = (datetime.now(timezone.utc) - scheduled).total_seconds()
+        elif event.code == EVENT_JOB_MISSED:
+            self._missed[event.job_id] = self._missed.get(event.job_id, 0) + 1
+
+    def _build_scheduler(self, per_process):
+        scheduler = BackgroundScheduler()
+        scheduler.add_listener(self._on_event, EVENT_JOB_SUBMITTED | EVENT_JOB_MISSED)
+        for job_id, path, unit, config_key, job_per_process in SCHEDULED_JOBS:
+            if job_per_process != per_process:
+                continue
+            scheduler.add_job(
+                func=self._run_job,
+                args=[job_id, path],
+                trigger="interval",
+                id=job_id,
+                max_instances=1,
+                coalesce=True,
+                **{unit: self.app.config[config_key]}
+            )
+        return scheduler
+    # --- End Job Execution ---
+
+    # --- Leadership ---
+    def _try_lead(self):
+        if self.lock is None:
+            with self.app.app_context():
+                self.lock = make_leader_lock(self.app)
+        try:
+            acquired = self.lock.acquire()
+        except Exception as e:
+            self.app.logger.warning(f"Scheduler leader lock unavailable: {e}")
+            return
+        if acquired:
+            self.leader_scheduler = self._build_scheduler(per_process=False)
+            self.leader_scheduler.start()
+            self.app.logger.info(f"Scheduler leader elected: {RUNNER_ID}")
+
+    def _step_down(self):
+        self.app.logger.warning(f"Scheduler leadership lost by {RUNNER_ID}; stopping shared jobs.")
+        self.leader_scheduler.shutdown(wait=False)
+        self.leader_scheduler = None
+        self.lock.release()  # Frees the old connection before the next acquire() opens another
+
+    def _election_loop(self):
+        try:
+            while not self._stop.is_set():
+                if not self.is_leader:
+                    self._try_lead()
+                elif not self.lock.still_held():
+                    self._step_down()
+                self._stop.wait(self.retry_seconds)
+        finally:
+            if self.is_leader:
+                self.leader_scheduler.shutdown(wait=True)  # Let running jobs finish before giving up the lock
+                self.leader_scheduler = None
+            if self.lock is not None:
+                self.lock.release()
+    # --- End Leadership ---
+
+    def start(self):
+        """Start per-process jobs and the election loop on a daemon thread (embedded mode)."""
+        if self._thread is not None:
+            return
+        if self.run_per_process_jobs:
+            self.local_scheduler = self._build_scheduler(per_process=True)
+            self.local_scheduler.start()
+        self._thread = threading.Thread(target=self._election_loop, name='scheduler-election', daemon=True)
+        self._thread.start()
+
+    def run_forever(self):
+        """Run the election loop in the calling thread until interrupted (`flask scheduler`)."""
+        try:
+            self._election_loop()
+        except KeyboardInterrupt:
+            pass  # The loop's cleanup has stopped the jobs and released the lock
+
+    def stop(self):
+        self._stop.set()
+        if self.local_scheduler is not None:
+            self.local_scheduler.shutdown(wait=False)
+            self.local_scheduler = None
+        if self._thread is not None:
+            self._thread.join(timeout=self.retry_seconds + 5)
+            self._thread = None
+
+    def status(self):
+        return {
+            'runner': RUNNER_ID,
+            'leader': self.is_leader,
+            'jobs': [job.id for job in self.leader_scheduler.get_jobs()] if self.is_leader else [],
+        }
+
+
+_runner = None
+
+
+def start_embedded_scheduler(app):
+    """Start this process's runner once (called from app.py when SCHEDULER_EMBEDDED is on)."""
+    global _runner
+    if _runner is None:
+        _runner = SchedulerRunner(app)
+        _runner.start()
+    return _runner
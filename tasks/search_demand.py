@@ -0,0 +1,82 @@
+# tasks/search_demand.py
+"""
+Compaction of the search log into the daily per-cell demand table.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from models import db
+from models.search_log import SearchDemandDaily, SearchLog
+from utils.streaming import stream_rows
+from utils.timezone import db_utc_to_ist
+
+DEMAND_COUNTERS = ('searches', 'zero_result_searches', 'results_total', 'latency_ms_total')
+
+
+def _add_demand(day, cell, counters):
+    """Increment the (day, cell) row in SQL, creating it on first use."""
+    increment = (
+        update(SearchDemandDaily)
+        .where(SearchDemandDaily.day == day, SearchDemandDaily.cell == cell)
+        .values({getattr(SearchDemandDaily, name): getattr(SearchDemandDaily, name) + amount
+                 for name, amount in counters.items()})
+        .execution_options(synchronize_session=False)
+    )
+    if db.session.execute(increment).rowcount:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(SearchDemandDaily).values(day=day, cell=cell, **counters))
+    except IntegrityError:
+        db.session.execute(increment)
+
+
+def compact_search_log(chunk_size=None):
+    """
+    Fold settled SearchLog rows into SearchDemandDaily and delete them, in one transaction.
+
+    Rows younger than SEARCH_LOG_SETTLE_SECONDS are left for the next run, so a
+    batch the writer has not committed yet cannot fall below the cut.
+
+    Returns:
+        int: Number of log rows compacted.
+    """
+    chunk_size = chunk_size or current_app.config['RECONCILIATION_CHUNK_SIZE']
+    cutoff = datetime.utcnow() - timedelta(seconds=current_app.config['SEARCH_LOG_SETTLE_SECONDS'])
+    last_id = db.session.execute(
+        select(func.max(SearchLog.id)).where(SearchLog.created_at <= cutoff)
+    ).scalar()
+    if last_id is None:
+        db.session.rollback()
+        return 0
+    settled = (SearchLog.id <= last_id, SearchLog.created_at <= cutoff)
+
+    totals = defaultdict(lambda: dict.fromkeys(DEMAND_COUNTERS, 0))
+    compacted = 0
+    for row in stream_rows(
+        select(SearchLog.cell, SearchLog.created_at, SearchLog.result_count, SearchLog.latency_ms).where(*settled),
+        chunk_size
+    ):
+        counters = totals[(db_utc_to_ist(row.created_at).date(), row.cell or 'unknown')]
+        counters['searches'] += 1
+        counters['zero_result_searches'] += 1 if row.result_count == 0 else 0
+        counters['results_total'] += row.result_count
+        counters['latency_ms_total'] += row.latency_ms
+        compacted += 1
+
+    try:
+        for (day, cell), counters in totals.items():
+            _add_demand(day, cell, counters)
+        db.session.execute(delete(SearchLog).where(*settled).execution_options(synchronize_session=False))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error compacting search log up to id {last_id}: {e}")
+        raise
+
+    current_app.logger.info(f"Compacted {compacted} search log rows into {len(totals)} demand cells.")
+    return compacted
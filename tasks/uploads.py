@@ -0,0 +1,226 @@
+# tasks/uploads.py
+"""
+Maintenance of the content-addressed upload store (utils/upload_store.py).
+
+- collect_unreferenced_blobs(): deletes blobs whose reference count has been
+  zero for UPLOAD_BLOB_GC_GRACE_HOURS. Each row is locked, deleted and its
+  file unlinked before the commit, so a concurrent upload of the same
+  content waits for the lock and then recreates both.
+- collect_orphan_files(): deletes stored files that have no blob row and
+  are older than the same grace period. store_stream() moves a new file into
+  place before the caller commits, so a rolled-back upload leaves one behind.
+- migrate_legacy_uploads(): moves rows that still point at flat files in
+  static/uploads (or UPLOAD_FOLDER) into the store, deduplicating as it goes.
+"""
+import os
+import re
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import delete, select, update
+
+from models import db
+from models.archive import PhotoArchive, TripPhotoArchive
+from models.blob import Blob
+from models.car_image import CarImage
+from models.document import Document
+from models.photo import Photo
+from models.trip_photo import TripPhoto
+from utils.image_variants import derivative_keys, forget_rendered
+from utils.upload_store import ALLOWED_UPLOAD_EXTENSIONS, store_stream, upload_path
+
+SHARD_NAME = re.compile(r'[0-9a-f]{2}')
+
+# (model, column holding the upload key) for every table that references uploads
+UPLOAD_REFERENCES = (
+    (CarImage, 'filename'),
+    (Photo, 'filename'),
+    (TripPhoto, 'photo_path'),
+    (Document, 'filename'),
+    (PhotoArchive, 'filename'),
+    (TripPhotoArchive, 'photo_path'),
+)
+
+
+def collect_unreferenced_blobs(batch_size=None):
+    """
+    Delete blobs nobody has referenced for the grace period, one batch per transaction.
+    Returns:
+        int: Blobs deleted.
+    """
+    config = current_app.config
+    batch_size = batch_size or config['UPLOAD_BLOB_GC_BATCH_SIZE']
+    cutoff = datetime.utcnow() - timedelta(hours=config['UPLOAD_BLOB_GC_GRACE_HOURS'])
+    collected = 0
+    while True:
+        try:
+            rows = db.session.execute(
+                select(Blob.id, Blob.key)
+                .where(Blob.ref_count == 0, Blob.released_at < cutoff)
+                .order_by(Blob.id)
+                .limit(batch_size)
+                .with_for_update(skip_locked=True)
+            ).all()
+            if not rows:
+                db.session.commit()
+                break
+            db.session.execute(
+                delete(Blob).where(Blob.id.in_([row.id for row in rows])).execution_options(synchronize_session=False)
+            )
+            for row in rows:  # Still holding the row locks
+                for key in [row.key] + derivative_keys(row.key):
+                    path = upload_path(key)
+                    if os.path.exists(path):
+                        os.remove(path)
+                forget_rendered(row.key)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Error collecting unreferenced blobs: {e}")
+            raise
+        collected += len(rows)
+    if collected:
+        current_app.logger.info(f"Collected {collected} unreferenced upload blobs.")
+    return collected
+
+
+def _stored_files(store):
+    """Yield (key, path) for every file in the sharded store (ab/cd/<hash><ext>); legacy flat files are skipped."""
+    for shard in sorted(os.listdir(store)):
+        if not SHARD_NAME.fullmatch(shard) or not os.path.isdir(os.path.join(store, shard)):
+            continue
+        for subshard in sorted(os.listdir(os.path.join(store, shard))):
+            folder = os.path.join(store, shard, subshard)
+            if not SHARD_NAME.fullmatch(subshard) or not os.path.isdir(folder):
+                continue
+            for name in sorted(os.listdir(folder)):
+                yield f"{shard}/{subshard}/{name}", os.path.join(folder, name)
+
+
+def collect_orphan_files(batch_size=None):
+    """
+    Delete stored files (and abandoned temporary files) that no blob row owns,
+    once they are older than UPLOAD_BLOB_GC_GRACE_HOURS. The grace period keeps
+    the sweep away from uploads whose transaction has not committed yet.
+    Returns:
+        int: Files deleted.
+    """
+    config = current_app.config
+    batch_size = batch_size or config['UPLOAD_BLOB_GC_BATCH_SIZE']
+    store = config['UPLOAD_STORE_FOLDER']
+    cutoff = time.time() - config['UPLOAD_BLOB_GC_GRACE_HOURS'] * 3600
+    if not os.path.isdir(store):
+        return 0
+
+    def is_old(path):
+        try:
+            return os.path.getmtime(path) < cutoff
+        except FileNotFoundError:
+            return False
+
+    removed = 0
+    tmp_dir = os.path.join(store, 'tmp')
+    if os.path.isdir(tmp_dir):
+        for name in os.listdir(tmp_dir):  # Left by a process that died mid-upload
+            path = os.path.join(tmp_dir, name)
+            if name.endswith('.part') and is_old(path):
+                os.remove(path)
+                removed += 1
+
+    def sweep(candidates):
+        known = set(db.session.execute(
+            select(Blob.key).where(Blob.key.in_([key for key, _ in candidates]))
+        ).scalars())
+        db.session.rollback()  # Read-only; do not hold a transaction open while unlinking
+        deleted = 0
+        for key, path in candidates:
+            if key not in known and is_old(path):  # Re-checked: a re-upload of the content refreshes the file
+                os.remove(path)
+                deleted += 1
+        return deleted
+
+    candidates = []
+    for key, path in _stored_files(store):
+        if is_old(path):
+            candidates.append((key, path))
+        if len(candidates) >= batch_size:
+            removed += sweep(candidates)
+            candidates = []
+    if candidates:
+        removed += sweep(candidates)
+
+    if removed:
+        current_app.logger.info(f"Removed {removed} orphaned upload files.")
+    return removed
+
+
+def _legacy_path(filename):
+    """Where a flat legacy upload lives: static/uploads (car images) or UPLOAD_FOLDER (trip photos)."""
+    for folder in (current_app.config['UPLOAD_STORE_FOLDER'], current_app.config['UPLOAD_FOLDER']):
+        path = os.path.join(folder, filename)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def _still_referenced(filename):
+    for model, column_name in UPLOAD_REFERENCES:
+        column = getattr(model, column_name)
+        if db.session.execute(select(model.id).where(column == filename).limit(1)).first():
+            return True
+    return False
+
+
+def migrate_legacy_uploads(chunk_size=200, delete_legacy=False):
+    """
+    Point every row that still holds a flat filename at a blob key.
+    Args:
+        chunk_size (int): Rows per transaction.
+        delete_legacy (bool): Remove each legacy file once no row references it.
+    Returns:
+        dict: 'migrated', 'missing' (file not found) and 'deleted' (legacy files removed).
+    """
+    summary = {'migrated': 0, 'missing': 0, 'deleted': 0}
+    for model, column_name in UPLOAD_REFERENCES:
+        column = getattr(model, column_name)
+        last_id = 0
+        while True:
+            rows = db.session.execute(
+                select(model.id, column)
+                .where(model.id > last_id, ~column.contains('/'))
+                .order_by(model.id)
+                .limit(chunk_size)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            moved = set()
+            try:
+                for row in rows:
+                    filename = row[1]
+                    path = _legacy_path(filename)
+                    ext = os.path.splitext(filename)[1].lower()
+                    if path is None or ext not in ALLOWED_UPLOAD_EXTENSIONS:
+                        summary['missing'] += 1
+                        continue
+                    with open(path, 'rb') as legacy_file:
+                        key = store_stream(legacy_file, ext)
+                    db.session.execute(
+                        update(model).where(model.id == row.id).values({column_name: key})
+                        .execution_options(synchronize_session=False)
+                    )
+                    moved.add(filename)
+                    summary['migrated'] += 1
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            if delete_legacy:
+                for filename in moved:
+                    path = _legacy_path(filename)
+                    if path and not _still_referenced(filename):
+                        os.remove(path)
+                        summary['deleted'] += 1
+    current_app.logger.info(f"Legacy upload migration: {summary}")
+    return summary
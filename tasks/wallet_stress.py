@@ -0,0 +1,161 @@
+# tasks/wallet_stress.py
+"""
+Concurrency check for the atomic wallet updates in utils/wallet_service.py.
+
+Many threads, each with its own app context (and so its own session and
+connection), credit the same user and host wallets at once. With
+read-modify-write updates some credits vanish; with the SQL-side UPDATE the
+final balance must equal the starting balance plus every committed credit.
+The credits are reverted afterwards (with a reversing ledger entry for the
+user wallet's double-entry postings).
+"""
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import delete, func, select
+
+from models import db
+from models.host import Host
+from models.user import User
+from models.wallet_transaction import WalletTransaction
+from utils import ledger_service as ledger
+from utils.wallet_service import apply_balance_delta, credit_wallet
+
+STRESS_REFERENCE_TYPE = 'wallet_stress_test'
+
+
+def _run_workers(app, workers, target):
+    """Start `workers` threads on `target(worker_index)` inside their own app contexts; return per-worker results."""
+    results = [None] * workers
+    start_barrier = threading.Barrier(workers)
+
+    def run(index):
+        with app.app_context():
+            start_barrier.wait()  # Release every worker at once to maximise contention
+            try:
+                results[index] = target(index)
+            finally:
+                db.session.remove()
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def run_wallet_stress(user_id, host_id=None, workers=16, credits_per_worker=50, amount=1.0):
+    """
+    Hammer one user wallet (through WalletTransaction.record_transaction) and
+    optionally one host wallet (through credit_wallet) with concurrent credits.
+
+    Returns:
+        dict: Per-wallet expected vs actual balance, committed/failed credits and
+              whether any update was lost.
+    """
+    app = current_app._get_current_object()
+    report = {}
+
+    # --- User wallet: balance update + ledger row per credit ---
+    start_balance = db.session.execute(select(User.wallet_balance).where(User.id == user_id)).scalar_one() or 0.0
+    db.session.rollback()
+
+    def credit_user(index):
+        committed = failed = 0
+        user = db.session.get(User, user_id)
+        for i in range(credits_per_worker):
+            try:
+                WalletTransaction.record_transaction(
+                    user=user, amount=amount, transaction_type='bonus',
+                    description=f"Wallet stress test {index}/{i}",
+                    reference_id=index, reference_type=STRESS_REFERENCE_TYPE
+                )
+                db.session.commit()
+                committed += 1
+            except Exception as e:
+                db.session.rollback()
+                failed += 1
+                app.logger.warning(f"Wallet stress credit failed (worker {index}): {e}")
+        return committed, failed
+
+    started = time.perf_counter()
+    results = _run_workers(app, workers, credit_user)
+    elapsed = time.perf_counter() - started
+    committed = sum(r[0] for r in results)
+
+    end_balance = db.session.execute(select(User.wallet_balance).where(User.id == user_id)).scalar_one()
+    ledger_rows = db.session.execute(
+        select(func.count(), func.count(func.distinct(WalletTransaction.balance_after)))
+        .where(WalletTransaction.user_id == user_id, WalletTransaction.reference_type == STRESS_REFERENCE_TYPE)
+    ).one()
+    expected = round(start_balance + committed * amount, 2)
+    report['user'] = {
+        'committed': committed,
+        'failed': sum(r[1] for r in results),
+        'expected_balance': expected,
+        'actual_balance': round(end_balance, 2),
+        'ledger_rows': ledger_rows[0],
+        'distinct_balance_after': ledger_rows[1],  # Each credit must have seen a different balance
+        'lost_updates': round((expected - end_balance) / amount) if amount else 0,
+        'seconds': round(elapsed, 2),
+    }
+
+    # Revert: one compensating update plus a reversing ledger entry (postings are append-only),
+    # and drop the stress wallet transaction rows
+    if committed:
+        apply_balance_delta(User, user_id, -committed * amount, allow_overdraft=True)
+        ledger.post_entry(
+            'wallet_stress_reversal',
+            f"Reversal of {committed} wallet stress test credits",
+            [((ledger.USER, user_id), -committed * amount),
+             ((ledger.WALLET_COUNTERPARTIES['bonus'], ledger.PLATFORM_OWNER_ID), committed * amount)],
+            reference_id=user_id, reference_type=STRESS_REFERENCE_TYPE
+        )
+    db.session.execute(delete(WalletTransaction).where(
+        WalletTransaction.user_id == user_id, WalletTransaction.reference_type == STRESS_REFERENCE_TYPE
+    ))
+    db.session.commit()
+    # --- End User Wallet ---
+
+    # --- Host wallet: bare balance credits ---
+    if host_id is not None:
+        start_balance = db.session.execute(select(Host.wallet_balance).where(Host.id == host_id)).scalar_one() or 0.0
+        db.session.rollback()
+
+        def credit_host(index):
+            committed = failed = 0
+            host = db.session.get(Host, host_id)
+            for _ in range(credits_per_worker):
+                try:
+                    credit_wallet(host, amount)
+                    db.session.commit()
+                    committed += 1
+                except Exception as e:
+                    db.session.rollback()
+                    failed += 1
+                    app.logger.warning(f"Host wallet stress credit failed (worker {index}): {e}")
+            return committed, failed
+
+        started = time.perf_counter()
+        results = _run_workers(app, workers, credit_host)
+        elapsed = time.perf_counter() - started
+        committed = sum(r[0] for r in results)
+
+        end_balance = db.session.execute(select(Host.wallet_balance).where(Host.id == host_id)).scalar_one()
+        expected = round(start_balance + committed * amount, 2)
+        report['host'] = {
+            'committed': committed,
+            'failed': sum(r[1] for r in results),
+            'expected_balance': expected,
+            'actual_balance': round(end_balance, 2),
+            'lost_updates': round((expected - end_balance) / amount) if amount else 0,
+            'seconds': round(elapsed, 2),
+        }
+        if committed:
+            apply_balance_delta(Host, host_id, -committed * amount, allow_overdraft=True)
+        db.session.commit()
+    # --- End Host Wallet ---
+
+    return report
@@ -0,0 +1,89 @@
+# utils/admin_metrics.py
+"""
+Admin dashboard metrics.
+
+The headline counters are computed in one round trip (a SELECT of scalar
+COUNT subqueries) and the "recent" lists are loaded with their relationships
+eager-loaded, then frozen into plain dicts. The snapshot is refreshed by a
+background job every ADMIN_METRICS_REFRESH_SECONDS, so the dashboard renders
+from memory; a request only computes it itself when no snapshot exists yet
+(first request of a worker, or the scheduler is not running).
+"""
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import func, select
+from sqlalchemy.orm import joinedload
+
+from models import db
+from models.admin import Admin
+from models.booking import Booking
+from models.car import Car
+from models.host import Host
+from models.user import User
+from utils.cache import cache, ADMIN_METRICS_NAMESPACE
+
+RECENT_LIMIT = 5
+SNAPSHOT_KEY = 'dashboard'
+PRIVATE_COLUMNS = {'password_hash'}
+
+
+def _row_dict(obj):
+    """Column values of a model instance, without secrets."""
+    return {column.key: getattr(obj, column.key)
+            for column in obj.__table__.columns if column.key not in PRIVATE_COLUMNS}
+
+
+def _count(model):
+    return select(func.count()).select_from(model).scalar_subquery()
+
+
+def compute_dashboard_metrics():
+    """
+    Build a fresh dashboard snapshot.
+    Returns:
+        dict: total_* counters, recent_* lists (dicts; templates use them like
+        the model objects, e.g. booking.car.make) and generated_at.
+    """
+    counts = db.session.execute(select(
+        _count(User).label('total_users'),
+        _count(Host).label('total_hosts'),
+        _count(Car).label('total_cars'),
+        _count(Booking).label('total_bookings'),
+        _count(Admin).label('total_admins'),
+    )).one()._asdict()
+
+    # Newest by primary key: same order as created_at, served by the PK index
+    recent_bookings = db.session.execute(
+        select(Booking).options(joinedload(Booking.car), joinedload(Booking.user))
+        .order_by(Booking.id.desc()).limit(RECENT_LIMIT)
+    ).scalars().all()
+    recent_hosts = db.session.execute(
+        select(Host).options(joinedload(Host.user)).order_by(Host.id.desc()).limit(RECENT_LIMIT)
+    ).scalars().all()
+    recent = {
+        'recent_users': [_row_dict(user) for user in
+                         User.query.order_by(User.id.desc()).limit(RECENT_LIMIT)],
+        'recent_hosts': [{**_row_dict(host), 'user': _row_dict(host.user) if host.user else None}
+                         for host in recent_hosts],
+        'recent_bookings': [{**_row_dict(booking), 'car': _row_dict(booking.car), 'user': _row_dict(booking.user)}
+                            for booking in recent_bookings],
+        'recent_cars': [_row_dict(car) for car in Car.query.order_by(Car.id.desc()).limit(RECENT_LIMIT)],
+        'recent_admins': [_row_dict(admin) for admin in Admin.query.order_by(Admin.id.desc()).limit(RECENT_LIMIT)],
+    }
+    return {**counts, **recent, 'generated_at': datetime.utcnow()}
+
+
+def refresh_dashboard_metrics():
+    """Scheduled job: recompute the snapshot and swap it into the cache."""
+    metrics = compute_dashboard_metrics()
+    # Outlives a few missed refreshes, but a stopped scheduler cannot pin stale numbers forever
+    cache.set(ADMIN_METRICS_NAMESPACE, SNAPSHOT_KEY, metrics,
+              ttl=current_app.config['ADMIN_METRICS_REFRESH_SECONDS'] * 5)
+    return metrics
+
+
+def get_dashboard_metrics():
+    """The current snapshot, computing (and caching) it on a miss."""
+    metrics = cache.get(ADMIN_METRICS_NAMESPACE, SNAPSHOT_KEY)
+    return metrics if metrics is not None else refresh_dashboard_metrics()
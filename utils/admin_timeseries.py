@@ -0,0 +1,216 @@
+# utils/admin_timeseries.py
+"""
+Admin booking / revenue time series.
+
+Bookings are aggregated in SQL into IST day, week or month buckets, optionally
+split by car city, fuel type or host. Every metric is dated by its own event
+so a bucket that has ended never changes:
+
+- bookings:       bookings created in the bucket (created_at)
+- paid_bookings,
+  gmv:            bookings paid in the bucket (payment_date) and their value;
+                  a paid extension adds its price to gmv on extension_payment_date
+                  (mark_extension_paid() folds it into total_price, which is
+                  netted out of the original payment)
+- cancellations,
+  refunds:        bookings cancelled in the bucket (cancelled_at) and amounts refunded
+
+Closed buckets are cached for ADMIN_TIMESERIES_CLOSED_CACHE_SECONDS (rows can
+still be edited after the fact, e.g. a price recomputed on save); only buckets
+that are missing from the cache or still open (contain today) are queried, in
+one UNION ALL round trip over the span they cover.
+"""
+from collections import OrderedDict
+from datetime import datetime, time, timedelta
+
+from flask import current_app
+from sqlalchemy import Date, case, cast, func, literal, select, text, union_all
+
+from models import db
+from models.booking import Booking
+from models.car import Car
+from utils.cache import cache, ADMIN_TIMESERIES_NAMESPACE
+from utils.time_buckets import BUCKETS, bucket_keys, next_bucket_start
+from utils.timezone import get_current_ist_time, ist_to_utc
+
+METRICS = ('bookings', 'paid_bookings', 'gmv', 'cancellations', 'refunds')
+GROUP_COLUMNS = {
+    'city': Car.city,
+    'fuel_type': Car.fuel_type,
+    'host': Car.host_id,
+}
+IST_OFFSET_MINUTES = 330
+MAX_RANGE_DAYS = 1096
+DEFAULT_RANGE_DAYS = 90
+ALL_GROUP = 'all'
+
+
+class TimeSeriesError(ValueError):
+    """Invalid time-series request or unsupported database."""
+
+
+# --- Dialect-specific bucket expressions ---
+def bucket_expression(column, bucket, dialect):
+    """
+    SQL expression for the first IST day of the bucket containing UTC timestamp `column`.
+    Supported dialects: mysql, sqlite, postgresql.
+    """
+    if dialect == 'mysql':
+        local = func.date_add(column, text(f"INTERVAL {IST_OFFSET_MINUTES} MINUTE"))
+        if bucket == 'week':
+            return func.subdate(func.date(local), func.weekday(local))  # WEEKDAY(): Monday = 0
+        if bucket == 'month':
+            return func.date(func.date_format(local, '%Y-%m-01'))
+        return func.date(local)
+    if dialect == 'sqlite':
+        shift = f"+{IST_OFFSET_MINUTES} minutes"
+        if bucket == 'week':
+            return func.date(column, shift, 'weekday 0', '-6 days')  # Following Sunday, back to Monday
+        if bucket == 'month':
+            return func.date(column, shift, 'start of month')
+        return func.date(column, shift)
+    if dialect == 'postgresql':
+        local = column + text(f"INTERVAL '{IST_OFFSET_MINUTES} minutes'")
+        return cast(func.date_trunc(bucket, local), Date)  # date_trunc('week') starts on Monday
+    raise TimeSeriesError(f"Time series are not supported on the '{dialect}' database.")
+# --- End Bucket Expressions ---
+
+
+def _as_date(value):
+    """Bucket keys come back as date (MySQL/PostgreSQL) or 'YYYY-MM-DD' text (SQLite)."""
+    return datetime.strptime(value, '%Y-%m-%d').date() if isinstance(value, str) else value
+
+
+def _utc_bound(day):
+    return ist_to_utc(datetime.combine(day, time.min)).replace(tzinfo=None)
+
+
+def _query_buckets(start_day, end_day, bucket, group_by):
+    """
+    Aggregate [start_day, end_day] (whole buckets, IST) in one round trip.
+    Returns:
+        dict: {bucket_start: {group: {metric: value}}}
+    """
+    dialect = db.engine.dialect.name
+    lower, upper = _utc_bound(start_day), _utc_bound(end_day + timedelta(days=1))
+    group_column = GROUP_COLUMNS[group_by] if group_by else literal(ALL_GROUP)
+
+    def branch(event_column, condition, **values):
+        columns = [
+            bucket_expression(event_column, bucket, dialect).label('bucket'),
+            group_column.label('grp'),
+        ] + [
+            (values.get(name, literal(0))).label(name) for name in METRICS
+        ]
+        return (
+            select(*columns)
+            .select_from(Booking)
+            .join(Car, Booking.car_id == Car.id)
+            .where(event_column >= lower, event_column < upper, *condition)
+        )
+
+    extension_price = func.coalesce(Booking.extension_additional_price, 0)
+    initial_price = case(
+        (Booking.extension_payment_status == 'completed', Booking.total_price - extension_price),
+        else_=Booking.total_price,
+    )
+    events = union_all(
+        branch(Booking.created_at, (), bookings=literal(1)),
+        branch(Booking.payment_date, (Booking.payment_status == 'completed',),
+               paid_bookings=literal(1), gmv=func.coalesce(initial_price, 0)),
+        branch(Booking.extension_payment_date, (Booking.extension_payment_status == 'completed',),
+               gmv=extension_price),
+        branch(Booking.cancelled_at, (Booking.status == 'cancelled',),
+               cancellations=literal(1), refunds=func.coalesce(Booking.refund_amount, 0)),
+    ).subquery()
+
+    rows = db.session.execute(
+        select(events.c.bucket, events.c.grp, *[func.sum(events.c[name]).label(name) for name in METRICS])
+        .group_by(events.c.bucket, events.c.grp)
+    ).all()
+
+    result = {}
+    for row in rows:
+        group = 'unknown' if row.grp is None else str(row.grp)  # Cars without a city / fuel type
+        result.setdefault(_as_date(row.bucket), {})[group] = {
+            name: round(float(getattr(row, name) or 0), 2) if name in ('gmv', 'refunds') else int(getattr(row, name) or 0)
+            for name in METRICS
+        }
+    return result
+
+
+def get_booking_timeseries(start_day, end_day, bucket='day', group_by=None):
+    """
+    Booking and revenue series for IST days start_day..end_day.
+
+    Args:
+        bucket (str): 'day', 'week' or 'month'.
+        group_by (str, optional): 'city', 'fuel_type' or 'host'.
+    Returns:
+        dict: 'series' with one entry per bucket: period, totals and per-group metrics.
+    """
+    if bucket not in BUCKETS:
+        raise TimeSeriesError(f"Bucket must be one of: {', '.join(BUCKETS)}.")
+    if group_by and group_by not in GROUP_COLUMNS:
+        raise TimeSeriesError(f"group_by must be one of: {', '.join(GROUP_COLUMNS)}.")
+
+    today = get_current_ist_time().date()
+    keys = bucket_keys(start_day, end_day, bucket)
+    buckets = OrderedDict()
+    to_query = []
+    for key in keys:
+        closed = next_bucket_start(key, bucket) <= today
+        cached = cache.get(ADMIN_TIMESERIES_NAMESPACE, (bucket, group_by, key)) if closed else None
+        buckets[key] = cached
+        if cached is None:
+            to_query.append(key)
+
+    if to_query:
+        # One query over the span of everything missing (usually just the open bucket)
+        fresh = _query_buckets(to_query[0], next_bucket_start(to_query[-1], bucket) - timedelta(days=1),
+                               bucket, group_by)
+        for key in to_query:
+            buckets[key] = fresh.get(key, {})
+            if next_bucket_start(key, bucket) <= today:
+                cache.set(ADMIN_TIMESERIES_NAMESPACE, (bucket, group_by, key), buckets[key],
+                          ttl=current_app.config['ADMIN_TIMESERIES_CLOSED_CACHE_SECONDS'])
+
+    series = []
+    for key, groups in buckets.items():
+        totals = dict.fromkeys(METRICS, 0)
+        for metrics in groups.values():
+            for name in METRICS:
+                totals[name] += metrics[name]
+        series.append({
+            'period': key.isoformat(),
+            'closed': next_bucket_start(key, bucket) <= today,
+            'totals': {name: round(value, 2) for name, value in totals.items()},
+            'groups': groups if group_by else {},
+        })
+    return {
+        'start': start_day.isoformat(),
+        'end': end_day.isoformat(),
+        'bucket': bucket,
+        'group_by': group_by,
+        'series': series,
+    }
+
+
+def parse_timeseries_args(args, today):
+    """
+    Parse start/end ('YYYY-MM-DD', inclusive), bucket and group_by from request args.
+    Defaults to the last 90 days in daily buckets, ungrouped.
+    Raises:
+        TimeSeriesError: Malformed or oversized range.
+    """
+    try:
+        end_day = datetime.strptime(args['end'], '%Y-%m-%d').date() if args.get('end') else today
+        start_day = (datetime.strptime(args['start'], '%Y-%m-%d').date() if args.get('start')
+                     else end_day - timedelta(days=DEFAULT_RANGE_DAYS - 1))
+    except ValueError:
+        raise TimeSeriesError("Dates must be in YYYY-MM-DD format.")
+    if start_day > end_day:
+        raise TimeSeriesError("Start date must be on or before end date.")
+    if (end_day - start_day).days >= MAX_RANGE_DAYS:
+        raise TimeSeriesError(f"Range cannot exceed {MAX_RANGE_DAYS} days.")
+    return start_day, end_day, args.get('bucket', 'day').lower(), (args.get('group_by') or '').lower() or None
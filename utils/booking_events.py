@@ -0,0 +1,38 @@
+# utils/booking_events.py
+"""
+Live booking updates: when a booking's status or extension status changes,
+push a 'booking' event to the renter ('user:<id>') and to the host of the car
+('host:<id>') once the transaction commits (utils/realtime.py).
+"""
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import object_session
+
+from models.booking import Booking
+from models.car import Car
+from utils.realtime import queue_event
+
+WATCHED_FIELDS = ('status', 'extension_status', 'payment_status')
+
+
+@event.listens_for(Booking, 'after_update')
+def _queue_booking_event(mapper, connection, target):
+    state = inspect(target)
+    changed = [name for name in WATCHED_FIELDS if state.attrs[name].history.has_changes()]
+    session = object_session(target)
+    if not changed or session is None:
+        return
+    data = {
+        'booking_id': target.id,
+        'status': target.status,
+        'extension_status': target.extension_status,
+        'payment_status': target.payment_status,
+        'changed': changed,
+    }
+    queue_event(session, f"user:{target.user_id}", 'booking', data)
+    car = state.dict.get('car')
+    if car is not None:
+        host_id = car.host_id
+    else:  # No lazy load inside the flush: one primary-key read on the flush's own connection
+        host_id = connection.execute(select(Car.host_id).where(Car.id == target.car_id)).scalar()
+    if host_id:
+        queue_event(session, f"host:{host_id}", 'booking', data)
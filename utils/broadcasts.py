@@ -0,0 +1,67 @@
+# utils/broadcasts.py
+"""
+Broadcast targeting and creation, shared by the admin routes and the fan-out
+job (tasks/broadcasts.py).
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, exists, func
+
+from models import db
+from models.booking import Booking
+from models.broadcast import Broadcast, BROADCAST_SEGMENTS
+from models.car import Car
+from models.user import User
+
+
+class BroadcastError(ValueError):
+    """Invalid broadcast request."""
+
+
+def segment_filter(segment, segment_value):
+    """
+    WHERE clause on users for a segment.
+    Raises:
+        BroadcastError: Unknown segment or missing / malformed value.
+    """
+    active = User.is_active == True
+    if segment == 'all':
+        return active
+    if segment == 'city':
+        if not segment_value:
+            raise BroadcastError("A city is required for the 'city' segment.")
+        # Users who have booked a car in the city
+        return and_(active, exists().where(
+            Booking.user_id == User.id, Booking.car_id == Car.id, func.lower(Car.city) == segment_value.lower()
+        ))
+    if segment == 'recent_bookers':
+        try:
+            days = int(segment_value or 30)
+        except ValueError:
+            raise BroadcastError("Days must be a whole number for the 'recent_bookers' segment.")
+        if days <= 0:
+            raise BroadcastError("Days must be positive for the 'recent_bookers' segment.")
+        since = datetime.utcnow() - timedelta(days=days)
+        return and_(active, exists().where(Booking.user_id == User.id, Booking.created_at >= since))
+    raise BroadcastError(f"Segment must be one of: {', '.join(BROADCAST_SEGMENTS)}.")
+
+
+def create_broadcast(message, segment='all', segment_value=None, admin_id=None):
+    """
+    Validate and queue a broadcast; the scheduler (or `flask broadcast-run`) fans it out.
+    The caller commits.
+    Returns:
+        Broadcast: The queued broadcast.
+    """
+    message = (message or '').strip()
+    if not message:
+        raise BroadcastError("Message cannot be empty.")
+    segment_filter(segment, segment_value)  # Validate before queueing
+    broadcast = Broadcast(
+        message=message[:255],
+        segment=segment,
+        segment_value=(segment_value or None),
+        created_by_admin_id=admin_id,
+    )
+    db.session.add(broadcast)
+    return broadcast
@@ -0,0 +1,104 @@
+# utils/cache.py
+"""
+Small in-process cache used to keep hot read paths (availability checks,
+dashboard counters, etc.) off the database.
+
+Entries live in named namespaces so a write path can drop everything it has
+made stale (e.g. all availability entries for one car) without knowing the
+exact keys readers used.
+"""
+import threading
+import time
+
+
+class SimpleCache:
+    """
+    Thread-safe TTL cache keyed by (namespace, key).
+    Not shared across worker processes - each worker keeps its own copy.
+    """
+
+    def __init__(self, default_ttl=300):
+        self.default_ttl = default_ttl
+        self._data = {}  # {namespace: {key: (expires_at, value)}}
+        self._lock = threading.Lock()
+
+    def get(self, namespace, key, default=None):
+        """
+        Get a cached value.
+        Args:
+            namespace (str): Cache namespace (e.g. 'car_availability').
+            key: Hashable key inside the namespace.
+            default: Value returned on a miss or an expired entry.
+        Returns:
+            The cached value or `default`.
+        """
+        with self._lock:
+            entry = self._data.get(namespace, {}).get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[namespace][key]
+                return default
+            return value
+
+    def set(self, namespace, key, value, ttl=None):
+        """
+        Store a value. `ttl=0` stores it without expiry.
+        """
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data.setdefault(namespace, {})[key] = (expires_at, value)
+
+    def invalidate(self, namespace, key=None):
+        """
+        Drop one key, or the whole namespace when `key` is None.
+        """
+        with self._lock:
+            if key is None:
+                self._data.pop(namespace, None)
+            else:
+                self._data.get(namespace, {}).pop(key, None)
+
+    def invalidate_where(self, namespace, predicate):
+        """
+        Drop every key in a namespace for which `predicate(key)` is true.
+        Useful for composite keys such as (car_id, start, end).
+        """
+        with self._lock:
+            entries = self._data.get(namespace)
+            if not entries:
+                return
+            for key in [k for k in entries if predicate(k)]:
+                del entries[key]
+
+
+# Shared instance for the whole process
+cache = SimpleCache()
+
+# --- Namespaces ---
+CAR_AVAILABILITY_NAMESPACE = 'car_availability'
+ADMIN_METRICS_NAMESPACE = 'admin_metrics'  # Dashboard snapshot, see utils/admin_metrics.py
+ADMIN_TIMESERIES_NAMESPACE = 'admin_timeseries'  # Closed buckets only (ADMIN_TIMESERIES_CLOSED_CACHE_SECONDS)
+HOST_STATS_NAMESPACE = 'host_stats'  # host_id -> booking counters, see utils/host_stats.py
+SEARCH_SUPPLY_NAMESPACE = 'search_supply'  # cell size -> {geo cell: available cars}
+HOST_OCCUPANCY_NAMESPACE = 'host_occupancy'  # (host_id, week_start) -> utils/occupancy.py result
+UNREAD_NOTIFICATIONS_NAMESPACE = 'unread_notifications'  # user_id -> unread count, see utils/notification_counters.py
+# --- End Namespaces ---
+
+
+def invalidate_car_availability(car_ids):
+    """
+    Drop cached availability for the given cars.
+    Keys in the availability namespace are either a car_id or a tuple starting with car_id.
+    Args:
+        car_ids (iterable[int]): IDs of cars whose bookings changed.
+    """
+    car_ids = set(car_ids)
+    if not car_ids:
+        return
+    cache.invalidate_where(
+        CAR_AVAILABILITY_NAMESPACE,
+        lambda key: (key[0] if isinstance(key, tuple) else key) in car_ids
+    )
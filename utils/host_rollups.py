@@ -0,0 +1,87 @@
+# utils/host_rollups.py
+"""
+Incremental maintenance of the daily host earnings rollups (models/host_earnings.py).
+
+booking_rollup_delta() is the single definition of what a booking contributes
+to the rollups; both the status-transition hooks and the backfill job
+(tasks/rollups.py) use it, so a backfill reproduces exactly what the hooks wrote.
+"""
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+
+from models import db
+from models.host_earnings import HostDailyEarnings
+from utils.timezone import db_utc_to_ist
+
+ROLLUP_COUNTERS = ('bookings', 'hours_booked', 'gross', 'host_share', 'cancellations', 'refunds')
+HOST_SHARE_RATE = 0.9  # Matches Booking.complete_trip / the ledger split
+COUNTED_CANCELLATIONS = ('user', 'host')  # Expired unpaid holds ('system') are not cancellations
+
+
+def rollup_day(dt):
+    """IST calendar day of a naive UTC datetime from the database (e.g. cancelled_at)."""
+    return db_utc_to_ist(dt).date()
+
+
+def booking_rollup_delta(booking):
+    """
+    What a completed or cancelled booking adds to its (host, car, day) rollup.
+    Accepts a Booking or any row with the same attribute names.
+    Returns:
+        tuple: (day, {counter: amount}), or None if the booking does not count.
+    """
+    if booking.status == 'completed' and booking.end_date:
+        gross = booking.total_price or 0.0
+        hours = (booking.end_date - booking.start_date).total_seconds() / 3600
+        return booking.end_date.date(), {  # Booking dates are already naive IST
+            'bookings': 1,
+            'hours_booked': round(hours, 2),
+            'gross': round(gross, 2),
+            'host_share': round(gross * HOST_SHARE_RATE, 2),
+        }
+    if booking.status == 'cancelled' and booking.cancelled_by in COUNTED_CANCELLATIONS and booking.cancelled_at:
+        return rollup_day(booking.cancelled_at), {
+            'cancellations': 1,
+            'host_share': round(booking.cancellation_fee_deducted or 0.0, 2),  # Fee kept by the host
+            'refunds': round(booking.refund_amount or 0.0, 2),
+        }
+    return None
+
+
+def apply_rollup_delta(host_id, car_id, day, counters):
+    """
+    Add `counters` to the (host, car, day) row in the current transaction,
+    creating the row on first use. The increment is done in SQL, so concurrent
+    transitions on the same day cannot overwrite each other.
+    """
+    key = (
+        HostDailyEarnings.host_id == host_id,
+        HostDailyEarnings.car_id == car_id,
+        HostDailyEarnings.day == day,
+    )
+    increment = (
+        update(HostDailyEarnings)
+        .where(*key)
+        .values({getattr(HostDailyEarnings, name): getattr(HostDailyEarnings, name) + amount
+                 for name, amount in counters.items()})
+        .execution_options(synchronize_session=False)
+    )
+    if db.session.execute(increment).rowcount:
+        return
+    try:
+        # Savepoint: losing the creation race must not roll back the caller's work
+        with db.session.begin_nested():
+            db.session.execute(insert(HostDailyEarnings).values(
+                host_id=host_id, car_id=car_id, day=day,
+                **{name: counters.get(name, 0) for name in ROLLUP_COUNTERS}
+            ))
+    except IntegrityError:
+        db.session.execute(increment)
+
+
+def record_booking_rollup(booking, host_id):
+    """Hook for booking status transitions (completion, cancellation)."""
+    delta = booking_rollup_delta(booking)
+    if delta is not None and host_id is not None:
+        day, counters = delta
+        apply_rollup_delta(host_id, booking.car_id, day, counters)
@@ -0,0 +1,109 @@
+# utils/host_stats.py
+"""
+Per-host booking counters for the host dashboard and navigation badges.
+
+All booking status counts come from one GROUP BY status query over the host's
+cars (cars.host_id -> bookings (car_id, status) index) and are memoized per
+host. Booking and car row changes queue their host for invalidation and the
+entries are dropped once the transaction commits, so a reader can never
+re-cache the pre-commit numbers. Bulk UPDATEs that bypass the ORM call
+invalidate_host_stats() themselves. The cache is per process, so another
+worker only sees a change once its entry expires (HOST_STATS_CACHE_SECONDS).
+"""
+from flask import current_app
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.orm import Session
+
+from models import db
+from models.booking import Booking
+from models.car import Car
+from utils.cache import cache, HOST_STATS_NAMESPACE
+
+PENDING_INVALIDATIONS_KEY = 'host_stats_invalidations'
+
+
+def get_host_stats(host_id):
+    """
+    Memoized counters for one host.
+    Returns:
+        dict: 'total_cars', 'by_status' ({status: count}), 'total_bookings' and the
+        dashboard shortcuts 'pending' and 'active'.
+    """
+    stats = cache.get(HOST_STATS_NAMESPACE, host_id)
+    if stats is not None:
+        return stats
+
+    by_status = dict(db.session.execute(
+        select(Booking.status, func.count(Booking.id))
+        .join(Car, Booking.car_id == Car.id)
+        .where(Car.host_id == host_id)
+        .group_by(Booking.status)
+    ).all())
+    total_cars = db.session.execute(
+        select(func.count(Car.id)).where(Car.host_id == host_id)
+    ).scalar()
+
+    stats = {
+        'total_cars': total_cars,
+        'by_status': by_status,
+        'total_bookings': sum(by_status.values()),
+        'pending': by_status.get('pending', 0),
+        'active': by_status.get('active', 0),
+    }
+    cache.set(HOST_STATS_NAMESPACE, host_id, stats, ttl=current_app.config['HOST_STATS_CACHE_SECONDS'])
+    return stats
+
+
+def invalidate_host_stats(host_ids):
+    """Drop memoized counters for the given hosts now."""
+    for host_id in set(host_ids):
+        cache.invalidate(HOST_STATS_NAMESPACE, host_id)
+
+
+def invalidate_host_stats_for_cars(car_ids):
+    """Drop memoized counters for the hosts owning the given cars."""
+    car_ids = set(car_ids)
+    if car_ids:
+        invalidate_host_stats(db.session.execute(
+            select(Car.host_id).where(Car.id.in_(car_ids)).distinct()
+        ).scalars())
+
+
+def queue_host_stats_invalidation(session, host_id):
+    """Invalidate `host_id` when `session` commits."""
+    session.info.setdefault(PENDING_INVALIDATIONS_KEY, set()).add(host_id)
+
+
+# --- Mapper Hooks: queue the owning host on every booking / car row change ---
+@event.listens_for(Booking, 'after_insert')
+@event.listens_for(Booking, 'after_update')
+@event.listens_for(Booking, 'after_delete')
+def _queue_booking_host(mapper, connection, target):
+    state = inspect(target)
+    car = state.dict.get('car')  # Already loaded by most transitions; avoids a lookup per flush
+    if car is not None and car.id == target.car_id:
+        host_id = car.host_id
+    else:
+        host_id = connection.execute(select(Car.host_id).where(Car.id == target.car_id)).scalar()
+    if host_id is not None and state.session is not None:
+        queue_host_stats_invalidation(state.session, host_id)
+
+
+@event.listens_for(Car, 'after_insert')
+@event.listens_for(Car, 'after_delete')
+def _queue_car_host(mapper, connection, target):
+    session = inspect(target).session
+    if session is not None:
+        queue_host_stats_invalidation(session, target.host_id)
+# --- End Mapper Hooks ---
+
+
+# --- Session Hook ---
+# Queued hosts survive a rollback and are invalidated on the next commit instead:
+# a spurious invalidation only costs one recount.
+@event.listens_for(Session, 'after_commit')
+def _flush_host_stats_invalidations(session):
+    host_ids = session.info.pop(PENDING_INVALIDATIONS_KEY, None)
+    if host_ids:
+        invalidate_host_stats(host_ids)
+# --- End Session Hook ---
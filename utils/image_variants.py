@@ -0,0 +1,122 @@
+# utils/image_variants.py
+"""
+Resized variants (derivatives) of uploaded images.
+
+For every image blob (utils/upload_store.py) the worker in tasks/images.py
+renders each variant in IMAGE_VARIANTS, as both WebP and JPEG, next to the
+originals:
+    static/uploads/derived/ab/cd/<hash>_<variant>.<webp|jpg>
+Orientation is applied from the EXIF tag and all metadata (EXIF, GPS) is
+dropped, so phone photos no longer leak their location.
+
+Templates call image_url(filename, variant). It returns the variant in WebP
+when the browser advertises it (JPEG otherwise), and the original upload
+until the variant has been rendered, or for legacy flat uploads.
+"""
+import os
+import threading
+import time
+
+from flask import request, url_for
+
+from utils.upload_store import IMAGE_UPLOAD_EXTENSIONS, is_blob_key, upload_path
+
+# name -> (mode, (width, height)); 'cover' crops to exactly that size, 'contain' fits inside it
+IMAGE_VARIANTS = {
+    'thumb': ('cover', (480, 320)),  # Car cards and gallery strips
+    'medium': ('contain', (1280, 1280)),  # Carousels and detail pages
+}
+IMAGE_FORMATS = ('webp', 'jpg')
+
+# Derivative key -> expiry (monotonic). Derivatives only disappear when their blob is collected,
+# so a short memo saves a stat() per image per page without going stale for long.
+_rendered = {}
+_rendered_lock = threading.Lock()
+RENDERED_MEMO_SECONDS = 300
+RENDERED_MEMO_LIMIT = 50000
+
+
+def is_image_key(key):
+    return os.path.splitext(key or '')[1].lower() in IMAGE_UPLOAD_EXTENSIONS
+
+
+def derivative_key(key, variant, fmt):
+    """'ab/cd/<hash>.jpg' -> 'derived/ab/cd/<hash>_thumb.webp'"""
+    stem = os.path.splitext(key)[0]
+    return f"derived/{stem}_{variant}.{fmt}"
+
+
+def derivative_keys(key):
+    """Every derivative a blob can have (for rendering and for garbage collection)."""
+    return [derivative_key(key, variant, fmt) for variant in IMAGE_VARIANTS for fmt in IMAGE_FORMATS]
+
+
+def render_derivatives(source_path, targets, jpeg_quality=82, webp_quality=80):
+    """
+    Render variants of one image. Runs on worker threads: no app context, no database.
+    Pillow releases the GIL while decoding, resizing and encoding, so threads run in parallel.
+    Args:
+        source_path (str): Original file.
+        targets (list): (variant, fmt, output path) tuples.
+    """
+    from PIL import Image, ImageOps  # Optional dependency, only needed by the derivative worker
+
+    with Image.open(source_path) as original:
+        original.draft('RGB', (2560, 2560))  # Lets JPEG decode at a reduced scale when it is much larger
+        image = ImageOps.exif_transpose(original)  # Apply the EXIF orientation; the saved copies carry no EXIF
+        if image.mode not in ('RGB', 'L'):
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            rgba = image.convert('RGBA')
+            background.paste(rgba, mask=rgba.getchannel('A'))
+            image = background
+        image = image.convert('RGB')
+
+        for variant, fmt, output_path in targets:
+            mode, size = IMAGE_VARIANTS[variant]
+            if mode == 'cover':
+                resized = ImageOps.fit(image, size, method=Image.LANCZOS)
+            else:
+                resized = image.copy()
+                resized.thumbnail(size, Image.LANCZOS)  # Never upscales
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            tmp_path = output_path + '.part'
+            if fmt == 'webp':
+                resized.save(tmp_path, 'WEBP', quality=webp_quality, method=4)
+            else:
+                resized.save(tmp_path, 'JPEG', quality=jpeg_quality, optimize=True, progressive=True)
+            os.replace(tmp_path, output_path)  # Readers never see a half-written file
+
+
+def _is_rendered(derived):
+    now = time.monotonic()
+    if _rendered.get(derived, 0) > now:
+        return True
+    if not os.path.exists(upload_path(derived)):
+        return False
+    with _rendered_lock:
+        if len(_rendered) >= RENDERED_MEMO_LIMIT:
+            _rendered.clear()
+        _rendered[derived] = now + RENDERED_MEMO_SECONDS
+    return True
+
+
+def forget_rendered(key):
+    """Drop this process's memo of a blob's derivatives (the collector calls it; other workers expire theirs)."""
+    with _rendered_lock:
+        for derived in derivative_keys(key):
+            _rendered.pop(derived, None)
+
+
+def image_url(filename, variant='medium'):
+    """
+    URL of an uploaded image for templates: the rendered variant if it exists, else the original.
+    Usage: {{ image_url(car.images[0].filename, 'thumb') }}
+    """
+    original = url_for('static', filename='uploads/' + filename)
+    if variant not in IMAGE_VARIANTS or not is_blob_key(filename) or not is_image_key(filename):
+        return original
+    fmt = 'webp' if 'image/webp' in request.accept_mimetypes.values() else 'jpg'
+    derived = derivative_key(filename, variant, fmt)
+    if not _is_rendered(derived):
+        return original
+    return url_for('static', filename='uploads/' + derived)
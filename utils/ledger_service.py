@@ -0,0 +1,269 @@
+# utils/ledger_service.py
+"""
+Posting and querying the double-entry ledger (models/ledger.py).
+
+post_entry() writes one balanced entry inside the caller's transaction (no
+commit), next to the wallet/booking change it describes. The record_* helpers
+encode the platform's money flows:
+
+    booking paid         gateway -P            escrow +P
+    trip completed       escrow  -P            host +90%       platform +10%
+    user cancellation    escrow  -P            host +fee       gateway +refund
+    host cancellation    escrow  -P            gateway +P
+    wallet transaction   user ±A               platform/gateway ∓A
+    host payout batch    hosts -A each         gateway +total
+"""
+from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
+
+from sqlalchemy import event, func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models import db
+from models.ledger import LedgerAccount, LedgerBalanceSnapshot, LedgerEntry, LedgerPosting
+from utils.cache import cache
+
+LEDGER_ACCOUNTS_NAMESPACE = 'ledger_accounts'
+PENDING_ACCOUNTS_KEY = 'ledger_pending_accounts'  # session.info: accounts created by the open transaction
+
+# --- Account Types ---
+PLATFORM = 'platform'
+ESCROW = 'escrow'
+GATEWAY = 'gateway'
+HOST = 'host'
+USER = 'user'
+PLATFORM_OWNER_ID = 0  # owner_id of the platform/escrow/gateway accounts (not NULL, so the unique key holds)
+# --- End Account Types ---
+
+HOST_SHARE = Decimal('0.90')  # Matches Booking.complete_trip
+
+# Counterparty of each wallet transaction type (the user account takes the other side)
+WALLET_COUNTERPARTIES = {
+    'deposit': GATEWAY,
+    'withdrawal': GATEWAY,
+    'refund': PLATFORM,
+    'bonus': PLATFORM,
+    'earning': PLATFORM,
+    'deduction': PLATFORM,
+    'penalty': PLATFORM,
+}
+
+
+class LedgerError(ValueError):
+    """Unbalanced or otherwise invalid ledger entry."""
+
+
+def _money(amount):
+    return Decimal(str(amount or 0)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+# --- Accounts ---
+def get_account_id(account_type, owner_id=PLATFORM_OWNER_ID):
+    """
+    Return the id of the (account_type, owner_id) account, creating it on first use.
+    Ids are cached per process (accounts are never deleted), but an account created
+    by this transaction only once it commits: a rollback takes the row with it.
+    """
+    key = (account_type, owner_id)
+    account_id = cache.get(LEDGER_ACCOUNTS_NAMESPACE, key)
+    if account_id is not None:
+        return account_id
+    created = db.session.info.get(PENDING_ACCOUNTS_KEY, {})
+    if key in created:
+        return created[key]
+
+    account_query = select(LedgerAccount.id).where(
+        LedgerAccount.account_type == account_type, LedgerAccount.owner_id == owner_id
+    )
+    account_id = db.session.execute(account_query).scalar()
+    if account_id is None:
+        name = f"{account_type.title()} #{owner_id}" if owner_id else account_type.title()
+        try:
+            # Savepoint: losing a creation race must not roll back the caller's work
+            with db.session.begin_nested():
+                account = LedgerAccount(account_type=account_type, owner_id=owner_id, name=name)
+                db.session.add(account)
+            db.session.info.setdefault(PENDING_ACCOUNTS_KEY, {})[key] = account.id
+            return account.id
+        except IntegrityError:
+            account_id = db.session.execute(account_query).scalar_one()
+
+    cache.set(LEDGER_ACCOUNTS_NAMESPACE, key, account_id, ttl=0)
+    return account_id
+
+
+@event.listens_for(Session, 'after_commit')
+def _cache_created_accounts(session):
+    for key, account_id in (session.info.pop(PENDING_ACCOUNTS_KEY, None) or {}).items():
+        cache.set(LEDGER_ACCOUNTS_NAMESPACE, key, account_id, ttl=0)
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _discard_created_accounts(session, transaction):
+    if transaction.parent is None:
+        session.info.pop(PENDING_ACCOUNTS_KEY, None)
+# --- End Accounts ---
+
+
+# --- Posting ---
+def post_entry(entry_type, description, legs, reference_id=None, reference_type=None):
+    """
+    Add one balanced entry to the session (the caller commits).
+
+    Args:
+        entry_type (str): e.g. 'trip_completion'.
+        description (str): Human-readable description.
+        legs (list[tuple]): ((account_type, owner_id), amount) pairs; amounts must sum to zero.
+            Zero-amount legs are dropped.
+    Returns:
+        LedgerEntry: The entry (None if every leg was zero).
+    Raises:
+        LedgerError: Legs do not balance.
+    """
+    legs = [(account, _money(amount)) for account, amount in legs]
+    legs = [(account, amount) for account, amount in legs if amount != 0]
+    if not legs:
+        return None
+    if sum(amount for _, amount in legs) != 0:
+        raise LedgerError(f"Unbalanced ledger entry '{entry_type}': {legs}")
+
+    now = datetime.utcnow()
+    entry = LedgerEntry(
+        entry_type=entry_type,
+        description=description[:255],
+        reference_id=reference_id,
+        reference_type=reference_type,
+        created_at=now
+    )
+    db.session.add(entry)
+    for (account_type, owner_id), amount in legs:
+        entry.postings.append(LedgerPosting(
+            account_id=get_account_id(account_type, owner_id),
+            amount=amount,
+            created_at=now
+        ))
+    return entry
+
+
+def record_booking_payment(booking, amount, extension=False):
+    """Gateway payment for a booking (or its extension) goes into escrow."""
+    label = "Extension payment" if extension else "Payment"
+    return post_entry(
+        'extension_payment' if extension else 'booking_payment',
+        f"{label} for Booking #{booking.id}",
+        [((GATEWAY, PLATFORM_OWNER_ID), -_money(amount)), ((ESCROW, PLATFORM_OWNER_ID), _money(amount))],
+        reference_id=booking.id, reference_type='booking'
+    )
+
+
+def escrow_held(booking_id):
+    """Amount currently held in escrow for a booking (payments in minus releases)."""
+    return _money(db.session.execute(
+        select(func.coalesce(func.sum(LedgerPosting.amount), 0))
+        .join(LedgerEntry, LedgerPosting.entry_id == LedgerEntry.id)
+        .where(LedgerEntry.reference_type == 'booking',
+               LedgerEntry.reference_id == booking_id,
+               LedgerPosting.account_id == get_account_id(ESCROW))
+    ).scalar())
+
+
+def record_trip_completion(booking, host_id):
+    """
+    Release escrow: the host's share to the host, the rest (the platform commission) to the platform.
+    Bookings paid before the ledger existed have nothing in escrow; their total_price
+    is taken straight from the gateway account instead.
+    Returns:
+        Decimal: The host's share.
+    """
+    gross = escrow_held(booking.id)
+    source = ESCROW
+    if gross <= 0:
+        gross = _money(booking.total_price)
+        source = GATEWAY
+    host_share = _money(gross * HOST_SHARE)
+    post_entry(
+        'trip_completion',
+        f"Earnings split for Booking #{booking.id}",
+        [
+            ((source, PLATFORM_OWNER_ID), -gross),
+            ((HOST, host_id), host_share),
+            ((PLATFORM, PLATFORM_OWNER_ID), gross - host_share),
+        ],
+        reference_id=booking.id, reference_type='booking'
+    )
+    return host_share
+
+
+def record_booking_cancellation(booking, host_id, host_fee, refund, cancelled_by):
+    """Release escrow on cancellation: any fee kept by the host, the refund back through the gateway."""
+    fee_account = (HOST, host_id) if host_id is not None else (PLATFORM, PLATFORM_OWNER_ID)
+    source = ESCROW if escrow_held(booking.id) > 0 else GATEWAY  # Paid before the ledger existed
+    legs = [
+        ((source, PLATFORM_OWNER_ID), -(_money(host_fee) + _money(refund))),
+        ((GATEWAY, PLATFORM_OWNER_ID), _money(refund)),
+        (fee_account, _money(host_fee)),
+    ]
+    return post_entry(
+        f"{cancelled_by}_cancellation",
+        f"Cancellation of Booking #{booking.id} by {cancelled_by}",
+        legs,
+        reference_id=booking.id, reference_type='booking'
+    )
+
+
+def record_wallet_transaction(transaction, delta):
+    """Mirror a user WalletTransaction: the user account moves by `delta`, its counterparty by -delta."""
+    counterparty = WALLET_COUNTERPARTIES.get(transaction.transaction_type, PLATFORM)
+    return post_entry(
+        f"wallet_{transaction.transaction_type}",
+        transaction.description,
+        [((USER, transaction.user_id), _money(delta)), ((counterparty, PLATFORM_OWNER_ID), -_money(delta))],
+        reference_id=transaction.reference_id, reference_type=transaction.reference_type
+    )
+
+
+def record_host_payouts(entry_type, description, host_amounts, reference_id):
+    """
+    Host wallets paid out to bank accounts in one entry: each host -amount, gateway +total.
+    Pass negative amounts to reverse failed payouts.
+    Args:
+        host_amounts (dict): {host_id: amount}.
+        reference_id (int): payout_batches.id.
+    """
+    legs = [((HOST, host_id), -_money(amount)) for host_id, amount in host_amounts.items()]
+    legs.append(((GATEWAY, PLATFORM_OWNER_ID), sum(_money(amount) for amount in host_amounts.values())))
+    return post_entry(entry_type, description, legs, reference_id=reference_id, reference_type='payout_batch')
+# --- End Posting ---
+
+
+# --- Balances ---
+def balance_as_of(account_id, as_of=None):
+    """
+    Balance of an account at `as_of` (default: now): nearest snapshot at or before
+    `as_of` plus the postings after it, instead of summing the full history.
+    Returns:
+        Decimal
+    """
+    as_of = as_of or datetime.utcnow()
+    snapshot = db.session.execute(
+        select(LedgerBalanceSnapshot.balance, LedgerBalanceSnapshot.last_posting_id)
+        .where(LedgerBalanceSnapshot.account_id == account_id, LedgerBalanceSnapshot.as_of <= as_of)
+        .order_by(LedgerBalanceSnapshot.as_of.desc())
+        .limit(1)
+    ).first()
+    base, after_id = (snapshot.balance, snapshot.last_posting_id) if snapshot else (Decimal('0'), 0)
+
+    tail = db.session.execute(
+        select(func.coalesce(func.sum(LedgerPosting.amount), 0))
+        .where(LedgerPosting.account_id == account_id,
+               LedgerPosting.id > after_id,
+               LedgerPosting.created_at <= as_of)
+    ).scalar()
+    return _money(base) + _money(tail)
+
+
+def account_balance_as_of(account_type, owner_id=PLATFORM_OWNER_ID, as_of=None):
+    """balance_as_of() by account type/owner, e.g. account_balance_as_of('host', host.id, month_end)."""
+    return balance_as_of(get_account_id(account_type, owner_id), as_of)
+# --- End Balances ---
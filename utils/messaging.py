@@ -0,0 +1,267 @@
+# utils/messaging.py
+"""
+Outbound WhatsApp/SMS messaging.
+
+- enqueue_message() adds a row to the persistent queue (models/outbound_message.py);
+  it is written with the caller's commit and sent later by tasks/messaging.py.
+- One provider per worker process, created on first use and shared by every
+  sender thread (one Twilio client and its HTTP connection pool).
+- A token bucket per provider keeps the send rate under the provider's limit
+  however many sender threads are running.
+- send_batch() runs sends on the shared thread pool and classifies each result:
+  'sent', 'retry' (transient: timeouts, 429, 5xx) or 'dead' (the provider
+  rejected the message, e.g. an invalid number).
+
+Set MESSAGING_PROVIDER=fake to use FakeMessagingProvider, an in-process
+stand-in with configurable latency and failure rates, so dispatch throughput
+can be benchmarked offline (`flask messages-benchmark`).
+"""
+import os
+import random
+import threading
+import time
+import uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from models import db
+from models.outbound_message import OutboundMessage, MESSAGE_CHANNELS
+
+SendResult = namedtuple('SendResult', ['outcome', 'detail'])  # detail: provider message id or error text
+
+
+class MessagingError(Exception):
+    """A send failed and may succeed if retried."""
+
+
+class PermanentMessagingError(MessagingError):
+    """The provider rejected the message; retrying will not help."""
+
+
+# --- Rate Limiting ---
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` tokens per second, at most `burst` saved up.
+    acquire() blocks the calling sender thread until a token is available.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = max(float(burst), 1.0)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)  # Outside the lock so other threads can refill and take tokens
+# --- End Rate Limiting ---
+
+
+def retry_delay(attempts, base_seconds, max_seconds):
+    """Exponential backoff with jitter: about base * 2^(attempts - 1), capped at max_seconds."""
+    delay = min(max_seconds, base_seconds * (2 ** max(attempts - 1, 0)))
+    return delay * random.uniform(0.5, 1.0)  # Spread retries of a failed burst apart
+
+
+# --- Providers ---
+class TwilioMessagingProvider:
+    """Twilio WhatsApp and SMS through one shared REST client."""
+
+    name = 'twilio'
+
+    def __init__(self, account_sid, auth_token, whatsapp_from, sms_from=None, timeout=10):
+        from twilio.base.exceptions import TwilioRestException  # Imported here so the fake provider works without the SDK
+        from twilio.http.http_client import TwilioHttpClient
+        from twilio.rest import Client
+
+        if not account_sid or not auth_token:
+            raise MessagingError("Twilio credentials (TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN) are not set.")
+        # Without a timeout a hung request would hold a sender thread forever
+        self.client = Client(account_sid, auth_token, http_client=TwilioHttpClient(timeout=timeout))
+        self.whatsapp_from = whatsapp_from
+        self.sms_from = sms_from
+        self._rest_error = TwilioRestException
+
+    def send(self, channel, to_number, body):
+        """Send one message and return the provider's message id."""
+        if channel == 'whatsapp':
+            from_, to = self.whatsapp_from, f'whatsapp:{to_number}'
+        else:
+            from_, to = self.sms_from, to_number
+        if not from_:
+            raise PermanentMessagingError(f"No Twilio sender number configured for {channel}.")
+        try:
+            message = self.client.messages.create(body=body, from_=from_, to=to)
+        except self._rest_error as e:
+            status = getattr(e, 'status', None) or 0
+            if status == 429 or status >= 500:
+                raise MessagingError(f"Twilio {status}: {e.msg}") from e
+            raise PermanentMessagingError(f"Twilio {status} (code {e.code}): {e.msg}") from e
+        return message.sid  # Connection errors and timeouts propagate and are retried
+
+
+class FakeMessagingProvider:
+    """
+    In-process stand-in for Twilio. Sleeps `latency_ms` per send and fails a
+    fraction of sends, transiently or permanently, so retry and dead-letter
+    paths can be exercised offline.
+    """
+
+    name = 'fake'
+
+    def __init__(self, latency_ms=0, failure_rate=0.0, permanent_failure_rate=0.0):
+        self.latency_ms = latency_ms
+        self.failure_rate = failure_rate
+        self.permanent_failure_rate = permanent_failure_rate
+        self.sent = []
+        self._lock = threading.Lock()
+
+    def send(self, channel, to_number, body):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000.0)
+        roll = random.random()
+        if roll < self.permanent_failure_rate:
+            raise PermanentMessagingError(f"Simulated rejection of {to_number}")
+        if roll < self.permanent_failure_rate + self.failure_rate:
+            raise MessagingError("Simulated provider timeout")
+        message_id = f"fake_{uuid.uuid4().hex[:16]}"
+        with self._lock:
+            self.sent.append((message_id, channel, to_number))
+        return message_id
+
+
+def create_messaging_provider(name, config):
+    """Build a provider from a Flask config mapping (Twilio credentials come from the environment)."""
+    if name == 'fake':
+        return FakeMessagingProvider(
+            latency_ms=config.get('FAKE_MESSAGING_LATENCY_MS', 0),
+            failure_rate=config.get('FAKE_MESSAGING_FAILURE_RATE', 0.0),
+            permanent_failure_rate=config.get('FAKE_MESSAGING_PERMANENT_FAILURE_RATE', 0.0),
+        )
+    if name == 'twilio':
+        return TwilioMessagingProvider(
+            account_sid=os.getenv('TWILIO_ACCOUNT_SID'),
+            auth_token=os.getenv('TWILIO_AUTH_TOKEN'),
+            whatsapp_from=os.getenv('TWILIO_WHATSAPP_NUMBER'),
+            sms_from=os.getenv('TWILIO_SMS_NUMBER'),
+            timeout=config.get('MESSAGING_HTTP_TIMEOUT_SECONDS', 10),
+        )
+    raise PermanentMessagingError(f"Unknown messaging provider '{name}'.")
+# --- End Providers ---
+
+
+# --- Process-wide Provider, Limiter and Sender Pool ---
+_providers = {}
+_limiters = {}
+_sender_pool = None
+_lock = threading.Lock()
+
+
+def get_messaging_provider(name=None):
+    """
+    The shared provider for this worker (default MESSAGING_PROVIDER), created on first use.
+    Must be called inside an app context.
+    """
+    name = name or current_app.config['MESSAGING_PROVIDER']
+    provider = _providers.get(name)
+    if provider is None:
+        with _lock:
+            provider = _providers.get(name)
+            if provider is None:
+                provider = _providers[name] = create_messaging_provider(name, current_app.config)
+    return provider
+
+
+def get_rate_limiter(name):
+    """The token bucket shared by every sender thread using provider `name`."""
+    limiter = _limiters.get(name)
+    if limiter is None:
+        with _lock:
+            limiter = _limiters.get(name)
+            if limiter is None:
+                limiter = _limiters[name] = TokenBucket(
+                    current_app.config['MESSAGING_RATE_PER_SECOND'], current_app.config['MESSAGING_RATE_BURST']
+                )
+    return limiter
+
+
+def get_sender_pool():
+    """The worker's sender threads (MESSAGING_SENDER_THREADS)."""
+    global _sender_pool
+    if _sender_pool is None:
+        with _lock:
+            if _sender_pool is None:
+                _sender_pool = ThreadPoolExecutor(
+                    max_workers=current_app.config['MESSAGING_SENDER_THREADS'], thread_name_prefix='messaging-sender'
+                )
+    return _sender_pool
+# --- End Process-wide ---
+
+
+def send_batch(messages, provider, limiter, executor):
+    """
+    Send messages concurrently on `executor`, each after taking a token from `limiter`.
+    Sender threads never touch the database.
+    Args:
+        messages (list): (key, channel, to_number, body) tuples.
+    Returns:
+        dict: {key: SendResult('sent' | 'retry' | 'dead', detail)}
+    """
+    def send_one(channel, to_number, body):
+        limiter.acquire()
+        try:
+            return SendResult('sent', provider.send(channel, to_number, body))
+        except PermanentMessagingError as e:
+            return SendResult('dead', str(e))
+        except Exception as e:  # MessagingError, connection errors, timeouts
+            return SendResult('retry', str(e) or e.__class__.__name__)
+
+    futures = {key: executor.submit(send_one, channel, to_number, body) for key, channel, to_number, body in messages}
+    return {key: future.result() for key, future in futures.items()}
+
+
+def enqueue_message(to_number, body, channel='whatsapp', notification_id=None, send_at=None, session=None):
+    """
+    Queue a WhatsApp/SMS message; written when the caller commits.
+    Args:
+        to_number (str): Recipient in E.164 format (e.g. '+919876543210').
+        body (str): Message text.
+        channel (str): 'whatsapp' or 'sms'.
+        send_at (datetime, optional): Earliest send time (UTC); defaults to now.
+    Returns:
+        OutboundMessage: The pending row.
+    """
+    if channel not in MESSAGE_CHANNELS:
+        raise ValueError(f"Unknown messaging channel '{channel}'.")
+    if not to_number or not body or not body.strip():
+        raise ValueError("A recipient number and a message body are required.")
+    session = session if session is not None else db.session()
+    message = OutboundMessage(
+        channel=channel,
+        provider=current_app.config['MESSAGING_PROVIDER'],
+        to_number=to_number,
+        body=body.strip()[:1600],
+        notification_id=notification_id,
+        next_attempt_at=send_at or datetime.utcnow(),
+    )
+    session.add(message)
+    return message
+
+
+def next_attempt_time(attempts, now=None):
+    """When a message that has failed `attempts` times should be tried again."""
+    config = current_app.config
+    delay = retry_delay(attempts, config['MESSAGING_RETRY_BASE_SECONDS'], config['MESSAGING_RETRY_MAX_SECONDS'])
+    return (now or datetime.utcnow()) + timedelta(seconds=delay)
@@ -0,0 +1,163 @@
+# utils/notification_counters.py
+"""
+Per-user unread notification counters (models/notification.NotificationCounter).
+
+Counters change in the same transaction as the notification rows:
+- inserts through the outbox (utils/notification_outbox.py) call increment_unread(),
+- broadcasts call increment_unread_for_users() with their INSERT ... SELECT target,
+- mark_notification_read() / mark_all_notifications_read() flip is_read with a
+  conditional UPDATE and subtract exactly the rows they changed.
+
+get_unread_count() reads one primary-key row and memoizes it briefly; the local
+entry is dropped when a transaction that touched the user commits. The
+reconciliation job (tasks/notification_counters.py) repairs any drift.
+"""
+from collections import defaultdict
+
+from flask import current_app
+from sqlalchemy import case, event, exists, insert, literal, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models import db
+from models.notification import Notification, NotificationCounter
+from utils.cache import cache, UNREAD_NOTIFICATIONS_NAMESPACE
+
+PENDING_INVALIDATIONS_KEY = 'unread_count_invalidations'
+
+
+def _queue_invalidation(session, user_ids):
+    session.info.setdefault(PENDING_INVALIDATIONS_KEY, set()).update(user_ids)
+
+
+def _add_unread(session, user_id, amount):
+    """Add `amount` (may be negative) to one counter, never going below zero; creates the row if needed."""
+    adjusted = (
+        update(NotificationCounter)
+        .where(NotificationCounter.user_id == user_id)
+        .values(unread_count=case(
+            (NotificationCounter.unread_count + amount > 0, NotificationCounter.unread_count + amount),
+            else_=0
+        ))
+        .execution_options(synchronize_session=False)
+    )
+    if not session.execute(adjusted).rowcount:
+        try:
+            with session.begin_nested():
+                session.execute(insert(NotificationCounter).values(user_id=user_id, unread_count=max(amount, 0)))
+        except IntegrityError:
+            session.execute(adjusted)
+    _queue_invalidation(session, (user_id,))
+
+
+def increment_unread(counts, session=None):
+    """
+    Add new unread notifications to the counters.
+    Args:
+        counts (dict): {user_id: number of new unread notifications}.
+    """
+    session = session if session is not None else db.session()
+    if not counts:
+        return
+    by_amount = defaultdict(list)
+    for user_id, amount in counts.items():
+        by_amount[amount].append(user_id)
+    for amount, user_ids in by_amount.items():
+        user_ids.sort()  # Same lock order in every transaction
+        # Locking read: sees rows committed by concurrent inserters, which the UPDATE must include
+        existing = set(session.execute(
+            select(NotificationCounter.user_id)
+            .where(NotificationCounter.user_id.in_(user_ids))
+            .with_for_update()
+        ).scalars())
+        if existing:
+            session.execute(
+                update(NotificationCounter)
+                .where(NotificationCounter.user_id.in_(existing))
+                .values(unread_count=NotificationCounter.unread_count + amount)
+                .execution_options(synchronize_session=False)
+            )
+        for user_id in user_ids:
+            if user_id not in existing:
+                _add_unread(session, user_id, amount)
+    _queue_invalidation(session, counts.keys())
+
+
+def increment_unread_for_users(user_ids_select, session=None):
+    """
+    Add one unread notification for every user id produced by `user_ids_select`
+    (a SELECT of a single user id column), set-based.
+    """
+    session = session if session is not None else db.session()
+    targets = user_ids_select.subquery()
+    session.execute(
+        update(NotificationCounter)
+        .where(NotificationCounter.user_id.in_(select(targets.c[0])))
+        .values(unread_count=NotificationCounter.unread_count + 1)
+        .execution_options(synchronize_session=False)
+    )
+    session.execute(
+        insert(NotificationCounter).from_select(
+            ['user_id', 'unread_count'],
+            select(targets.c[0], literal(1))
+            .where(~exists().where(NotificationCounter.user_id == targets.c[0]))
+        )
+    )
+
+
+def mark_notification_read(notification_id, user_id):
+    """
+    Mark one of the user's notifications read and decrement the counter if it was unread.
+    The caller commits.
+    Returns:
+        bool: True if the notification changed from unread to read.
+    """
+    changed = db.session.execute(
+        update(Notification)
+        .where(Notification.id == notification_id, Notification.user_id == user_id,
+               Notification.is_read == False)
+        .values(is_read=True)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if changed:
+        _add_unread(db.session(), user_id, -changed)
+    return bool(changed)
+
+
+def mark_all_notifications_read(user_id):
+    """
+    Mark every unread notification of the user read and subtract exactly that many.
+    The caller commits.
+    Returns:
+        int: Number of notifications changed.
+    """
+    changed = db.session.execute(
+        update(Notification)
+        .where(Notification.user_id == user_id, Notification.is_read == False)
+        .values(is_read=True)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if changed:
+        _add_unread(db.session(), user_id, -changed)
+    return changed
+
+
+def get_unread_count(user_id):
+    """Unread notifications of the user: one primary-key read, memoized for UNREAD_COUNT_CACHE_SECONDS."""
+    count = cache.get(UNREAD_NOTIFICATIONS_NAMESPACE, user_id)
+    if count is None:
+        count = db.session.execute(
+            select(NotificationCounter.unread_count).where(NotificationCounter.user_id == user_id)
+        ).scalar() or 0
+        cache.set(UNREAD_NOTIFICATIONS_NAMESPACE, user_id, count,
+                  ttl=current_app.config['UNREAD_COUNT_CACHE_SECONDS'])
+    return count
+
+
+# --- Session Hook ---
+@event.listens_for(Session, 'after_commit')
+def _flush_unread_invalidations(session):
+    user_ids = session.info.pop(PENDING_INVALIDATIONS_KEY, None)
+    for user_id in user_ids or ():
+        cache.invalidate(UNREAD_NOTIFICATIONS_NAMESPACE, user_id)
+# --- End Session Hook ---
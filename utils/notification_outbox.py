@@ -0,0 +1,78 @@
+# utils/notification_outbox.py
+"""
+Notification outbox for the current unit of work.
+
+queue_notification() only appends a row to the session; nothing is written
+until the caller commits. Just before the commit every queued row goes out in
+one bulk INSERT, inside the same transaction as the business change that
+produced it, so a rolled-back booking action leaves no notification behind
+and a committed one always has its notifications. External delivery (WhatsApp)
+happens afterwards in tasks/notification_dispatch.py, off the request path.
+The same commit bumps the recipients' unread counters (utils/notification_counters.py)
+and, once it succeeds, pushes the notifications to open SSE connections (utils/realtime.py).
+"""
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import event, insert
+from sqlalchemy.orm import Session
+
+from models import db
+from models.notification import Notification
+from utils.notification_counters import increment_unread
+from utils.realtime import queue_event
+
+OUTBOX_KEY = 'notification_outbox'
+MESSAGE_MAX_LENGTH = 255
+
+
+def queue_notification(user_id, message, session=None):
+    """
+    Queue a notification for the recipient, written when the session commits.
+    Args:
+        user_id (int): Recipient user id (hosts are notified through their user account).
+        message (str): Text, truncated to 255 characters.
+        session: Session to attach to (defaults to db.session).
+    Returns:
+        bool: False if the recipient or message is invalid, True once queued.
+    """
+    if not isinstance(user_id, int) or user_id <= 0:
+        return False
+    if not isinstance(message, str) or not message.strip():
+        return False
+    session = session if session is not None else db.session()
+    session.info.setdefault(OUTBOX_KEY, []).append({
+        'user_id': user_id,
+        'message': message.strip()[:MESSAGE_MAX_LENGTH],
+        'is_read': False,
+        'timestamp': datetime.utcnow(),
+        'dispatch_status': 'pending',
+    })
+    return True
+
+
+def queued_notifications(session=None):
+    """Rows queued on the session and not yet written (read-only view)."""
+    session = session if session is not None else db.session()
+    return list(session.info.get(OUTBOX_KEY, ()))
+
+
+# --- Session Hooks ---
+@event.listens_for(Session, 'before_commit')
+def _write_notification_outbox(session):
+    rows = session.info.pop(OUTBOX_KEY, None)
+    if rows:
+        session.execute(insert(Notification), rows)  # One multi-row INSERT; autoflushes the business change first
+        increment_unread(Counter(row['user_id'] for row in rows), session=session)
+        for row in rows:  # Pushed to open SSE connections after the commit
+            queue_event(session, f"user:{row['user_id']}", 'notification',
+                        {'message': row['message'], 'timestamp': row['timestamp'].isoformat()})
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _discard_notification_outbox(session, transaction):
+    # The outermost transaction ended without reaching before_commit (rollback or close):
+    # its notifications describe changes that never happened.
+    if transaction.parent is None:
+        session.info.pop(OUTBOX_KEY, None)
+# --- End Session Hooks ---
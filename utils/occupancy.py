@@ -0,0 +1,161 @@
+# utils/occupancy.py
+"""
+Car utilisation (occupancy) engine.
+
+For a host's whole fleet and one IST week, the bookings that hold a car are
+loaded once (end_date already covers a paid extension; requested or unpaid
+extensions do not count), clipped to the window and swept in a single
+vectorised pass: sorting by (car, start) and carrying the running maximum end
+merges overlapping intervals per car, and the merged segments are spread over
+the day slots of the window.
+The result is an occupied-seconds matrix of shape (cars, days).
+
+Results are cached per (host, week): weeks still in progress briefly, closed
+weeks for much longer since their bookings no longer move.
+"""
+from datetime import datetime, time, timedelta
+
+from flask import current_app
+from sqlalchemy import select
+
+from models import db
+from models.booking import Booking
+from models.car import Car
+from utils.cache import cache, HOST_OCCUPANCY_NAMESPACE
+from utils.timezone import get_current_ist_time
+
+OCCUPYING_STATUSES = ('paid', 'approved', 'active', 'completed', 'extended')
+DAY_SECONDS = 24 * 3600
+
+
+class OccupancyError(ValueError):
+    """Invalid occupancy window or missing optional dependency."""
+
+
+def _require_numpy():
+    try:
+        import numpy as np
+    except ImportError:
+        raise OccupancyError("Occupancy analytics require the 'numpy' package.")
+    return np
+
+
+def sweep_occupancy(car_index, starts, ends, n_cars, window_seconds, slot_seconds=DAY_SECONDS):
+    """
+    Occupied seconds per car and slot for intervals given relative to the window start.
+
+    Args:
+        car_index (array-like[int]): Row (0..n_cars-1) of each interval's car.
+        starts, ends (array-like[float]): Interval bounds in seconds from the window start.
+        n_cars (int): Number of rows in the result.
+        window_seconds (int): Window length; intervals are clipped to [0, window_seconds].
+        slot_seconds (int): Width of each result column (default one day).
+    Returns:
+        numpy.ndarray: float64 array of shape (n_cars, ceil(window_seconds / slot_seconds)).
+    """
+    np = _require_numpy()
+    n_slots = -(-window_seconds // slot_seconds)
+    occupied = np.zeros((n_cars, n_slots), dtype=np.float64)
+
+    car_index = np.asarray(car_index, dtype=np.int64)
+    starts = np.clip(np.asarray(starts, dtype=np.float64), 0, window_seconds)
+    ends = np.clip(np.asarray(ends, dtype=np.float64), 0, window_seconds)
+    keep = ends > starts
+    if not keep.any():
+        return occupied
+    car_index, starts, ends = car_index[keep], starts[keep], ends[keep]
+
+    # --- Merge overlaps per car with one global sort and running max ---
+    # Shifting each car onto its own stretch of the time axis keeps one car's
+    # intervals from ever overlapping another's, so no per-car loop is needed.
+    order = np.lexsort((starts, car_index))
+    car_index, starts, ends = car_index[order], starts[order], ends[order]
+    offset = car_index * float(window_seconds + 1)
+    reach = np.maximum.accumulate(ends + offset)
+    segment_start = np.maximum(starts + offset, np.r_[-np.inf, reach[:-1]]) - offset
+    segment_end = ends
+    has_segment = segment_end > segment_start
+    # --- End Merge ---
+
+    # --- Spread merged segments over the slots ---
+    car_index = car_index[has_segment]
+    segment_start, segment_end = segment_start[has_segment], segment_end[has_segment]
+    slot_edges = np.arange(n_slots, dtype=np.float64) * slot_seconds
+    per_slot = np.clip(
+        np.minimum(segment_end[:, None], slot_edges + slot_seconds) - np.maximum(segment_start[:, None], slot_edges),
+        0, None
+    )
+    np.add.at(occupied, car_index, per_slot)
+    # --- End Spread ---
+    return occupied
+
+
+def week_start_for(day):
+    """Monday of the IST week containing `day`."""
+    return day - timedelta(days=day.weekday())
+
+
+def compute_host_week_occupancy(host_id, week_start):
+    """
+    Occupancy of every car of a host for the IST week starting on Monday `week_start`.
+    Returns:
+        dict: week bounds, fleet occupancy and per-car occupancy with a daily breakdown
+        (fractions between 0 and 1).
+    """
+    np = _require_numpy()
+    window_start = datetime.combine(week_start, time.min)  # Booking dates are stored as naive IST
+    window_end = window_start + timedelta(days=7)
+    window_seconds = 7 * DAY_SECONDS
+
+    cars = db.session.execute(
+        select(Car.id, Car.make, Car.model).where(Car.host_id == host_id).order_by(Car.id)
+    ).all()
+    row_of_car = {car.id: row for row, car in enumerate(cars)}
+
+    intervals = db.session.execute(
+        select(Booking.car_id, Booking.start_date, Booking.end_date)
+        .join(Car, Booking.car_id == Car.id)
+        .where(
+            Car.host_id == host_id,
+            Booking.status.in_(OCCUPYING_STATUSES),
+            Booking.start_date < window_end,
+            Booking.end_date > window_start,  # mark_extension_paid() moves end_date
+        )
+    ).all()
+
+    occupied = sweep_occupancy(
+        [row_of_car[car_id] for car_id, _, _ in intervals],
+        [(start - window_start).total_seconds() for _, start, _ in intervals],
+        [(end - window_start).total_seconds() for _, _, end in intervals],
+        len(cars), window_seconds
+    )
+    daily = occupied / DAY_SECONDS
+    weekly = occupied.sum(axis=1) / window_seconds if len(cars) else np.zeros(0)
+
+    return {
+        'week_start': week_start.isoformat(),
+        'week_end': (week_start + timedelta(days=6)).isoformat(),
+        'fleet_occupancy': round(float(weekly.mean()), 4) if len(cars) else 0.0,
+        'cars': [
+            {
+                'car_id': car.id,
+                'name': f"{car.make} {car.model}",
+                'occupancy': round(float(weekly[row]), 4),
+                'daily': [round(float(value), 4) for value in daily[row]],
+            }
+            for row, car in enumerate(cars)
+        ],
+    }
+
+
+def get_host_week_occupancy(host_id, week_start):
+    """Cached compute_host_week_occupancy(); `week_start` is normalised to its Monday."""
+    week_start = week_start_for(week_start)
+    key = (host_id, week_start)
+    result = cache.get(HOST_OCCUPANCY_NAMESPACE, key)
+    if result is None:
+        result = compute_host_week_occupancy(host_id, week_start)
+        closed = week_start + timedelta(days=7) <= get_current_ist_time().date()
+        ttl = current_app.config['OCCUPANCY_CLOSED_WEEK_CACHE_SECONDS' if closed else 'OCCUPANCY_CACHE_SECONDS']
+        cache.set(HOST_OCCUPANCY_NAMESPACE, key, result, ttl=ttl)
+    return result
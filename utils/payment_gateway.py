@@ -0,0 +1,440 @@
+# utils/payment_gateway.py
+"""
+Payment gateway service shared by every checkout route.
+
+- One process-wide client per worker with a pooled HTTP session (keep-alive).
+- Explicit connect/read timeouts on every gateway call.
+- Bounded retries with full jitter for transient failures only.
+- A circuit breaker so a failing gateway is skipped quickly instead of
+  holding request workers for the full timeout.
+- Latency/error metrics per operation.
+
+Set PAYMENT_GATEWAY=fake to use FakePaymentGateway, an in-process stand-in that
+creates orders and signs payments locally so checkout flows can be
+load-tested offline (a load-test client pays an order through
+POST /payment/fake/pay/<order_id>, then posts the result to /payment/handler).
+Breaker state and per-operation metrics are served at /admin/metrics/payment-gateway.
+"""
+import hashlib
+import hmac
+import random
+import threading
+import time
+import uuid
+from collections import deque
+
+import requests
+from flask import current_app
+from requests.adapters import HTTPAdapter
+
+
+class PaymentGatewayError(Exception):
+    """Gateway rejected the request or failed after all retries."""
+
+
+class PaymentGatewayUnavailable(PaymentGatewayError):
+    """Gateway is not configured or the circuit breaker is open."""
+
+
+# --- Circuit Breaker ---
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+    closed -> (failure_threshold failures) -> open -> (reset_timeout) -> half-open
+    A half-open breaker lets one trial call through; success closes it, failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state_locked()
+
+    def _state_locked(self):
+        if self._opened_at is None:
+            return 'closed'
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow_request(self):
+        """Return True if a call may go to the gateway right now."""
+        with self._lock:
+            state = self._state_locked()
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+# --- End Circuit Breaker ---
+
+
+# --- Metrics ---
+class GatewayMetrics:
+    """Per-operation call counts and latency (last 500 samples for percentiles)."""
+
+    def __init__(self, sample_size=500):
+        self._sample_size = sample_size
+        self._ops = {}
+        self._lock = threading.Lock()
+
+    def record(self, operation, latency_ms, ok, retries=0):
+        with self._lock:
+            op = self._ops.setdefault(operation, {
+                'calls': 0, 'errors': 0, 'retries': 0, 'rejected': 0,
+                'total_ms': 0.0, 'max_ms': 0.0, 'samples': deque(maxlen=self._sample_size)
+            })
+            op['calls'] += 1
+            op['retries'] += retries
+            op['total_ms'] += latency_ms
+            op['max_ms'] = max(op['max_ms'], latency_ms)
+            op['samples'].append(latency_ms)
+            if not ok:
+                op['errors'] += 1
+
+    def record_rejected(self, operation):
+        """Count a call short-circuited by the breaker."""
+        with self._lock:
+            op = self._ops.setdefault(operation, {
+                'calls': 0, 'errors': 0, 'retries': 0, 'rejected': 0,
+                'total_ms': 0.0, 'max_ms': 0.0, 'samples': deque(maxlen=self._sample_size)
+            })
+            op['rejected'] += 1
+
+    def snapshot(self):
+        """Return a JSON-friendly copy of the metrics."""
+        with self._lock:
+            result = {}
+            for name, op in self._ops.items():
+                samples = sorted(op['samples'])
+                result[name] = {
+                    'calls': op['calls'],
+                    'errors': op['errors'],
+                    'retries': op['retries'],
+                    'rejected': op['rejected'],
+                    'avg_ms': round(op['total_ms'] / op['calls'], 2) if op['calls'] else 0.0,
+                    'max_ms': round(op['max_ms'], 2),
+                    'p50_ms': round(samples[len(samples) // 2], 2) if samples else 0.0,
+                    'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 2) if samples else 0.0,
+                }
+            return result
+# --- End Metrics ---
+
+
+class BasePaymentGateway:
+    """Shared retry / breaker / metrics plumbing for gateway implementations."""
+
+    name = 'base'
+
+    def __init__(self, key_id=None, key_secret=None, max_retries=2, backoff_base=0.2,
+                 backoff_cap=2.0, breaker=None):
+        self.key_id = key_id
+        self.key_secret = key_secret
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.breaker = breaker or CircuitBreaker()
+        self.metrics = GatewayMetrics()
+
+    @property
+    def is_configured(self):
+        return bool(self.key_id and self.key_secret)
+
+    # Subclasses list the exception types worth retrying
+    transient_errors = (requests.ConnectionError, requests.Timeout)
+    # Connection failures: the only retries for a call that is not idempotent
+    # (a read timeout on create_order may come after Razorpay created the order)
+    connect_errors = (requests.ConnectionError,)
+
+    def _call(self, operation, func, retry_on=None):
+        """
+        Run `func` with the breaker, bounded retries (full jitter) and metrics.
+        `retry_on` narrows which transient errors are retried (default: all of transient_errors);
+        the others still count as gateway failures but are raised after the first attempt.
+        Raises:
+            PaymentGatewayUnavailable: Breaker open or gateway not configured.
+            PaymentGatewayError: Gateway rejected the call or retries were exhausted.
+        """
+        if not self.is_configured:
+            raise PaymentGatewayUnavailable("Payment gateway credentials are not configured.")
+        if not self.breaker.allow_request():
+            self.metrics.record_rejected(operation)
+            raise PaymentGatewayUnavailable("Payment gateway is temporarily unavailable.")
+
+        attempt = 0
+        started = time.perf_counter()
+        while True:
+            try:
+                result = func()
+            except self.transient_errors as e:
+                if attempt >= self.max_retries or not isinstance(e, retry_on or self.transient_errors):
+                    self.breaker.record_failure()
+                    self.metrics.record(operation, (time.perf_counter() - started) * 1000, ok=False, retries=attempt)
+                    raise PaymentGatewayError(f"{operation} failed after {attempt + 1} attempts: {e}") from e
+                # Full jitter: sleep uniformly in [0, min(cap, base * 2^attempt)]
+                time.sleep(random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt))))
+                attempt += 1
+                continue
+            except PaymentGatewayError:
+                # Rejections (bad request, auth) are not gateway outages: do not trip the breaker
+                self.breaker.record_success()
+                self.metrics.record(operation, (time.perf_counter() - started) * 1000, ok=False, retries=attempt)
+                raise
+            except Exception:
+                # Anything else (e.g. an error page the SDK cannot parse) counts as a gateway failure.
+                # Recording it also ends a half-open trial, which would otherwise stay in flight forever.
+                self.breaker.record_failure()
+                self.metrics.record(operation, (time.perf_counter() - started) * 1000, ok=False, retries=attempt)
+                raise
+            self.breaker.record_success()
+            self.metrics.record(operation, (time.perf_counter() - started) * 1000, ok=True, retries=attempt)
+            return result
+
+    # --- Public API ---
+    def create_order(self, amount_paise, receipt, currency='INR', notes=None):
+        """
+        Create a gateway order.
+        Args:
+            amount_paise (int): Amount in paise.
+            receipt (str): Merchant receipt reference (e.g. 'booking_receipt_12').
+        Returns:
+            dict: Order payload; order['id'] is the razorpay_order_id.
+        """
+        raise NotImplementedError
+
+    def fetch_payment(self, payment_id):
+        """Fetch a payment by id."""
+        raise NotImplementedError
+
+    def verify_payment_signature(self, order_id, payment_id, signature):
+        """Check a checkout signature (HMAC-SHA256 of "order_id|payment_id")."""
+        if not self.key_secret or not signature:
+            return False
+        expected_signature = hmac.new(
+            key=self.key_secret.encode(),
+            msg=f"{order_id}|{payment_id}".encode(),
+            digestmod=hashlib.sha256
+        ).hexdigest()
+        return hmac.compare_digest(expected_signature, signature)
+
+    def get_metrics(self):
+        """Latency/error metrics plus breaker state."""
+        return {
+            'gateway': self.name,
+            'breaker_state': self.breaker.state,
+            'operations': self.metrics.snapshot(),
+        }
+    # --- End Public API ---
+
+
+class RazorpayGateway(BasePaymentGateway):
+    """Razorpay SDK client on a pooled requests.Session with explicit timeouts."""
+
+    name = 'razorpay'
+
+    def __init__(self, key_id, key_secret, connect_timeout=3.05, read_timeout=10.0, pool_size=10, **kwargs):
+        super().__init__(key_id=key_id, key_secret=key_secret, **kwargs)
+        import razorpay  # Imported here so the fake gateway works without the SDK installed
+        self._razorpay = razorpay
+        self.timeout = (connect_timeout, read_timeout)
+
+        # --- Shared connection pool ---
+        # Retries are handled by _call (with jitter), so the adapter itself never retries.
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        session.mount('https://', adapter)
+        # --- End Shared connection pool ---
+
+        self.client = razorpay.Client(session=session, auth=(key_id, key_secret))
+        self.client.set_app_details({"title": "ZoomCarClone", "version": "1.0"})
+        self.transient_errors = (
+            requests.ConnectionError, requests.Timeout,
+            razorpay.errors.ServerError, razorpay.errors.GatewayError,
+        )
+
+    def _sdk_call(self, func):
+        """Translate SDK rejections into PaymentGatewayError."""
+        def wrapped():
+            try:
+                return func()
+            except self._razorpay.errors.BadRequestError as e:
+                raise PaymentGatewayError(str(e)) from e
+            except self._razorpay.errors.SignatureVerificationError as e:
+                raise PaymentGatewayError(str(e)) from e
+        return wrapped
+
+    def create_order(self, amount_paise, receipt, currency='INR', notes=None):
+        order_data = {
+            'amount': int(amount_paise),
+            'currency': currency,
+            'receipt': receipt,
+            'payment_capture': 1  # Auto-capture payment
+        }
+        if notes:
+            order_data['notes'] = notes
+        # Not idempotent: connection errors are retried, read timeouts are not
+        return self._call('create_order', self._sdk_call(
+            lambda: self.client.order.create(data=order_data, timeout=self.timeout)
+        ), retry_on=self.connect_errors)
+
+    def fetch_payment(self, payment_id):
+        return self._call('fetch_payment', self._sdk_call(
+            lambda: self.client.payment.fetch(payment_id, timeout=self.timeout)
+        ))
+
+
+class FakePaymentGateway(BasePaymentGateway):
+    """
+    In-process stand-in for Razorpay.
+    Orders and payments live in memory; signatures use the same HMAC scheme as
+    Razorpay, so the real callback handlers accept them unchanged.
+    """
+
+    name = 'fake'
+
+    def __init__(self, key_id=None, key_secret=None, latency_ms=0, failure_rate=0.0, **kwargs):
+        super().__init__(key_id=key_id or 'rzp_test_fake', key_secret=key_secret or 'fake_secret', **kwargs)
+        self.latency_ms = latency_ms
+        self.failure_rate = failure_rate
+        self.orders = {}
+        self.payments = {}
+        self._lock = threading.Lock()
+
+    def _simulate_network(self):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000.0)
+        if self.failure_rate and random.random() < self.failure_rate:
+            raise requests.ConnectionError("Simulated gateway failure")
+
+    def create_order(self, amount_paise, receipt, currency='INR', notes=None):
+        def create():
+            self._simulate_network()
+            order = {
+                'id': f"order_{uuid.uuid4().hex[:14]}",
+                'entity': 'order',
+                'amount': int(amount_paise),
+                'currency': currency,
+                'receipt': receipt,
+                'status': 'created',
+                'notes': notes or {},
+                'created_at': int(time.time()),
+            }
+            with self._lock:
+                self.orders[order['id']] = order
+            return order
+        return self._call('create_order', create, retry_on=self.connect_errors)
+
+    def fetch_payment(self, payment_id):
+        def fetch():
+            self._simulate_network()
+            with self._lock:
+                payment = self.payments.get(payment_id)
+            if payment is None:
+                raise PaymentGatewayError(f"Payment {payment_id} does not exist")
+            return payment
+        return self._call('fetch_payment', fetch)
+
+    def simulate_payment(self, order_id, status='captured'):
+        """
+        Pay an order as the checkout widget would.
+        Returns:
+            dict: razorpay_order_id / razorpay_payment_id / razorpay_signature,
+                  ready to post to a payment callback route.
+        """
+        with self._lock:
+            order = self.orders[order_id]
+            payment_id = f"pay_{uuid.uuid4().hex[:14]}"
+            self.payments[payment_id] = {
+                'id': payment_id,
+                'entity': 'payment',
+                'order_id': order_id,
+                'amount': order['amount'],
+                'currency': order['currency'],
+                'status': status,
+                'created_at': int(time.time()),
+            }
+            order['status'] = 'paid' if status == 'captured' else order['status']
+        signature = hmac.new(
+            key=self.key_secret.encode(),
+            msg=f"{order_id}|{payment_id}".encode(),
+            digestmod=hashlib.sha256
+        ).hexdigest()
+        return {
+            'razorpay_order_id': order_id,
+            'razorpay_payment_id': payment_id,
+            'razorpay_signature': signature,
+        }
+
+    def iter_payments(self):
+        """Yield recorded payments ordered by payment id (used by reconciliation)."""
+        with self._lock:
+            payments = sorted(self.payments.values(), key=lambda p: p['id'])
+        yield from payments
+
+
+# --- Process-wide Gateway ---
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def create_payment_gateway(config):
+    """Build a gateway from a Flask config mapping."""
+    common = dict(
+        max_retries=config.get('PAYMENT_GATEWAY_MAX_RETRIES', 2),
+        backoff_base=config.get('PAYMENT_GATEWAY_BACKOFF_BASE', 0.2),
+        breaker=CircuitBreaker(
+            failure_threshold=config.get('PAYMENT_GATEWAY_BREAKER_THRESHOLD', 5),
+            reset_timeout=config.get('PAYMENT_GATEWAY_BREAKER_RESET_SECONDS', 30),
+        ),
+    )
+    if config.get('PAYMENT_GATEWAY', 'razorpay') == 'fake':
+        return FakePaymentGateway(
+            key_id=config.get('RAZORPAY_KEY_ID'),
+            key_secret=config.get('RAZORPAY_KEY_SECRET'),
+            latency_ms=config.get('FAKE_GATEWAY_LATENCY_MS', 0),
+            failure_rate=config.get('FAKE_GATEWAY_FAILURE_RATE', 0.0),
+            **common
+        )
+    return RazorpayGateway(
+        key_id=config.get('RAZORPAY_KEY_ID'),
+        key_secret=config.get('RAZORPAY_KEY_SECRET'),
+        connect_timeout=config.get('PAYMENT_GATEWAY_CONNECT_TIMEOUT', 3.05),
+        read_timeout=config.get('PAYMENT_GATEWAY_READ_TIMEOUT', 10.0),
+        pool_size=config.get('PAYMENT_GATEWAY_POOL_SIZE', 10),
+        **common
+    )
+
+
+def get_payment_gateway():
+    """
+    Return the shared gateway for this worker, creating it on first use.
+    Must be called inside an app context.
+    """
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = create_payment_gateway(current_app.config)
+    return _gateway
+# --- End Process-wide Gateway ---
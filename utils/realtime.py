@@ -0,0 +1,202 @@
+# utils/realtime.py
+"""
+Server-Sent Events pub/sub.
+
+Every worker has one hub holding its open SSE connections. Each connection
+is a bounded queue subscribed to a few channels: 'user:<id>', 'host:<id>'
+and 'all'. publish() goes through the configured backend:
+
+- memory: delivers straight to this worker's hub. Use it for a single
+  worker or the dev server.
+- redis: PUBLISHes to a local Redis. One listener thread per worker
+  receives every message and hands it to the local hub, so an event raised
+  in any worker reaches connections in every worker.
+
+Events raised inside a transaction are queued on the session and published
+after commit (queue_event), so a client never sees a change that was rolled
+back. Connections never touch the database while open: they only block on
+their queue and send a heartbeat comment when idle.
+
+Everything is off unless REALTIME_ENABLED: each open stream holds a worker
+thread, which would exhaust a pool of sync workers. When it is off, pages
+do not open a stream, the endpoint returns 404 and publish() does nothing.
+"""
+import json
+import queue
+import threading
+
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+PENDING_EVENTS_KEY = 'realtime_events'
+REDIS_CHANNEL_PREFIX = 'realtime:'
+
+
+class RealtimeCapacityError(RuntimeError):
+    """This worker already holds REALTIME_MAX_CONNECTIONS_PER_WORKER connections."""
+
+
+class Subscription:
+    """One SSE connection: a bounded queue of pending events."""
+
+    def __init__(self, channels, queue_size):
+        self.channels = tuple(channels)
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.closed = False
+
+    def offer(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:  # Slow client: drop rather than grow without bound
+            self.dropped += 1
+
+    def next(self, timeout):
+        """The next event, or None after `timeout` seconds (time for a heartbeat)."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class RealtimeHub:
+    """This worker's connections, indexed by channel."""
+
+    def __init__(self, max_connections, queue_size):
+        self.max_connections = max_connections
+        self.queue_size = queue_size
+        self._channels = {}
+        self._count = 0
+        self._lock = threading.Lock()
+
+    @property
+    def connection_count(self):
+        return self._count
+
+    def subscribe(self, channels):
+        with self._lock:
+            if self._count >= self.max_connections:
+                raise RealtimeCapacityError(f"{self._count} live connections on this worker.")
+            subscription = Subscription(channels, self.queue_size)
+            for channel in subscription.channels:
+                self._channels.setdefault(channel, set()).add(subscription)
+            self._count += 1
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Idempotent: the stream's finally block and the response close hook both call it."""
+        with self._lock:
+            if subscription.closed:
+                return
+            subscription.closed = True
+            for channel in subscription.channels:
+                subscribers = self._channels.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._channels[channel]
+            self._count -= 1
+
+    def deliver(self, channel, message):
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        for subscription in subscribers:
+            subscription.offer(message)
+
+
+# --- Backends ---
+class MemoryBackend:
+    """Single-worker fan-out."""
+
+    def __init__(self, hub):
+        self.hub = hub
+
+    def publish(self, channel, message):
+        self.hub.deliver(channel, message)
+
+
+class RedisBackend:
+    """Cross-worker fan-out through a local Redis (requires the 'redis' package)."""
+
+    def __init__(self, hub, url):
+        import redis  # Optional dependency, only needed for REALTIME_BACKEND='redis'
+
+        self.hub = hub
+        self.client = redis.Redis.from_url(url)
+        self._thread = threading.Thread(target=self._listen, name='realtime-redis', daemon=True)
+        self._thread.start()
+
+    def publish(self, channel, message):
+        self.client.publish(REDIS_CHANNEL_PREFIX + channel, message)
+
+    def _listen(self):
+        import time
+
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(REDIS_CHANNEL_PREFIX + '*')
+                for item in pubsub.listen():
+                    channel = item['channel'].decode('utf-8')[len(REDIS_CHANNEL_PREFIX):]
+                    data = item['data']
+                    self.hub.deliver(channel, data.decode('utf-8') if isinstance(data, bytes) else data)
+            except Exception:
+                time.sleep(1)  # Redis restarted: resubscribe; events published meanwhile are lost
+# --- End Backends ---
+
+
+_hub = None
+_backend = None
+_init_lock = threading.Lock()
+
+
+def get_realtime_hub():
+    """This worker's hub and backend, created on first use from the app config."""
+    global _hub, _backend
+    if _hub is None:
+        with _init_lock:
+            if _hub is None:
+                config = current_app.config
+                hub = RealtimeHub(config['REALTIME_MAX_CONNECTIONS_PER_WORKER'], config['REALTIME_QUEUE_SIZE'])
+                if config['REALTIME_BACKEND'] == 'redis':
+                    _backend = RedisBackend(hub, config['REALTIME_REDIS_URL'])
+                else:
+                    _backend = MemoryBackend(hub)
+                _hub = hub
+    return _hub
+
+
+def format_sse(event_name, data):
+    """One SSE frame."""
+    return f"event: {event_name}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def publish(channel, event_name, data):
+    """Publish now (outside a transaction). Never raises: live updates are best effort."""
+    if not current_app.config['REALTIME_ENABLED']:
+        return
+    try:
+        get_realtime_hub()
+        _backend.publish(channel, format_sse(event_name, data))
+    except Exception as e:
+        current_app.logger.warning(f"Realtime publish to {channel} failed: {e}")
+
+
+def queue_event(session, channel, event_name, data):
+    """Publish once the session's transaction commits."""
+    session.info.setdefault(PENDING_EVENTS_KEY, []).append((channel, event_name, data))
+
+
+# --- Session Hooks ---
+@event.listens_for(Session, 'after_commit')
+def _publish_committed_events(session):
+    for channel, event_name, data in session.info.pop(PENDING_EVENTS_KEY, None) or ():
+        publish(channel, event_name, data)
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _discard_uncommitted_events(session, transaction):
+    if transaction.parent is None:
+        session.info.pop(PENDING_EVENTS_KEY, None)
+# --- End Session Hooks ---
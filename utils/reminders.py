@@ -0,0 +1,73 @@
+# utils/reminders.py
+"""
+Scheduling of booking reminders (models/reminder.py).
+
+Called from the Booking state transitions inside the caller's transaction, so
+reminders appear, move and disappear atomically with the booking change.
+
+Booking start/end dates are naive IST wall-clock times; due_at is naive UTC,
+compared with datetime.utcnow() by the worker.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from models import db
+from models.reminder import BookingReminder
+from utils.timezone import ist_to_utc
+
+# kind: (booking date it counts back from, lead time, message template)
+REMINDER_KINDS = {
+    'start_2h': ('start', timedelta(hours=2),
+                 "Reminder: Your trip for {car} (Booking #{booking_id}) starts in 2 hours!"),
+    'start_1h': ('start', timedelta(hours=1),
+                 "Reminder: Your trip for {car} (Booking #{booking_id}) starts in 1 hour!"),
+    'end_2h': ('end', timedelta(hours=2),
+               "Reminder: Your trip for {car} (Booking #{booking_id}) ends in 2 hours!"),
+    'end_1h': ('end', timedelta(hours=1),
+               "Reminder: Your trip for {car} (Booking #{booking_id}) ends in 1 hour!"),
+}
+
+
+def schedule_booking_reminders(booking, now=None):
+    """
+    Create or move the booking's reminders to match its current start and end dates.
+
+    Idempotent: a reminder whose due time is unchanged is left alone (a sent one stays
+    sent); one whose due time moved (extension) is re-armed. Reminders already in the
+    past when scheduled are not created. The caller commits.
+    """
+    now = now or datetime.utcnow()
+    car = f"{booking.car.make} {booking.car.model}"
+    existing = {reminder.kind: reminder for reminder in
+                BookingReminder.query.filter_by(booking_id=booking.id).all()}
+    for kind, (anchor, lead, template) in REMINDER_KINDS.items():
+        base = booking.start_date if anchor == 'start' else booking.end_date
+        if base is None:
+            continue
+        due_at = ist_to_utc(base).replace(tzinfo=None) - lead  # Booking dates are stored as IST
+        reminder = existing.get(kind)
+        if reminder is None:
+            if due_at <= now:
+                continue
+            db.session.add(BookingReminder(
+                booking_id=booking.id,
+                user_id=booking.user_id,
+                kind=kind,
+                message=template.format(car=car, booking_id=booking.id),
+                due_at=due_at,
+            ))
+        elif reminder.due_at != due_at and due_at > now:
+            reminder.due_at = due_at
+            reminder.status = 'scheduled'
+            reminder.sent_at = None
+
+
+def cancel_booking_reminders(booking_id):
+    """Cancel the booking's unsent reminders (one UPDATE). The caller commits."""
+    db.session.execute(
+        update(BookingReminder)
+        .where(BookingReminder.booking_id == booking_id, BookingReminder.status == 'scheduled')
+        .values(status='cancelled')
+        .execution_options(synchronize_session=False)
+    )
@@ -0,0 +1,203 @@
+# utils/search_log.py
+"""
+Search demand logging and the demand-versus-supply heatmap.
+
+record_search() only builds a dict and puts it on an in-memory queue; a daemon
+thread drains the queue and bulk-inserts SearchLog rows every
+SEARCH_LOG_FLUSH_SECONDS (or as soon as SEARCH_LOG_BATCH_SIZE rows are
+waiting). When the queue is full the entry is dropped and counted - a search
+request never waits on the log. Each worker process has its own writer.
+
+get_demand_heatmap() reads the compacted SearchDemandDaily rows
+(tasks/search_demand.py) and sets them against the available cars per cell.
+"""
+import atexit
+import json
+import math
+import queue
+import threading
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import func, insert, select
+
+from models import db
+from models.car import Car
+from models.search_log import SearchDemandDaily, SearchLog
+from utils.cache import cache, SEARCH_SUPPLY_NAMESPACE
+
+
+def geo_cell(latitude, longitude, cell_degrees):
+    """'<lat index>:<lng index>' of the cell containing the point, or None without coordinates."""
+    if latitude is None or longitude is None:
+        return None
+    return f"{math.floor(latitude / cell_degrees)}:{math.floor(longitude / cell_degrees)}"
+
+
+def cell_center(cell, cell_degrees):
+    """(lat, lng) of the centre of a cell id produced by geo_cell()."""
+    lat_index, lng_index = (int(part) for part in cell.split(':'))
+    return (round((lat_index + 0.5) * cell_degrees, 5), round((lng_index + 0.5) * cell_degrees, 5))
+
+
+class SearchLogWriter:
+    """Bounded queue plus one background flusher thread, bound to a Flask app."""
+
+    def __init__(self, app):
+        self.app = app
+        self.batch_size = app.config['SEARCH_LOG_BATCH_SIZE']
+        self.flush_seconds = app.config['SEARCH_LOG_FLUSH_SECONDS']
+        self._queue = queue.Queue(maxsize=app.config['SEARCH_LOG_QUEUE_SIZE'])
+        self._wake = threading.Event()
+        self._flush_lock = threading.Lock()
+        self.dropped = 0
+        self.written = 0
+        self._thread = threading.Thread(target=self._run, name='search-log-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def submit(self, row):
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+            return
+        if self._queue.qsize() >= self.batch_size:
+            self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:  # Keep the thread alive; the batch is lost, the requests were not affected
+                self.app.logger.error(f"Search log flush failed: {e}")
+
+    def flush(self):
+        """Write everything queued so far, in batches."""
+        with self._flush_lock:
+            while True:
+                rows = []
+                while len(rows) < self.batch_size:
+                    try:
+                        rows.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if not rows:
+                    return
+                with self.app.app_context():
+                    try:
+                        db.session.execute(insert(SearchLog), rows)
+                        db.session.commit()
+                    except Exception:
+                        db.session.rollback()
+                        raise
+                self.written += len(rows)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_search_log_writer():
+    """The process-wide writer, started on first use."""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = SearchLogWriter(current_app._get_current_object())
+    return _writer
+
+
+def record_search(source, latitude, longitude, filters, result_count, latency_ms, user_id=None):
+    """
+    Log one search without blocking the request. Never raises.
+    Args:
+        source (str): 'car_list' or 'api_search'.
+        filters (dict): Active filters (only non-empty values are kept).
+        latency_ms (float): Time spent serving the search.
+    """
+    try:
+        if not current_app.config['SEARCH_LOG_ENABLED']:
+            return
+        get_search_log_writer().submit({
+            'source': source,
+            'cell': geo_cell(latitude, longitude, current_app.config['SEARCH_GEO_CELL_DEGREES']),
+            'latitude': latitude,
+            'longitude': longitude,
+            'filters': json.dumps({key: value for key, value in (filters or {}).items() if value}, sort_keys=True),
+            'result_count': result_count,
+            'latency_ms': round(latency_ms, 2),
+            'user_id': user_id,
+            'created_at': datetime.utcnow(),
+        })
+    except Exception as e:
+        current_app.logger.warning(f"Search not logged: {e}")
+
+
+# --- Demand vs Supply Heatmap ---
+def _available_cars_per_cell(cell_degrees):
+    """{cell: available car count}, cached briefly (cars move far less often than admins refresh)."""
+    supply = cache.get(SEARCH_SUPPLY_NAMESPACE, cell_degrees)
+    if supply is None:
+        supply = {}
+        rows = db.session.execute(
+            select(Car.latitude, Car.longitude)
+            .where(Car.is_available == True, Car.latitude.isnot(None), Car.longitude.isnot(None))
+        )
+        for latitude, longitude in rows:
+            cell = geo_cell(latitude, longitude, cell_degrees)
+            supply[cell] = supply.get(cell, 0) + 1
+        cache.set(SEARCH_SUPPLY_NAMESPACE, cell_degrees, supply, ttl=300)
+    return supply
+
+
+def get_demand_heatmap(start_day, end_day, limit=500):
+    """
+    Search demand against available cars per geo cell for IST days start_day..end_day.
+    Cells are ordered by unmet demand (searches that found no car), then searches per car.
+    Returns:
+        dict: cell size and a list of cells with centre, demand counters and supply.
+    """
+    cell_degrees = current_app.config['SEARCH_GEO_CELL_DEGREES']
+    demand = db.session.execute(
+        select(
+            SearchDemandDaily.cell,
+            func.sum(SearchDemandDaily.searches).label('searches'),
+            func.sum(SearchDemandDaily.zero_result_searches).label('zero_result_searches'),
+            func.sum(SearchDemandDaily.results_total).label('results_total'),
+            func.sum(SearchDemandDaily.latency_ms_total).label('latency_ms_total'),
+        )
+        .where(SearchDemandDaily.day >= start_day, SearchDemandDaily.day <= end_day,
+               SearchDemandDaily.cell != 'unknown')
+        .group_by(SearchDemandDaily.cell)
+    ).all()
+    supply = _available_cars_per_cell(cell_degrees)
+
+    cells = []
+    for row in demand:
+        searches = int(row.searches or 0)
+        zero = int(row.zero_result_searches or 0)
+        cars = supply.get(row.cell, 0)
+        latitude, longitude = cell_center(row.cell, cell_degrees)
+        cells.append({
+            'cell': row.cell,
+            'lat': latitude,
+            'lng': longitude,
+            'searches': searches,
+            'zero_result_searches': zero,
+            'zero_result_rate': round(zero / searches, 4) if searches else 0.0,
+            'avg_results': round((row.results_total or 0) / searches, 2) if searches else 0.0,
+            'avg_latency_ms': round((row.latency_ms_total or 0) / searches, 2) if searches else 0.0,
+            'available_cars': cars,
+            'searches_per_car': round(searches / cars, 2) if cars else None,
+        })
+    cells.sort(key=lambda cell: (cell['zero_result_searches'], cell['searches_per_car'] or float('inf')), reverse=True)
+    return {
+        'start': start_day.isoformat(),
+        'end': end_day.isoformat(),
+        'cell_degrees': cell_degrees,
+        'cells': cells[:limit],
+    }
+# --- End Heatmap ---
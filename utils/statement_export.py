@@ -0,0 +1,243 @@
+# utils/statement_export.py
+"""
+Wallet statement export (CSV, optionally Parquet).
+
+Rows are streamed from wallet_transactions with a server-side cursor and
+encoded chunk by chunk, so a statement covering years of history uses the
+same memory as one covering a day. The range scan is served by the
+(user_id, timestamp) index on wallet_transactions.
+
+Host wallet rows (payouts, reference_type 'host_withdrawal') are ledgered
+under the host's user id but carry the host wallet's balance_after, so a
+statement covers one wallet: the user's own rows, or with host_wallet=True
+only the host rows. Host earnings (Host.add_to_wallet) write no
+wallet_transactions rows, so a host statement lists payouts only.
+"""
+import csv
+import io
+from datetime import datetime, time, timedelta
+
+from flask import Response, stream_with_context
+from sqlalchemy import or_, select
+
+from models.wallet_transaction import WalletTransaction
+from utils.streaming import stream_rows
+
+CREDIT_TYPES = ('deposit', 'earning', 'refund', 'bonus')
+HOST_WALLET_REFERENCE_TYPE = 'host_withdrawal'  # Written by tasks/payouts.py against the host wallet
+
+STATEMENT_COLUMNS = [
+    'transaction_id', 'timestamp', 'type', 'description',
+    'reference_type', 'reference_id', 'credit', 'debit', 'balance_after',
+]
+
+
+class StatementExportError(ValueError):
+    """Unsupported statement format or missing optional dependency."""
+
+
+def _statement_query(user_id, start, end, host_wallet=False):
+    """Transactions for one wallet in [start, end), oldest first."""
+    if host_wallet:
+        wallet = WalletTransaction.reference_type == HOST_WALLET_REFERENCE_TYPE
+    else:
+        wallet = or_(WalletTransaction.reference_type.is_(None),
+                     WalletTransaction.reference_type != HOST_WALLET_REFERENCE_TYPE)
+    return (
+        select(
+            WalletTransaction.id, WalletTransaction.timestamp, WalletTransaction.transaction_type,
+            WalletTransaction.description, WalletTransaction.reference_type, WalletTransaction.reference_id,
+            WalletTransaction.amount, WalletTransaction.balance_after,
+        )
+        .where(
+            WalletTransaction.user_id == user_id,
+            WalletTransaction.timestamp >= start,
+            WalletTransaction.timestamp < end,
+            wallet,
+        )
+        .order_by(WalletTransaction.timestamp, WalletTransaction.id)
+    )
+
+
+def _statement_records(user_id, start, end, chunk_size, host_wallet):
+    for row in stream_rows(_statement_query(user_id, start, end, host_wallet), chunk_size):
+        credit = row.transaction_type in CREDIT_TYPES
+        yield (
+            row.id,
+            row.timestamp.strftime('%Y-%m-%d %H:%M:%S') if row.timestamp else '',
+            row.transaction_type,
+            row.description,
+            row.reference_type or '',
+            row.reference_id if row.reference_id is not None else '',
+            f"{row.amount:.2f}" if credit else '',
+            '' if credit else f"{row.amount:.2f}",
+            f"{row.balance_after:.2f}",
+        )
+
+
+def iter_statement_csv(user_id, start, end, chunk_size=1000, host_wallet=False):
+    """
+    Yield the statement as CSV text, one chunk per `chunk_size` rows.
+    Args:
+        user_id (int): Wallet owner (users.id; host wallets are ledgered under the host's user).
+        start (datetime): Inclusive lower bound.
+        end (datetime): Exclusive upper bound.
+        host_wallet (bool): The host wallet's rows instead of the user's own.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(STATEMENT_COLUMNS)
+    pending = 0
+    for record in _statement_records(user_id, start, end, chunk_size, host_wallet):
+        writer.writerow(record)
+        pending += 1
+        if pending >= chunk_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue()
+
+
+class _ChunkSink:
+    """Write-only file object that hands written bytes back to the caller between row groups."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_statement_parquet(user_id, start, end, chunk_size=10000, host_wallet=False):
+    """
+    Yield the statement as Parquet bytes, one row group per `chunk_size` rows.
+    Requires the optional `pyarrow` package.
+    Raises:
+        StatementExportError: pyarrow is not installed.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise StatementExportError("Parquet statements require the 'pyarrow' package.")
+
+    schema = pa.schema([
+        ('transaction_id', pa.int64()),
+        ('timestamp', pa.timestamp('s')),
+        ('type', pa.string()),
+        ('description', pa.string()),
+        ('reference_type', pa.string()),
+        ('reference_id', pa.int64()),
+        ('amount', pa.float64()),  # Signed: credits positive, debits negative
+        ('balance_after', pa.float64()),
+    ])
+
+    def row_groups():
+        columns = {name: [] for name in schema.names}
+        for row in stream_rows(_statement_query(user_id, start, end, host_wallet), chunk_size):
+            columns['transaction_id'].append(row.id)
+            columns['timestamp'].append(row.timestamp)
+            columns['type'].append(row.transaction_type)
+            columns['description'].append(row.description)
+            columns['reference_type'].append(row.reference_type)
+            columns['reference_id'].append(row.reference_id)
+            columns['amount'].append(row.amount if row.transaction_type in CREDIT_TYPES else -row.amount)
+            columns['balance_after'].append(row.balance_after)
+            if len(columns['transaction_id']) >= chunk_size:
+                yield pa.table(columns, schema=schema)
+                columns = {name: [] for name in schema.names}
+        if columns['transaction_id']:
+            yield pa.table(columns, schema=schema)
+
+    def generate():
+        sink = _ChunkSink()
+        writer = pq.ParquetWriter(sink, schema)
+        try:
+            for table in row_groups():
+                writer.write_table(table)
+                data = sink.drain()
+                if data:
+                    yield data
+        finally:
+            writer.close()
+        yield sink.drain()  # Footer
+
+    return generate()
+
+
+STATEMENT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+def iter_statement(user_id, start, end, fmt='csv', chunk_size=1000, host_wallet=False):
+    """
+    Return (generator, mimetype, file extension) for a statement in `fmt`.
+    Raises:
+        StatementExportError: Unknown format or missing optional dependency.
+    """
+    if fmt not in STATEMENT_FORMATS:
+        raise StatementExportError(f"Unsupported statement format: {fmt}")
+    mimetype, extension = STATEMENT_FORMATS[fmt]
+    if fmt == 'parquet':
+        body = iter_statement_parquet(user_id, start, end, chunk_size=max(chunk_size, 10000), host_wallet=host_wallet)
+    else:
+        body = iter_statement_csv(user_id, start, end, chunk_size=chunk_size, host_wallet=host_wallet)
+    return body, mimetype, extension
+
+
+def parse_statement_range(start_str, end_str, today):
+    """
+    Parse 'YYYY-MM-DD' bounds (both inclusive) into a [start, end) datetime range.
+    Defaults: from 1 January of the current year up to and including `today`.
+    Raises:
+        StatementExportError: Malformed dates or start after end.
+    """
+    try:
+        start_date = datetime.strptime(start_str, '%Y-%m-%d').date() if start_str else today.replace(month=1, day=1)
+        end_date = datetime.strptime(end_str, '%Y-%m-%d').date() if end_str else today
+    except ValueError:
+        raise StatementExportError("Dates must be in YYYY-MM-DD format.")
+    if start_date > end_date:
+        raise StatementExportError("Start date must be on or before end date.")
+    return datetime.combine(start_date, time.min), datetime.combine(end_date + timedelta(days=1), time.min)
+
+
+def statement_response(user_id, args, filename_prefix, chunk_size=1000, host_wallet=False):
+    """
+    Build a streaming download response for a wallet statement from request args
+    (start, end, format).
+    Raises:
+        StatementExportError: Invalid range/format or missing optional dependency.
+    """
+    start, end = parse_statement_range(args.get('start'), args.get('end'), datetime.utcnow().date())
+    body, mimetype, extension = iter_statement(
+        user_id, start, end, fmt=args.get('format', 'csv').lower(), chunk_size=chunk_size, host_wallet=host_wallet
+    )
+    last_day = end - timedelta(days=1)
+    filename = f"{filename_prefix}_{start:%Y%m%d}_{last_day:%Y%m%d}.{extension}"
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
@@ -0,0 +1,18 @@
+# utils/streaming.py
+"""
+Helpers for reading large result sets without loading them into memory.
+"""
+from models import db
+
+
+def stream_rows(statement, chunk_size):
+    """
+    Yield rows of `statement` through a server-side cursor, `chunk_size` at a time.
+
+    Each stream gets its own connection: an unbuffered MySQL cursor blocks its
+    connection until fully read, so a stream must not share the request session's
+    connection (or another stream's) while it is being consumed.
+    """
+    with db.engine.connect() as conn:
+        result = conn.execution_options(yield_per=chunk_size).execute(statement)
+        yield from result
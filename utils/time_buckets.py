@@ -0,0 +1,34 @@
+# utils/time_buckets.py
+"""
+Calendar bucketing shared by the analytics endpoints: day, week (starting
+Monday) and month buckets, each identified by its first day.
+"""
+from datetime import timedelta
+
+BUCKETS = ('day', 'week', 'month')
+
+
+def bucket_start(day, bucket):
+    """First day of the day/week (Monday)/month bucket containing `day`."""
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket_start(start, bucket):
+    """First day of the bucket after the one starting on `start`."""
+    if bucket == 'month':
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=7 if bucket == 'week' else 1)
+
+
+def bucket_keys(start_day, end_day, bucket):
+    """Every bucket overlapping [start_day, end_day], so empty periods can be shown as zeros."""
+    keys = []
+    current = bucket_start(start_day, bucket)
+    while current <= end_day:
+        keys.append(current)
+        current = next_bucket_start(current, bucket)
+    return keys
@@ -0,0 +1,180 @@
+# utils/upload_store.py
+"""
+Content-addressed storage for uploaded files.
+
+save_upload() streams an upload to a temporary file while hashing it
+(SHA-256), then files it under a sharded path derived from the hash:
+    <UPLOAD_STORE_FOLDER>/ab/cd/abcd...<ext>
+Two levels of 256 directories keep each directory small however many files
+are stored. Identical content is stored once: the blobs table
+(models/blob.py) counts references, and a second upload of the same bytes
+only bumps the count and discards its temporary file.
+
+The returned key is stored in the referencing row's filename column.
+UPLOAD_STORE_FOLDER is static/uploads, so templates keep using
+url_for('static', filename='uploads/' + image.filename). release_upload()
+drops a reference when such a row is deleted; the file is removed later by
+the garbage collector (tasks/uploads.py), never inside a request whose
+transaction could still roll back.
+
+Ordering against the collector: the reference is counted (row lock held
+until commit) before the file is moved into place, and the collector
+unlinks a file while holding the lock on its zero-reference row. An upload
+racing a collection therefore either keeps the row alive or recreates both
+the row and the file.
+
+The file is in place before the caller commits; if the transaction rolls
+back instead, the file has no row and is removed by the orphan sweep
+(tasks/uploads.py) after the collector's grace period.
+"""
+import hashlib
+import os
+import tempfile
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import case, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from werkzeug.utils import secure_filename
+
+from models import db
+from models.blob import Blob
+
+IMAGE_UPLOAD_EXTENSIONS = {'.jpg', '.jpeg', '.jfif', '.png', '.gif', '.webp'}
+ALLOWED_UPLOAD_EXTENSIONS = IMAGE_UPLOAD_EXTENSIONS | {'.pdf'}
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+class UploadError(ValueError):
+    """The upload was rejected (type or size)."""
+
+
+def blob_key(sha256, ext):
+    """Sharded path of a blob relative to UPLOAD_STORE_FOLDER."""
+    return f"{sha256[:2]}/{sha256[2:4]}/{sha256}{ext}"
+
+
+def upload_path(key):
+    """Absolute path of a stored upload (blob key or legacy flat filename)."""
+    return os.path.join(current_app.config['UPLOAD_STORE_FOLDER'], *key.split('/'))
+
+
+def is_blob_key(key):
+    """Legacy uploads are flat filenames; blob keys are sharded paths."""
+    return '/' in (key or '')
+
+
+def _stream_to_temp(stream, tmp_dir, max_bytes):
+    """Copy `stream` to a temporary file in chunks, hashing as it goes. Returns (path, sha256, size)."""
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = stream.read(HASH_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadError(f"File is larger than {max_bytes // (1024 * 1024)} MB.")
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return tmp_path, digest.hexdigest(), size
+
+
+def _add_reference(session, sha256, key, ext, size, content_type):
+    """
+    Count one more reference to the blob with this hash, creating its row if needed.
+    Returns:
+        tuple: (blob key, whether this call created the row).
+    """
+    bump = (
+        update(Blob)
+        .where(Blob.sha256 == sha256)
+        .values(ref_count=Blob.ref_count + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if not session.execute(bump).rowcount:
+        try:
+            with session.begin_nested():
+                session.execute(insert(Blob).values(
+                    sha256=sha256, key=key, size=size, content_type=content_type,
+                    ref_count=1, created_at=datetime.utcnow(),
+                    # Images get thumbnails and resized variants from the derivative worker (tasks/images.py)
+                    derivatives_status='pending' if ext in IMAGE_UPLOAD_EXTENSIONS else 'none',
+                ))
+            return key, True
+        except IntegrityError:  # A concurrent upload of the same content created it first
+            session.execute(bump)
+    # The first upload of this content chose the extension
+    return session.execute(select(Blob.key).where(Blob.sha256 == sha256)).scalar(), False
+
+
+def store_stream(stream, ext, content_type=None, session=None):
+    """
+    Store the bytes of a readable binary stream and count a reference to them.
+    The caller commits (and saves the returned key on the referencing row).
+    Returns:
+        str: Blob key, relative to UPLOAD_STORE_FOLDER.
+    """
+    session = session if session is not None else db.session()
+    store = current_app.config['UPLOAD_STORE_FOLDER']
+    tmp_dir = os.path.join(store, 'tmp')
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    tmp_path, sha256, size = _stream_to_temp(stream, tmp_dir, current_app.config['MAX_CONTENT_LENGTH'])
+    try:
+        key, created = _add_reference(session, sha256, blob_key(sha256, ext), ext, size, content_type)
+        final_path = upload_path(key)
+        # New content, or a collected file being re-uploaded. A new row always writes the file: one left by a
+        # rolled-back upload may be old enough for the orphan sweep, and this resets its age.
+        if created or not os.path.exists(final_path):
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            os.replace(tmp_path, final_path)
+    finally:
+        if os.path.exists(tmp_path):  # Duplicate content: the stored copy is kept
+            os.remove(tmp_path)
+    return key
+
+
+def save_upload(file_storage, session=None):
+    """
+    Store an uploaded werkzeug FileStorage (car image, trip photo, document).
+    Raises:
+        UploadError: Unsupported file type or file too large.
+    Returns:
+        str: Blob key to store in the row's filename column.
+    """
+    ext = os.path.splitext(secure_filename(file_storage.filename or ''))[1].lower()
+    if ext not in ALLOWED_UPLOAD_EXTENSIONS:
+        raise UploadError(f"Unsupported file type '{ext or file_storage.filename}'.")
+    return store_stream(file_storage.stream, ext, content_type=file_storage.mimetype, session=session)
+
+
+def release_upload(key, session=None):
+    """
+    Drop one reference to a stored upload; call when deleting the row that holds `key`.
+    Blob files are collected later (tasks/uploads.py). Legacy flat uploads are removed
+    right away, as before.
+    """
+    if not key:
+        return
+    if not is_blob_key(key):
+        legacy_path = upload_path(key)
+        if os.path.exists(legacy_path):
+            os.remove(legacy_path)
+        return
+    session = session if session is not None else db.session()
+    session.execute(
+        update(Blob)
+        .where(Blob.key == key)
+        .values(
+            ref_count=case((Blob.ref_count > 0, Blob.ref_count - 1), else_=0),
+            released_at=datetime.utcnow(),  # The collector's grace period runs from the last release
+        )
+        .execution_options(synchronize_session=False)
+    )
@@ -0,0 +1,131 @@
+# utils/wallet_service.py
+"""
+Atomic wallet balance updates.
+
+Balances are changed with a single SQL statement
+(UPDATE ... SET wallet_balance = wallet_balance + :delta) instead of
+read-modify-write on a loaded object, so concurrent credits to the same
+wallet cannot overwrite each other. The UPDATE row lock is held until the
+caller commits, which keeps the balance change and its ledger insert in
+one transaction.
+"""
+from sqlalchemy import case, func, select, update
+from sqlalchemy.orm.attributes import set_committed_value
+
+from models import db
+
+
+class WalletError(ValueError):
+    """Wallet row missing or balance change rejected."""
+
+
+class InsufficientFundsError(WalletError):
+    """Debit would take the balance below zero."""
+
+
+def apply_balance_delta(model, row_id, delta, allow_overdraft=False):
+    """
+    Atomically add `delta` to `model.wallet_balance` for one row.
+
+    Does not commit: the row stays locked until the caller commits or rolls back,
+    so any ledger rows added in the same transaction land together with the balance.
+
+    Args:
+        model: Mapped class with `id` and `wallet_balance` columns (User, Host).
+        row_id (int): Primary key of the wallet owner.
+        delta (float): Signed amount; negative for debits.
+        allow_overdraft (bool): Allow a debit to take the balance below zero.
+    Returns:
+        float: The balance after the update.
+    Raises:
+        InsufficientFundsError: Debit larger than the balance (and overdraft not allowed).
+        WalletError: No row with that id.
+    """
+    delta = round(float(delta), 2)
+    if delta == 0:
+        raise WalletError("Balance change must be non-zero.")
+    balance = func.coalesce(model.wallet_balance, 0.0)
+    statement = (
+        update(model)
+        .where(model.id == row_id)
+        .values(wallet_balance=balance + delta)
+        .execution_options(synchronize_session=False)
+    )
+    if delta < 0 and not allow_overdraft:
+        statement = statement.where(balance >= -delta)
+
+    dialect = db.session.get_bind().dialect
+    if dialect.update_returning:
+        new_balance = db.session.execute(statement.returning(model.wallet_balance)).scalar_one_or_none()
+        updated = new_balance is not None
+    else:
+        # MySQL has no UPDATE ... RETURNING: the UPDATE already holds the row lock,
+        # so reading the row back in the same transaction sees exactly our result.
+        updated = db.session.execute(statement).rowcount == 1
+        new_balance = None
+        if updated:
+            new_balance = db.session.execute(
+                select(model.wallet_balance).where(model.id == row_id)
+            ).scalar_one()
+
+    if not updated:
+        if db.session.execute(select(model.id).where(model.id == row_id)).first() is None:
+            raise WalletError(f"{model.__name__} {row_id} does not exist.")
+        raise InsufficientFundsError(f"Insufficient wallet balance for {model.__name__} {row_id}.")
+
+    new_balance = round(new_balance, 2)
+    _sync_loaded_instance(model, row_id, new_balance)
+    return new_balance
+
+
+def _sync_loaded_instance(model, row_id, new_balance):
+    """
+    Refresh wallet_balance on an instance already in the session (e.g. current_user)
+    without marking it dirty, so a later flush cannot write a stale balance back.
+    """
+    instance = db.session.identity_map.get(db.session.identity_key(model, row_id))
+    if instance is not None:
+        set_committed_value(instance, 'wallet_balance', new_balance)
+
+
+def apply_balance_deltas(model, deltas):
+    """
+    Apply many signed balance changes with one UPDATE ... SET wallet_balance =
+    wallet_balance + CASE id WHEN ... END. No balance guard: callers lock the rows
+    (SELECT ... FOR UPDATE) and validate the amounts first. Does not commit.
+    Args:
+        model: Mapped class with `id` and `wallet_balance` columns.
+        deltas (dict): {row_id: signed amount}.
+    Returns:
+        int: Number of rows updated.
+    """
+    deltas = {row_id: round(float(delta), 2) for row_id, delta in deltas.items() if round(float(delta), 2)}
+    if not deltas:
+        return 0
+    result = db.session.execute(
+        update(model)
+        .where(model.id.in_(list(deltas)))
+        .values(wallet_balance=func.coalesce(model.wallet_balance, 0.0) + case(deltas, value=model.id, else_=0.0))
+        .execution_options(synchronize_session=False)
+    )
+    for row_id in deltas:
+        instance = db.session.identity_map.get(db.session.identity_key(model, row_id))
+        if instance is not None:
+            db.session.expire(instance, ['wallet_balance'])  # Reload on next access
+    return result.rowcount
+
+
+# --- Convenience Wrappers ---
+def credit_wallet(owner, amount):
+    """Add a positive `amount` to a User or Host wallet. Returns the new balance."""
+    if amount <= 0:
+        raise WalletError("Credit amount must be positive.")
+    return apply_balance_delta(type(owner), owner.id, amount)
+
+
+def debit_wallet(owner, amount, allow_overdraft=False):
+    """Take a positive `amount` from a User or Host wallet. Returns the new balance."""
+    if amount <= 0:
+        raise WalletError("Debit amount must be positive.")
+    return apply_balance_delta(type(owner), owner.id, -amount, allow_overdraft=allow_overdraft)
+# --- End Convenience Wrappers ---